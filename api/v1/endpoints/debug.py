@@ -0,0 +1,56 @@
+from typing import Any
+
+from fastapi import APIRouter, Body
+
+from monitoring.slow_queries import get_query_profiler
+
+debug_router = APIRouter(prefix="/debug", tags=["debug"], include_in_schema=False)
+
+
+@debug_router.get(
+    "/slow-queries",
+    summary="ListSlowQueries",
+    description="Slow statements logged by this worker, newest first",
+    operation_id="ListSlowQueries",
+)
+async def list_slow_queries() -> list[dict[str, Any]]:
+    return get_query_profiler().slow_queries()
+
+
+@debug_router.get(
+    "/query-profile",
+    summary="GetQueryProfile",
+    description="Sampled statement distributions of this worker by fingerprint",
+    operation_id="GetQueryProfile",
+)
+async def get_query_profile() -> dict[str, Any]:
+    profiler = get_query_profiler()
+    return {
+        "sample_rate": profiler.sample_rate,
+        "threshold_ms": profiler.threshold * 1000,
+        "fingerprints": profiler.fingerprint_stats(),
+    }
+
+
+@debug_router.put(
+    "/query-profile",
+    summary="SetQueryProfileSampleRate",
+    description="Start, change or stop sampling statements on this worker",
+    operation_id="SetQueryProfileSampleRate",
+)
+async def set_query_profile_sample_rate(
+    sample_rate: float = Body(ge=0.0, le=1.0, embed=True),
+) -> dict[str, Any]:
+    get_query_profiler().set_sample_rate(sample_rate)
+    return await get_query_profile()
+
+
+@debug_router.delete(
+    "/query-profile",
+    summary="ResetQueryProfile",
+    description="Clear the slow-query log and sampled distributions of this worker",
+    operation_id="ResetQueryProfile",
+    status_code=204,
+)
+async def reset_query_profile() -> None:
+    get_query_profiler().reset()
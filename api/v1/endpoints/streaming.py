@@ -0,0 +1,76 @@
+from contextlib import aclosing
+from typing import AsyncIterator, Callable
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from repository.tsp import TSPRepository
+from session_manager import SparkseeSessionManager, session_context
+
+streaming_router = APIRouter(prefix="/discovery", tags=["tsp"])
+tsp_repo = TSPRepository()
+
+
+def ndjson_response(
+    open_stream: Callable[[SparkseeSessionManager], AsyncIterator[BaseModel]],
+) -> StreamingResponse:
+    """Stream models as NDJSON, holding the Sparksee session only while sending.
+
+    The session is opened inside the response body, because the endpoint
+    returns before the first row is written. Streams only read, so the
+    session runs without a transaction.
+    """
+
+    async def body() -> AsyncIterator[str]:
+        async with session_context(read_only=True) as session_manager:
+            models = open_stream(session_manager)
+            async with aclosing(models):
+                async for model in models:
+                    yield model.model_dump_json() + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@streaming_router.get(
+    "/tsps:stream",
+    summary="StreamTSPByType",
+    description="Stream TSPs of a type as NDJSON",
+    operation_id="StreamTSPByType",
+)
+async def stream_tsps_by_type(
+    tsp_type: str,
+    page_size: int = Query(default=100, ge=1, le=1000),
+) -> StreamingResponse:
+    return ndjson_response(
+        lambda session_manager: tsp_repo.stream(
+            tsp_repo.get_list_of_tsp_by_type,
+            session_manager=session_manager,
+            tsp_type_name=tsp_type,
+            page_size=page_size,
+        )
+    )
+
+
+@streaming_router.get(
+    "/recommendations:stream",
+    summary="StreamTSPRecommendations",
+    description="Stream TSP Recommendations as NDJSON",
+    operation_id="StreamTSPRecommendations",
+)
+async def stream_recommendations(
+    countries: list[str] | None = Query(default=None),
+    tsp_types: list[str] | None = Query(default=None),
+    time_slots: list[str] | None = Query(default=None),
+    page_size: int = Query(default=100, ge=1, le=1000),
+) -> StreamingResponse:
+    return ndjson_response(
+        lambda session_manager: tsp_repo.stream(
+            tsp_repo.get_recommendations_from_graph,
+            session_manager=session_manager,
+            countries=countries,
+            tsp_types=tsp_types,
+            time_slots=time_slots,
+            page_size=page_size,
+        )
+    )
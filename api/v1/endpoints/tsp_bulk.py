@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Body, Query
+
+from repository.tsp import TSPBulkCreate, TSPBulkResult, TSPRepository
+from session_manager import session_for
+
+tsp_bulk_router = APIRouter(prefix="/discovery", tags=["tsp"])
+tsp_repo = TSPRepository()
+
+
+@tsp_bulk_router.post(
+    "/tsps:bulk",
+    summary="CreateTSPsBulk",
+    description="Create TSPs with their edges in one transaction",
+    operation_id="CreateTSPsBulk",
+    response_model=TSPBulkResult,
+)
+async def create_tsps_bulk(
+    tsps: list[TSPBulkCreate] = Body(),
+    chunk_size: int | None = Query(default=None, ge=1, le=5000),
+) -> TSPBulkResult:
+    async with session_for(tsp_repo.create_tsps_bulk) as session_manager:
+        return await tsp_repo.create_tsps_bulk(
+            session_manager=session_manager,
+            tsps=tsps,
+            chunk_size=chunk_size,
+        )
@@ -0,0 +1,67 @@
+"""Cells/second of the Sparksee value decoder on synthetic result rows.
+
+``legacy`` is the former ``HasField`` chain, kept here as the reference
+point; ``decode_rows`` is the table-driven per-column decoder.
+"""
+import argparse
+import time
+
+from common import synthetic_result_rows
+
+from base import decode_rows
+
+
+def legacy_parse_sparksee_value(value):
+    if value.HasField("nullValue"):
+        return None
+    elif value.HasField("intValue"):
+        return value.intValue
+    elif value.HasField("longValue"):
+        return value.longValue
+    elif value.HasField("stringValue"):
+        return value.stringValue
+    elif value.HasField("timestampValue"):
+        return value.timestampValue.ToDatetime()
+    elif value.HasField("doubleValue"):
+        return value.doubleValue
+    elif value.HasField("boolValue"):
+        return value.boolValue
+    elif value.HasField("oidValue"):
+        return value.oidValue
+    else:
+        return None
+
+
+def legacy_decode_rows(rows):
+    return [[legacy_parse_sparksee_value(cv) for cv in row.columnValues] for row in rows]
+
+
+def cells_per_second(decode, rows, repeat: int) -> float:
+    cells = sum(len(row.columnValues) for row in rows)
+    best = float("inf")
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        decode(rows)
+        best = min(best, time.perf_counter() - started_at)
+    return cells / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = synthetic_result_rows(args.rows, seed=args.seed).rows
+    assert legacy_decode_rows(rows) == decode_rows(rows)
+
+    before = cells_per_second(legacy_decode_rows, rows, args.repeat)
+    after = cells_per_second(decode_rows, rows, args.repeat)
+    print(f"{args.rows} rows")
+    print(f"  legacy HasField chain  {before:14,.0f} cells/s")
+    print(f"  decode_rows            {after:14,.0f} cells/s  ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Latency of ``SparkseeSessionManager.execute_query`` per close mode.
+
+Every stub RPC sleeps for ``--latency-ms``, so the numbers show how many
+round-trips sit on the critical path of a read and a write-only statement.
+With ``--target`` the statements go to a real server instead, such as the
+in-memory stand-in::
+
+    PYTHONPATH=. python -m fake_sparksee.server --latency-ms 1 --jitter-ms 0.2
+    PYTHONPATH=.:repository python benchmarks/bench_execute_query.py --target localhost:50051
+
+Writes against a target run in a transaction that is rolled back.
+"""
+import argparse
+import asyncio
+
+from common import LatencyStub, make_manager, print_table, summarize, time_async
+
+from session_manager import SparkseeSessionManager
+
+
+async def run(
+    latency: float, iterations: int, target: str | None = None
+) -> dict[str, dict[str, float]]:
+    stub = LatencyStub(latency=latency)
+    channel = SparkseeSessionManager.create_aio_channel(target) if target else None
+    results = {}
+    for mode in ("sync", "deferred"):
+        if channel is None:
+            manager = make_manager(stub, mode)
+        else:
+            manager = SparkseeSessionManager(query_close_mode=mode)
+            await manager.init(channel)
+            await manager.begin_transaction()
+
+        async def read():
+            await manager.execute_query(stmt="GRAPH::SCAN('TSP')", max_rows=10)
+
+        async def write():
+            await manager.execute_query(
+                stmt="GRAPH::INSERT_NODES('TSP', VALUES([STRING], [['bench']]))", fetch_rows=False
+            )
+
+        results[f"read ({mode} close)"] = summarize(await time_async(read, iterations))
+        results[f"write-only ({mode} close)"] = summarize(
+            await time_async(write, iterations)
+        )
+        await manager.flush_pending_closes()
+        if channel is not None:
+            await manager.rollback_transaction()
+            await manager.end_session()
+    if channel is not None:
+        await channel.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency-ms", type=float, default=1.0)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--target", help="host:port of a Sparksee server to use instead of the stub")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.latency_ms / 1000, args.iterations, args.target))
+    if args.target:
+        print_table(f"execute_query against {args.target}", results)
+    else:
+        print_table(f"execute_query, {args.latency_ms}ms per RPC", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Logging cost per request for each way of shipping loguru records to OTLP.
+
+Each simulated request runs inside a sampled span and logs ``--infos``
+records at INFO plus ``--errors`` from one call site at ERROR, like a
+request hitting a failing database. The console sink writes to
+``os.devnull`` and the log exporter discards its batches, so the numbers
+show the cost paid on the request path and not any I/O. ``legacy`` is the
+former configuration: an enqueued console sink with backtrace and diagnose,
+plus a sink propagating every record through stdlib logging into the OTLP
+``LoggingHandler``. The ``direct`` variants use ``OTLPSink``, with the
+console sink enqueued or writing in place.
+"""
+import argparse
+import logging
+import os
+import time
+
+from loguru import logger
+from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
+from opentelemetry.sdk._logs.export import BatchLogRecordProcessor, LogExporter, LogExportResult
+from opentelemetry.sdk.trace import TracerProvider
+
+from monitoring.logging import LogSampler, OTLPSink, PropagateHandler
+
+FORMAT = "{level}: {time:YYYY-MM-DD at HH:mm:ss} | Request ID: {extra[request_id]} | {message}"
+
+
+class DiscardingLogExporter(LogExporter):
+    def export(self, batch):
+        return LogExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def configure(variant: str, console, logger_provider: LoggerProvider, rate_limit: float):
+    logger.remove()
+    logging.getLogger().handlers.clear()
+    logger.configure(extra={"request_id": "N/A"})
+    if variant == "none":
+        return
+
+    if variant == "legacy":
+        logger.add(
+            console, enqueue=True, format=FORMAT, backtrace=True, diagnose=True, catch=True
+        )
+        logging.getLogger().addHandler(
+            LoggingHandler(level=logging.NOTSET, logger_provider=logger_provider)
+        )
+        logger.add(PropagateHandler(), format=FORMAT, colorize=False, level="INFO")
+        return
+
+    log_sampler = None
+    if variant == "direct+rate-limit":
+        log_sampler = LogSampler(sample_rates={}, rate_limits={"ERROR": rate_limit})
+    logger.add(
+        console,
+        enqueue=variant == "direct+enqueue",
+        format=FORMAT,
+        backtrace=False,
+        diagnose=False,
+        filter=log_sampler,
+        catch=True,
+    )
+    logger.add(
+        OTLPSink(logger_provider),
+        format="{message}",
+        backtrace=False,
+        diagnose=False,
+        level="INFO",
+        filter=log_sampler,
+        catch=True,
+    )
+
+
+def request_seconds(tracer, requests: int, infos: int, errors: int) -> float:
+    error = ConnectionError("failed to connect to all addresses")
+    started_at = time.perf_counter()
+    for index in range(requests):
+        with tracer.start_as_current_span("request"), logger.contextualize(request_id=index):
+            for _ in range(infos):
+                logger.info("Fetched {} rows for {}", 25, "GetTSP")
+            for _ in range(errors):
+                logger.error("Query run  error: {}", error)
+    return (time.perf_counter() - started_at) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--infos", type=int, default=2)
+    parser.add_argument("--errors", type=int, default=1)
+    parser.add_argument(
+        "--rate-limit", type=float, default=20, help="ERROR records per second for the limited run"
+    )
+    args = parser.parse_args()
+
+    tracer = TracerProvider().get_tracer(__name__)
+    results = {}
+    with open(os.devnull, "w") as console:
+        for variant in ("none", "legacy", "direct+enqueue", "direct", "direct+rate-limit"):
+            logger_provider = LoggerProvider()
+            logger_provider.add_log_record_processor(
+                BatchLogRecordProcessor(DiscardingLogExporter())
+            )
+            configure(variant, console, logger_provider, args.rate_limit)
+            request_seconds(tracer, 1_000, args.infos, args.errors)
+            results[variant] = request_seconds(tracer, args.requests, args.infos, args.errors)
+            logger.remove()
+            logger_provider.shutdown()
+
+    print(
+        f"{args.requests} requests, {args.infos} INFO + {args.errors} ERROR records per request"
+    )
+    for variant, seconds in results.items():
+        overhead = seconds - results["none"]
+        print(f"  {variant:<18} {seconds * 1e6:9.1f} us/request  logging {overhead * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
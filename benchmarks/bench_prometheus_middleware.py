@@ -0,0 +1,145 @@
+"""Per-request overhead of the request metrics middleware.
+
+Requests are driven straight through the ASGI interface of a FastAPI app
+with as many routes as the service, so the numbers contain no network or
+server time. ``legacy`` is the former ``BaseHTTPMiddleware`` implementation,
+kept here as the reference point; ``asgi`` is ``PrometheusMiddleware``.
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI
+from opentelemetry import trace
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match
+from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
+
+from monitoring.prometheus import (
+    EXCEPTIONS,
+    REQUESTS,
+    REQUESTS_IN_PROGRESS,
+    REQUESTS_PROCESSING_TIME,
+    RESPONSES,
+    PrometheusMiddleware,
+)
+
+
+class LegacyPrometheusMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, app_name: str = "fastapi-app") -> None:
+        super().__init__(app)
+        self.app_name = app_name
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        method = request.method
+        path, is_handled_path = self.get_path(request)
+
+        if not is_handled_path:
+            return await call_next(request)
+
+        REQUESTS_IN_PROGRESS.labels(method=method, path=path, app_name=self.app_name).inc()
+        REQUESTS.labels(method=method, path=path, app_name=self.app_name).inc()
+        before_time = time.perf_counter()
+        try:
+            response = await call_next(request)
+        except BaseException as e:
+            status_code = HTTP_500_INTERNAL_SERVER_ERROR
+            EXCEPTIONS.labels(
+                method=method, path=path, exception_type=type(e).__name__, app_name=self.app_name
+            ).inc()
+            raise e from None
+        else:
+            status_code = response.status_code
+            after_time = time.perf_counter()
+            span = trace.get_current_span()
+            trace_id = trace.format_trace_id(span.get_span_context().trace_id)
+            REQUESTS_PROCESSING_TIME.labels(
+                method=method, path=path, app_name=self.app_name
+            ).observe(after_time - before_time, exemplar={"TraceID": trace_id})
+        finally:
+            RESPONSES.labels(
+                method=method, path=path, status_code=status_code, app_name=self.app_name
+            ).inc()
+            REQUESTS_IN_PROGRESS.labels(method=method, path=path, app_name=self.app_name).dec()
+
+        return response
+
+    @staticmethod
+    def get_path(request: Request):
+        for route in request.app.routes:
+            match, child_scope = route.matches(request.scope)
+            if match == Match.FULL:
+                return route.path, True
+
+        return request.url.path, False
+
+
+def build_app(middleware=None, n_routes: int = 40) -> FastAPI:
+    app = FastAPI(openapi_url=None)
+    for index in range(n_routes):
+        app.add_api_route(f"/v1/resource_{index}/{{item_id}}", lambda item_id: {"id": item_id})
+    app.add_api_route("/v1/discovery/tsps/{tsp_id}", lambda tsp_id: {"id": tsp_id})
+    if middleware is not None:
+        app.add_middleware(middleware, app_name="bench")
+    return app
+
+
+async def request_seconds(app: FastAPI, requests: int, paths: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    scopes = [
+        {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": f"/v1/discovery/tsps/{index}",
+            "raw_path": f"/v1/discovery/tsps/{index}".encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [],
+            "server": ("testserver", 80),
+            "client": ("testclient", 50000),
+        }
+        for index in range(paths)
+    ]
+    started_at = time.perf_counter()
+    for index in range(requests):
+        await app(dict(scopes[index % paths]), receive, send)
+    return (time.perf_counter() - started_at) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--routes", type=int, default=40)
+    parser.add_argument(
+        "--paths", type=int, default=100, help="distinct raw paths hitting the measured route"
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for name, middleware in (
+        ("none", None),
+        ("legacy", LegacyPrometheusMiddleware),
+        ("asgi", PrometheusMiddleware),
+    ):
+        app = build_app(middleware, args.routes)
+        asyncio.run(request_seconds(app, 1_000, args.paths))
+        results[name] = asyncio.run(request_seconds(app, args.requests, args.paths))
+
+    print(f"{args.requests} requests over {args.routes + 1} routes, {args.paths} distinct paths")
+    for name, seconds in results.items():
+        overhead = seconds - results["none"]
+        print(f"  {name:<8} {seconds * 1e6:9.1f} us/request  middleware {overhead * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Shared helpers for the benchmark scripts.
+
+The scripts import the application modules the same way the service does, so
+run them from the repository root with both the root and ``repository/`` on
+the path::
+
+    PYTHONPATH=.:repository python benchmarks/bench_execute_query.py
+"""
+import asyncio
+import itertools
+import random
+import statistics
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Awaitable, Callable
+
+
+@dataclass
+class LatencyStub:
+    """Stand-in for ``SparkseeGRPCServerStub`` where every RPC costs ``latency``."""
+
+    latency: float = 0.001
+    rows: tuple = ()
+
+    def __post_init__(self):
+        self._query_ids = itertools.count(1)
+
+    async def _round_trip(self):
+        await asyncio.sleep(self.latency)
+
+    async def RunQuery(self, query):  # noqa
+        await self._round_trip()
+        return SimpleNamespace(queryId=next(self._query_ids))
+
+    async def GetResultRows(self, arguments):  # noqa
+        await self._round_trip()
+        return SimpleNamespace(rows=list(self.rows), ByteSize=lambda: 0)
+
+    async def CloseQuery(self, result_set):  # noqa
+        await self._round_trip()
+
+    async def BeginTx(self, session):  # noqa
+        await self._round_trip()
+
+    async def CommitTx(self, session):  # noqa
+        await self._round_trip()
+
+
+def make_manager(stub, query_close_mode: str):
+    """``SparkseeSessionManager`` talking to ``stub`` instead of a channel."""
+    from pb.sparksee_server_pb2 import Session
+    from session_manager import SparkseeSessionManager
+
+    manager = SparkseeSessionManager(query_close_mode=query_close_mode)
+    manager.stub = stub
+    manager.session = Session()
+    return manager
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[int(len(ordered) * 0.95) - 1] * 1000,
+    }
+
+
+async def time_async(
+    func: Callable[[], Awaitable], iterations: int
+) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        await func()
+        samples.append(time.perf_counter() - started_at)
+    return samples
+
+
+def print_table(title: str, results: dict[str, dict[str, float]]):
+    print(title)
+    for name, stats in results.items():
+        columns = "  ".join(f"{key}={value:9.3f}" for key, value in stats.items())
+        print(f"  {name:<32} {columns}")
+
+
+def result_rows_class():
+    """Message class returned by ``GetResultRows``, resolved from the service descriptor."""
+    from google.protobuf import message_factory
+
+    from pb import sparksee_server_pb2
+
+    service = next(iter(sparksee_server_pb2.DESCRIPTOR.services_by_name.values()))
+    output_type = service.methods_by_name["GetResultRows"].output_type
+    return message_factory.GetMessageClass(output_type)
+
+
+def synthetic_result_rows(n_rows: int, seed: int = 0, null_ratio: float = 0.05):
+    """Result rows shaped like TSP reads: oid, id, name, a timestamp and a nullable long."""
+    rng = random.Random(seed)
+    response = result_rows_class()()
+    for index in range(n_rows):
+        row = response.rows.add()
+        row.columnValues.add().oidValue = 1099511627776 + index
+        row.columnValues.add().stringValue = f"{rng.getrandbits(64):016x}"
+        row.columnValues.add().stringValue = f"Transport Provider {index}"
+        row.columnValues.add().timestampValue.FromSeconds(1700000000 + index)
+        value = row.columnValues.add()
+        if rng.random() < null_ratio:
+            value.nullValue = True
+        else:
+            value.longValue = rng.getrandbits(32)
+    return response
@@ -0,0 +1,281 @@
+"""Micro-benchmarks of the Python-side hot paths, with baseline comparison.
+
+Every case runs a fixed amount of work on inputs generated from ``--seed``,
+``--repeat`` times after one warm-up round, and reports the time per
+operation in microseconds. Results are written as JSON with ``--output``;
+``--baseline`` compares them against a previous result file and exits
+with status 1 when a case got slower by more than ``--threshold``. The
+fastest round is compared by default, as it is the least disturbed by
+other load on the machine; ``--metric median`` compares the medians. A
+baseline of another ``--seed`` is refused, and one of another ``--quick``,
+Python version or platform only warned about::
+
+    PYTHONPATH=.:repository python benchmarks/suite.py --save-baseline --baseline baseline.json
+    PYTHONPATH=.:repository python benchmarks/suite.py --baseline baseline.json --threshold 0.1
+
+The Sparksee stub answers without latency and the query cache and
+single-flight layers are left to the configuration, so ``query_executor``
+and ``execute_query`` show the client-side cost of a call only.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from common import LatencyStub, make_manager, synthetic_result_rows
+from pydantic import BaseModel
+
+from base import BaseRepository, parse_sparksee_value, query_executor
+
+SCHEMA_VERSION = 1
+
+
+class BenchRow(BaseModel):
+    node_id: int
+    id: str  # noqa
+    name: str
+    created_at: datetime
+    capacity: int | None
+
+
+class BenchRepository(BaseRepository[BenchRow]):
+    model = BenchRow
+    entity = "TSP"
+
+    @query_executor(query_type="algebra")
+    async def get_rows(self, session_manager, **kwargs):
+        return session_manager, self.algebra_match_conditions(**kwargs)
+
+
+@dataclass
+class Case:
+    """``number`` calls of ``func`` per round, each doing ``ops`` operations.
+
+    ``func`` may be a coroutine function, in which case ``is_async`` is set.
+    """
+
+    name: str
+    func: Callable[[], Any] | Callable[[], Awaitable[Any]]
+    number: int
+    ops: int = 1
+    is_async: bool = False
+
+
+def build_cases(seed: int, quick: bool) -> list[Case]:
+    rng = random.Random(seed)
+    repository = BenchRepository()
+    cases = []
+
+    values = [
+        value for row in synthetic_result_rows(1_000, seed=seed).rows for value in row.columnValues
+    ]
+
+    def parse_values():
+        for value in values:
+            parse_sparksee_value(value)
+
+    cases.append(Case("parse_sparksee_value", parse_values, number=10, ops=len(values)))
+
+    for rows in (10, 1_000, 100_000):
+        response = synthetic_result_rows(rows, seed=seed)
+        for row_format in ("model", "tuple"):
+            process = partial(
+                repository.process_query_response, response=response, row_format=row_format
+            )
+            cases.append(
+                Case(
+                    f"process_query_response[{rows}, {row_format}]",
+                    process,
+                    number=max(1, (2_000 if quick else 20_000) // rows),
+                )
+            )
+
+    names = [f"Transport Provider {rng.randrange(10_000)}" for _ in range(3)]
+    tsp_id, node_id = f"{rng.getrandbits(64):016x}", rng.getrandbits(40)
+    cases.append(
+        Case(
+            "algebra_match_conditions[scan]",
+            repository.algebra_match_conditions,
+            number=10_000,
+        )
+    )
+    cases.append(
+        Case(
+            "algebra_match_conditions[3 filters]",
+            lambda: repository.algebra_match_conditions(id=tsp_id, name=names[0], node_id=node_id),
+            number=10_000,
+        )
+    )
+    countries = [f"Country {rng.randrange(100)}" for _ in range(10)]
+    cases.append(
+        Case(
+            "create_conditions_from_list[10]",
+            lambda: repository.create_conditions_from_list("'COUNTRY'.'name'", countries),
+            number=10_000,
+        )
+    )
+
+    stub = LatencyStub(latency=0, rows=tuple(synthetic_result_rows(10, seed=seed).rows))
+    manager = make_manager(stub, "sync")
+
+    async def execute_query():
+        await manager.execute_query(stmt="GRAPH::SCAN('TSP')", max_rows=10)
+
+    async def executor():
+        await repository.get_rows(session_manager=manager, size=10, name=names[1])
+
+    cases.append(Case("execute_query[10 rows]", execute_query, number=2_000, is_async=True))
+    cases.append(Case("query_executor[10 rows]", executor, number=2_000, is_async=True))
+    return cases
+
+
+def measure(case: Case, repeat: int) -> dict[str, float]:
+    """Per-operation statistics in microseconds over ``repeat`` rounds."""
+
+    if case.is_async:
+        async def timed_round() -> float:
+            started_at = time.perf_counter()
+            for _ in range(case.number):
+                await case.func()
+            return time.perf_counter() - started_at
+
+        def run_round() -> float:
+            return asyncio.run(timed_round())
+    else:
+        def run_round() -> float:
+            func = case.func
+            started_at = time.perf_counter()
+            for _ in range(case.number):
+                func()
+            return time.perf_counter() - started_at
+
+    run_round()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        samples = [run_round() / (case.number * case.ops) * 1e6 for _ in range(repeat)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        "median_us": statistics.median(samples),
+        "min_us": min(samples),
+        "mean_us": statistics.fmean(samples),
+        "stdev_us": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "rounds": repeat,
+        "number": case.number,
+        "ops": case.ops,
+    }
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float,
+    metric: str = "min_us",
+) -> list[str]:
+    """Print the change of ``metric`` against ``baseline`` and return the regressed cases."""
+    regressions = []
+    print(f"Against baseline, {metric} (threshold {threshold:+.0%})")
+    for name, stats in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"  {name:<42} {stats[metric]:12.3f} us   (new)")
+            continue
+        change = stats[metric] / before[metric] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            f"  {name:<42} {before[metric]:12.3f} -> {stats[metric]:12.3f} us"
+            f"  {change:+7.1%}{flag}"
+        )
+    for name in baseline.keys() - results.keys():
+        print(f"  {name:<42} missing from this run")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--quick", action="store_true", help="less work per round, for smoke runs")
+    parser.add_argument("-k", "--filter", default="", help="only run cases containing this text")
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="result file to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.10, help="relative slowdown that fails a case"
+    )
+    parser.add_argument("--metric", choices=("min", "median"), default="min")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="write the results to --baseline instead"
+    )
+    args = parser.parse_args()
+    if args.save_baseline and args.baseline is None:
+        parser.error("--save-baseline requires --baseline")
+    baseline = None
+    if args.baseline and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text())
+        # other inputs make the timings incomparable, not just noisier
+        if baseline.get("seed") != args.seed:
+            parser.error(
+                f"baseline was run with --seed {baseline.get('seed')}, this run uses {args.seed}"
+            )
+
+    results = {}
+    for case in build_cases(args.seed, args.quick):
+        if args.filter not in case.name:
+            continue
+        results[case.name] = stats = measure(case, args.repeat)
+        print(
+            f"  {case.name:<42} median={stats['median_us']:12.3f} us"
+            f"  min={stats['min_us']:12.3f} us  stdev={stats['stdev_us']:9.3f}"
+        )
+
+    document = {
+        "schema": SCHEMA_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "quick": args.quick,
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(document, indent=2) + "\n")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(document, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+    if baseline is not None:
+        for key, label in (
+            ("quick", "--quick"), ("python", "Python version"), ("platform", "platform")
+        ):
+            if baseline.get(key) != document[key]:
+                print(f"Warning: baseline and this run differ in {label}")
+        baseline_results = {
+            name: stats for name, stats in baseline["results"].items() if args.filter in name
+        }
+        regressions = compare(
+            results, baseline_results, args.threshold, metric=f"{args.metric}_us"
+        )
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ class AppConfig:
         version = environ.var()
         debug = environ.var()
         allowed_hosts = environ.var()
+        debug_endpoints = environ.bool_var(default=False)
 
     @environ.config(prefix="DB")
     class DB:
@@ -22,11 +23,39 @@ class AppConfig:
         port = environ.var()
         name = environ.var(default="Sign-Air-Discovery")
         certificate_path = environ.var(default="")
+        replica_host = environ.var(default="")
+        replica_port = environ.var(default="")
+        pool_size = environ.var(default=10, converter=int)
+        pool_channels = environ.var(default=2, converter=int)
+        pool_acquire_timeout = environ.var(default=10.0, converter=float)
+        pool_idle_timeout = environ.var(default=300.0, converter=float)
+        pool_health_check_interval = environ.var(default=30.0, converter=float)
+        pool_max_lifetime = environ.var(default=3600.0, converter=float)
+        query_close_mode = environ.var(default="deferred")
+        query_cache_enabled = environ.bool_var(default=False)
+        query_cache_ttl = environ.var(default=30.0, converter=float)
+        query_cache_max_entries = environ.var(default=10000, converter=int)
+        slow_query_threshold = environ.var(default=0.5, converter=float)
+        slow_query_log_size = environ.var(default=200, converter=int)
+        query_profile_sample_rate = environ.var(default=0.0, converter=float)
+        single_flight_enabled = environ.bool_var(default=True)
+        node_loader_window = environ.var(default=0.002, converter=float)
+        node_loader_max_batch_size = environ.var(default=500, converter=int)
+        recommendation_index_enabled = environ.bool_var(default=False)
+        recommendation_index_max_age = environ.var(default=300.0, converter=float)
+        recommendation_index_refresh_interval = environ.var(default=60.0, converter=float)
+        bulk_chunk_size = environ.var(default=500, converter=int)
 
         @property
         def url(self):
             return f"{self.host}:{self.port}"
 
+        @property
+        def replica_url(self):
+            if not self.replica_host:
+                return None
+            return f"{self.replica_host}:{self.replica_port or self.port}"
+
         @property
         def grpc_config(self):
             return [
@@ -52,10 +81,32 @@ class AppConfig:
                 ),
             ]
 
+    @environ.config(prefix="TRACING")
+    class Tracing:
+        sample_ratio = environ.var(default=0.1, converter=float)
+        # both record every span to decide at its end, so they cost more than sampling alone
+        keep_errors = environ.bool_var(default=False)
+        slow_span_threshold = environ.var(default=0.0, converter=float)
+        max_queue_size = environ.var(default=2048, converter=int)
+        max_export_batch_size = environ.var(default=512, converter=int)
+        schedule_delay = environ.var(default=5.0, converter=float)
+        export_timeout = environ.var(default=30.0, converter=float)
+
+    @environ.config(prefix="LOG")
+    class Logging:
+        level = environ.var(default="INFO")
+        otlp_mode = environ.var(default="direct")
+        enqueue = environ.bool_var(default=False)
+        diagnose = environ.bool_var(default=True)
+        sample_rates = environ.var(default="")
+        rate_limits = environ.var(default="WARNING=20,ERROR=20")
+
     env = environ.var()
 
     api: API = environ.group(API)
     db: DB = environ.group(DB)
+    tracing: Tracing = environ.group(Tracing)
+    logging: Logging = environ.group(Logging)
     use_monitoring = environ.bool_var()
     otel_collector_url = environ.var()
 
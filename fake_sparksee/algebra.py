@@ -0,0 +1,328 @@
+"""Parser and evaluator for the subset of Sparksee algebra the repositories emit.
+
+A statement is either a single expression or ``LET @a = expr, ... IN expr``.
+Expressions are operator calls over tables, which are lists of rows:
+
+- ``VALUES([types], [[cells], ...])`` and ``PRODUCT``/``PROJECT``
+- ``GRAPH::SCAN``, ``GRAPH::SELECT`` with ``'TYPE'.'attr' = value AND ...``
+- ``GRAPH::GET``/``GRAPH::SET`` of ``'TYPE'.'attr'`` by an oid column
+- ``GRAPH::INSERT_NODES``, ``GRAPH::INSERT_EDGES``, ``GRAPH::CONNECT``,
+  ``GRAPH::NEIGHBORS`` and ``GRAPH::REMOVE``
+
+Operators append their result column to the input rows, so ``INSERT_NODES``
+over ``[id, name]`` rows yields ``[id, name, oid]``. ``CONNECT`` only follows
+edges from the first to the second column.
+"""
+import re
+from typing import Any, Callable
+
+from fake_sparksee.graph import Graph, Oid, Undo
+
+TOKEN = re.compile(
+    r"""
+    \s*(?:
+        (?P<string>'(?:[^'\\]|\\.)*')
+      | (?P<number>-?\d+(?:\.\d+)?L?)
+      | (?P<var>@\w+)
+      | (?P<name>[A-Za-z_]\w*)
+      | (?P<punct>::|->|<-|<>|[()\[\]{},.=:;\-])
+    )
+    """,
+    re.VERBOSE,
+)
+UNESCAPE = re.compile(r"\\(.)")
+CELL_TYPES: dict[str, Callable[[Any], Any]] = {
+    "LONG": int,
+    "INT": int,
+    "INTEGER": int,
+    "OID": Oid,
+    "STRING": str,
+    "DOUBLE": float,
+    "BOOLEAN": bool,
+    "BOOL": bool,
+}
+KEYWORDS = {"NULL": None, "TRUE": True, "FALSE": False}
+
+Table = list[list[Any]]
+
+
+class StatementError(Exception):
+    """Statement the stand-in server cannot parse."""
+
+
+def tokenize(text: str) -> list[tuple[str, Any]]:
+    tokens, position = [], 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise StatementError(f"Unexpected input at {position}: {text[position:position + 20]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            value = UNESCAPE.sub(r"\1", value[1:-1])
+        elif kind == "number":
+            if value.endswith("L"):
+                value = int(value[:-1])
+            else:
+                value = float(value) if "." in value else int(value)
+        tokens.append((kind, value))
+    return tokens
+
+
+class Tokens:
+    def __init__(self, text: str):
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self, offset: int = 0) -> tuple[str, Any] | None:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def next(self) -> tuple[str, Any]:
+        token = self.peek()
+        if token is None:
+            raise StatementError("Unexpected end of statement")
+        self.position += 1
+        return token
+
+    def accept(self, value: str) -> bool:
+        token = self.peek()
+        if token is not None and token[0] in ("punct", "name") and _same(token, value):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, value: str):
+        if not self.accept(value):
+            raise StatementError(f"Expected {value!r}, got {self.peek()!r}")
+
+    def at_end(self) -> bool:
+        while self.accept(";"):
+            pass
+        return self.position >= len(self.tokens)
+
+
+def _same(token: tuple[str, Any], value: str) -> bool:
+    kind, text = token
+    return text.upper() == value.upper() if kind == "name" else text == value
+
+
+# AST nodes are tuples: ("var", name), ("call", name, args), ("list", items),
+# ("lit", value), ("attr", type, name), ("type", name) and ("and", conditions)
+# of ("eq", attr, value) for the SELECT condition
+
+
+def parse(text: str):
+    tokens = Tokens(text)
+    if tokens.accept("LET"):
+        bindings = []
+        while True:
+            kind, name = tokens.next()
+            if kind != "var":
+                raise StatementError(f"Expected a variable, got {name!r}")
+            tokens.expect("=")
+            bindings.append((name, _parse_argument(tokens)))
+            if not tokens.accept(","):
+                break
+        tokens.expect("IN")
+        result = _parse_argument(tokens)
+    else:
+        bindings, result = [], _parse_argument(tokens)
+    if not tokens.at_end():
+        raise StatementError(f"Unexpected {tokens.peek()!r} after the statement")
+    return bindings, result
+
+
+def _parse_argument(tokens: Tokens):
+    left = _parse_primary(tokens)
+    if not tokens.accept("="):
+        return left
+    conditions = [("eq", left, _parse_primary(tokens))]
+    while tokens.accept("AND"):
+        attribute = _parse_primary(tokens)
+        tokens.expect("=")
+        conditions.append(("eq", attribute, _parse_primary(tokens)))
+    return ("and", conditions)
+
+
+def _parse_primary(tokens: Tokens):
+    kind, value = tokens.next()
+    if kind == "var":
+        return ("var", value)
+    if kind == "number":
+        return ("lit", value)
+    if kind == "string":
+        if tokens.accept("."):
+            attribute_kind, attribute = tokens.next()
+            if attribute_kind != "string":
+                raise StatementError(f"Expected an attribute name, got {attribute!r}")
+            return ("attr", value, attribute)
+        return ("lit", value)
+    if kind == "punct" and value == "[":
+        items = []
+        if not tokens.accept("]"):
+            while True:
+                items.append(_parse_primary(tokens))
+                if tokens.accept("]"):
+                    break
+                tokens.expect(",")
+        return ("list", items)
+    if kind == "name":
+        name = value.upper()
+        if name in KEYWORDS:
+            return ("lit", KEYWORDS[name])
+        if tokens.accept("::"):
+            _, operator = tokens.next()
+            name = f"{name}::{operator.upper()}"
+        if tokens.accept("("):
+            args = []
+            if not tokens.accept(")"):
+                while True:
+                    args.append(_parse_argument(tokens))
+                    if tokens.accept(")"):
+                        break
+                    tokens.expect(",")
+            return ("call", name, args)
+        return ("type", name)
+    raise StatementError(f"Unexpected {value!r}")
+
+
+class Evaluator:
+    """Runs parsed statements against ``graph``, logging inverses of writes to ``undo``."""
+
+    def __init__(self, graph: Graph, undo: Undo | None = None):
+        self.graph = graph
+        self.undo = undo
+        self.variables: dict[str, Any] = {}
+
+    def run(self, text: str) -> Table:
+        bindings, result = parse(text)
+        for name, expression in bindings:
+            self.variables[name] = self.eval(expression)
+        table = self.eval(result)
+        if not isinstance(table, list):
+            raise StatementError("Statement does not evaluate to a table")
+        return table
+
+    def eval(self, node) -> Any:
+        kind = node[0]
+        if kind == "var":
+            if node[1] not in self.variables:
+                raise StatementError(f"Unknown variable {node[1]}")
+            return self.variables[node[1]]
+        if kind == "lit":
+            return node[1]
+        if kind == "list":
+            return [self.eval(item) for item in node[1]]
+        if kind in ("attr", "type", "and"):
+            return node
+        operator = OPERATORS.get(node[1])
+        if operator is None:
+            raise StatementError(f"Unsupported operator {node[1]}")
+        return operator(self, *[self.eval(arg) for arg in node[2]])
+
+    def values(self, types: list, rows: list) -> Table:
+        converters = []
+        for cell_type in types:
+            if cell_type[0] != "type" or cell_type[1] not in CELL_TYPES:
+                raise StatementError(f"Unsupported VALUES type {cell_type!r}")
+            converters.append(CELL_TYPES[cell_type[1]])
+        return [
+            [None if cell is None else convert(cell) for convert, cell in zip(converters, row)]
+            for row in rows
+        ]
+
+    def scan(self, type_: str) -> Table:
+        return [[oid] for oid in self.graph.scan(type_)]
+
+    def select(self, condition) -> Table:
+        matched = None
+        for _, attribute, value in condition[1]:
+            if attribute[0] != "attr":
+                raise StatementError(f"SELECT compares {attribute!r}, not an attribute")
+            oids = self.graph.select(attribute[1], attribute[2], self.eval(value))
+            matched = oids if matched is None else matched & oids
+        return [[Oid(oid)] for oid in sorted(matched or ())]
+
+    def get(self, table: Table, column: int, attributes: list) -> Table:
+        attributes = [_attribute(attribute) for attribute in attributes]
+        return [
+            row + [self.graph.get_attribute(row[column], *attribute) for attribute in attributes]
+            for row in table
+        ]
+
+    def set(self, table: Table, column: int, attributes: list, overwrite: bool = True) -> Table:
+        for row in table:
+            for index, attribute in enumerate(attributes):
+                if attribute is None or index == column:
+                    continue
+                type_, name = _attribute(attribute)
+                self.graph.set_attribute(row[column], type_, name, row[index], self.undo)
+        return table
+
+    def insert_nodes(self, type_: str, table: Table) -> Table:
+        return [row + [self.graph.add_node(type_, undo=self.undo)] for row in table]
+
+    def insert_edges(self, type_: str, tail: int, head: int, table: Table) -> Table:
+        return [
+            row + [self.graph.add_edge(type_, row[tail], row[head], self.undo)] for row in table
+        ]
+
+    def connect(self, table: Table, edge_types: list) -> Table:
+        return [
+            row + [Oid(edge)]
+            for row in table
+            for edge_type in edge_types
+            for edge in sorted(self.graph.edges_between(row[0], row[1], edge_type))
+        ]
+
+    def neighbors(self, table: Table, column: int, edge_types: list, direction=("type", "OUTGOING")) -> Table:
+        outgoing = direction[1] != "INGOING"
+        return [
+            row + [Oid(neighbour)]
+            for row in table
+            for edge_type in edge_types
+            for neighbour in sorted(self.graph.neighbours(row[column], edge_type, outgoing))
+        ]
+
+    def remove(self, table: Table, columns=None) -> Table:
+        for row in table:
+            self.graph.remove(row[0], self.undo)
+        return table
+
+    def product(self, left: Table, right: Table) -> Table:
+        return [left_row + right_row for left_row in left for right_row in right]
+
+    def project(self, table: Table, columns: list) -> Table:
+        return [[row[column] for column in columns] for row in table]
+
+
+def _attribute(attribute) -> tuple[str, str]:
+    if not isinstance(attribute, tuple) or attribute[0] != "attr":
+        raise StatementError(f"Expected 'TYPE'.'attribute', got {attribute!r}")
+    return attribute[1], attribute[2]
+
+
+OPERATORS: dict[str, Callable[..., Any]] = {
+    "VALUES": Evaluator.values,
+    "PRODUCT": Evaluator.product,
+    "PROJECT": Evaluator.project,
+    "GRAPH::SCAN": Evaluator.scan,
+    "GRAPH::SELECT": Evaluator.select,
+    "GRAPH::GET": Evaluator.get,
+    "GRAPH::SET": Evaluator.set,
+    "GRAPH::INSERT_NODES": Evaluator.insert_nodes,
+    "GRAPH::INSERT_EDGES": Evaluator.insert_edges,
+    "GRAPH::CONNECT": Evaluator.connect,
+    "GRAPH::NEIGHBORS": Evaluator.neighbors,
+    "GRAPH::REMOVE": Evaluator.remove,
+}
+
+
+def run_algebra(graph: Graph, text: str, undo: Undo | None = None) -> Table:
+    try:
+        return Evaluator(graph, undo).run(text)
+    except (IndexError, TypeError, ValueError) as error:
+        raise StatementError(str(error)) from error
@@ -0,0 +1,245 @@
+"""Parser and evaluator for the subset of Cypher the repositories emit.
+
+Supported: ``MATCH`` with comma-separated paths of nodes
+``(var:LABEL {attr: value})`` joined by ``-[:TYPE]->`` or ``<-[:TYPE]-``, an
+optional ``WHERE`` of ``var.attr = value`` comparisons combined with
+``AND``/``OR`` and parentheses, and ``RETURN [DISTINCT]`` of ``var`` (the
+node oid) or ``var.attr`` items with optional aliases.
+
+Matching binds one variable at a time, starting from the most selective
+one and following edges from bound variables, and checks every ``WHERE``
+conjunct as soon as its variables are bound.
+"""
+import itertools
+from dataclasses import dataclass, field
+from typing import Any
+
+from fake_sparksee.algebra import StatementError, Table, Tokens
+from fake_sparksee.graph import Graph, Oid
+
+
+@dataclass
+class NodePattern:
+    label: str | None = None
+    properties: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Query:
+    nodes: dict[str, NodePattern]
+    # (tail variable, edge type, head variable)
+    edges: list[tuple[str, str, str]]
+    # conjuncts of the WHERE clause with the variables each one reads
+    conditions: list[tuple[Any, set[str]]]
+    returns: list[tuple[str, str | None]]
+    distinct: bool
+
+
+def parse(text: str) -> Query:
+    tokens = Tokens(text)
+    tokens.expect("MATCH")
+    nodes, edges, anonymous = {}, [], itertools.count()
+    while True:
+        variable = _parse_node(tokens, nodes, anonymous)
+        while tokens.peek() is not None and tokens.peek()[1] in ("-", "<-"):
+            incoming = tokens.next()[1] == "<-"
+            tokens.expect("[")
+            tokens.expect(":")
+            edge_type = _name(tokens)
+            tokens.expect("]")
+            tokens.expect("-" if incoming else "->")
+            target = _parse_node(tokens, nodes, anonymous)
+            edges.append((target, edge_type, variable) if incoming else (variable, edge_type, target))
+            variable = target
+        if not tokens.accept(","):
+            break
+
+    conditions = []
+    if tokens.accept("WHERE"):
+        condition = _parse_or(tokens)
+        conjuncts = condition[1] if condition[0] == "and" else [condition]
+        conditions = [(conjunct, _variables(conjunct)) for conjunct in conjuncts]
+
+    tokens.expect("RETURN")
+    distinct = tokens.accept("DISTINCT")
+    returns = []
+    while True:
+        variable = _name(tokens)
+        attribute = _name(tokens) if tokens.accept(".") else None
+        if tokens.accept("AS"):
+            _name(tokens)
+        if variable not in nodes:
+            raise StatementError(f"RETURN of unknown variable {variable}")
+        returns.append((variable, attribute))
+        if not tokens.accept(","):
+            break
+    if not tokens.at_end():
+        raise StatementError(f"Unexpected {tokens.peek()!r} after RETURN")
+    return Query(nodes, edges, conditions, returns, distinct)
+
+
+def _name(tokens: Tokens) -> str:
+    kind, value = tokens.next()
+    if kind != "name":
+        raise StatementError(f"Expected a name, got {value!r}")
+    return value
+
+
+def _parse_node(tokens: Tokens, nodes: dict[str, NodePattern], anonymous) -> str:
+    tokens.expect("(")
+    variable = f"_{next(anonymous)}"
+    if tokens.peek() is not None and tokens.peek()[0] == "name":
+        variable = _name(tokens)
+    pattern = nodes.setdefault(variable, NodePattern())
+    if tokens.accept(":"):
+        label = _name(tokens)
+        if pattern.label not in (None, label):
+            raise StatementError(f"{variable} is matched as {pattern.label} and {label}")
+        pattern.label = label
+    if tokens.accept("{"):
+        while True:
+            attribute = _name(tokens)
+            tokens.expect(":")
+            kind, value = tokens.next()
+            if kind not in ("string", "number"):
+                raise StatementError(f"Expected a literal for {attribute}, got {value!r}")
+            pattern.properties[attribute] = value
+            if not tokens.accept(","):
+                break
+        tokens.expect("}")
+    tokens.expect(")")
+    return variable
+
+
+def _parse_or(tokens: Tokens):
+    terms = [_parse_and(tokens)]
+    while tokens.accept("OR"):
+        terms.append(_parse_and(tokens))
+    return terms[0] if len(terms) == 1 else ("or", terms)
+
+
+def _parse_and(tokens: Tokens):
+    terms = [_parse_comparison(tokens)]
+    while tokens.accept("AND"):
+        terms.append(_parse_comparison(tokens))
+    return terms[0] if len(terms) == 1 else ("and", terms)
+
+
+def _parse_comparison(tokens: Tokens):
+    if tokens.accept("("):
+        condition = _parse_or(tokens)
+        tokens.expect(")")
+        return condition
+    variable = _name(tokens)
+    tokens.expect(".")
+    attribute = _name(tokens)
+    negated = tokens.accept("<>")
+    if not negated:
+        tokens.expect("=")
+    kind, value = tokens.next()
+    if kind not in ("string", "number"):
+        raise StatementError(f"Expected a literal, got {value!r}")
+    return ("ne" if negated else "eq", variable, attribute, value)
+
+
+def _variables(condition) -> set[str]:
+    if condition[0] in ("and", "or"):
+        return set().union(*(_variables(term) for term in condition[1]))
+    return {condition[1]}
+
+
+def _holds(graph: Graph, condition, binding: dict[str, int]) -> bool:
+    kind = condition[0]
+    if kind == "and":
+        return all(_holds(graph, term, binding) for term in condition[1])
+    if kind == "or":
+        return any(_holds(graph, term, binding) for term in condition[1])
+    _, variable, attribute, value = condition
+    equal = graph.nodes[binding[variable]].attributes.get(attribute) == value
+    return equal if kind == "eq" else not equal
+
+
+def run_cypher(graph: Graph, text: str) -> Table:
+    query = parse(text)
+    rows, seen = [], set()
+    for binding in _bindings(graph, query):
+        row = []
+        for variable, attribute in query.returns:
+            oid = binding[variable]
+            row.append(Oid(oid) if attribute is None else graph.nodes[oid].attributes.get(attribute))
+        if query.distinct:
+            key = tuple(row)
+            if key in seen:
+                continue
+            seen.add(key)
+        rows.append(row)
+    return rows
+
+
+def _matches(graph: Graph, oid: int, pattern: NodePattern) -> bool:
+    node = graph.nodes.get(oid)
+    if node is None or (pattern.label is not None and node.type != pattern.label):
+        return False
+    return all(node.attributes.get(name) == value for name, value in pattern.properties.items())
+
+
+def _candidates(graph: Graph, pattern: NodePattern) -> list[int]:
+    if pattern.label is None:
+        raise StatementError("Unlabelled nodes must be reached over an edge")
+    if pattern.properties:
+        name, value = next(iter(pattern.properties.items()))
+        oids = sorted(graph.select(pattern.label, name, value))
+    else:
+        oids = graph.scan(pattern.label)
+    return [oid for oid in oids if _matches(graph, oid, pattern)]
+
+
+def _bindings(graph: Graph, query: Query):
+    # bind the most selective variable first, then variables reachable over edges
+    order = sorted(query.nodes, key=lambda variable: not query.nodes[variable].properties)
+    binding: dict[str, int] = {}
+
+    def next_variable() -> str:
+        for tail, _, head in query.edges:
+            if (tail in binding) != (head in binding):
+                return head if tail in binding else tail
+        return next(variable for variable in order if variable not in binding)
+
+    def candidates(variable: str) -> list[int]:
+        pattern = query.nodes[variable]
+        for tail, edge_type, head in query.edges:
+            if tail == variable and head in binding:
+                reached = graph.neighbours(binding[head], edge_type, outgoing=False)
+            elif head == variable and tail in binding:
+                reached = graph.neighbours(binding[tail], edge_type, outgoing=True)
+            else:
+                continue
+            return [oid for oid in sorted(reached) if _matches(graph, oid, pattern)]
+        return _candidates(graph, pattern)
+
+    def connected() -> bool:
+        return all(
+            graph.edges_between(binding[tail], binding[head], edge_type)
+            for tail, edge_type, head in query.edges
+            if tail in binding and head in binding
+        )
+
+    def satisfied(variable: str) -> bool:
+        return all(
+            _holds(graph, condition, binding)
+            for condition, variables in query.conditions
+            if variable in variables and variables <= binding.keys()
+        )
+
+    def extend():
+        if len(binding) == len(query.nodes):
+            yield dict(binding)
+            return
+        variable = next_variable()
+        for oid in candidates(variable):
+            binding[variable] = oid
+            if connected() and satisfied(variable):
+                yield from extend()
+            del binding[variable]
+
+    yield from extend()
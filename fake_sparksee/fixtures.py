@@ -0,0 +1,66 @@
+import json
+import random
+from pathlib import Path
+
+from fake_sparksee.graph import Graph
+
+TSP_TYPES = {
+    "Airline": "AL",
+    "Regional rail": "RRW",
+    "Long distance rail": "LDRW",
+    "Bus operators": "BUS",
+    "DRT": "DRT",
+    "Airport": "AP",
+}
+COUNTRIES = (
+    "Germany",
+    "France",
+    "Italy",
+    "Spain",
+    "Netherlands",
+    "Belgium",
+    "Poland",
+    "Czech Republic",
+    "Portugal",
+    "Austria",
+)
+TIME_SLOTS = ("Mornings", "Afternoons", "Nights")
+DATA_REQUIREMENTS_PATH = Path(__file__).parent.parent / "generate_synt_data" / "data_requirements.json"
+
+
+def build_graph(tsps: int = 1000, seed: int = 0, data_requirements_path: Path | None = None) -> Graph:
+    """Graph with the discovery reference nodes and ``tsps`` linked TSPs.
+
+    Uses the TSP types, countries and time slots of the synthetic data
+    generator, and the data requirements of ``data_requirements.json`` when
+    it exists. The same seed always yields the same graph and oids.
+    """
+    rng = random.Random(seed)
+    graph = Graph()
+    type_ids = {name: graph.add_node("TSP_TYPE", {"name": name}) for name in TSP_TYPES}
+    country_ids = [graph.add_node("COUNTRY", {"name": name}) for name in COUNTRIES]
+    time_slot_ids = [graph.add_node("TIME_SLOT", {"name": name}) for name in TIME_SLOTS]
+
+    data_requirements_path = data_requirements_path or DATA_REQUIREMENTS_PATH
+    requirement_ids: dict[str, list[int]] = {}
+    if data_requirements_path.exists():
+        for requirement in json.loads(data_requirements_path.read_text()):
+            oid = graph.add_node(
+                "DATA_REQUIREMENT", {"code": requirement["code"], "detail": requirement["detail"]}
+            )
+            for tsp_type, prefix in TSP_TYPES.items():
+                if requirement["code"].startswith(prefix):
+                    requirement_ids.setdefault(tsp_type, []).append(oid)
+
+    for index in range(tsps):
+        tsp_type = rng.choice(list(TSP_TYPES))
+        tsp = graph.add_node("TSP", {"id": f"TSP-{index:06d}", "name": f"Transport Provider {index}"})
+        graph.add_edge("BELONGS_TO", tsp, type_ids[tsp_type])
+        for country in rng.sample(country_ids, rng.randint(1, 3)):
+            graph.add_edge("OPERATES_IN", tsp, country)
+        for time_slot in rng.sample(time_slot_ids, rng.randint(1, len(time_slot_ids))):
+            graph.add_edge("HAS_AVAILABILITY", tsp, time_slot)
+        requirements = requirement_ids.get(tsp_type, [])
+        for requirement in requirements[:rng.randint(5, 10)]:
+            graph.add_edge("CAN_PROVIDE", tsp, requirement)
+    return graph
@@ -0,0 +1,162 @@
+import itertools
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator
+
+
+class GraphError(Exception):
+    """Statement refers to objects, types or attributes the graph cannot resolve."""
+
+
+class Oid(int):
+    """Object identifier of a node or an edge; encoded as ``oidValue`` in result rows."""
+
+
+@dataclass
+class Node:
+    type: str
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Edge:
+    type: str
+    tail: int
+    head: int
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+
+Undo = list[Callable[[], None]]
+
+
+@dataclass
+class Graph:
+    """In-memory directed multigraph with typed nodes and edges, as Sparksee stores them.
+
+    Nodes and edges share one oid space. Edges are indexed by type and by
+    both endpoints, and attribute values by type, so the lookups the
+    statements make cost a dictionary access. Every mutation takes an
+    optional ``undo`` list it appends its inverse to, which is how a
+    transaction is rolled back.
+    """
+
+    nodes: dict[int, Node] = field(default_factory=dict)
+    edges: dict[int, Edge] = field(default_factory=dict)
+    _oids: Iterator[int] = field(default_factory=lambda: itertools.count(1024))
+    _by_type: dict[str, set[int]] = field(default_factory=dict)
+    _out: dict[tuple[str, int], dict[int, set[int]]] = field(default_factory=dict)
+    _in: dict[tuple[str, int], dict[int, set[int]]] = field(default_factory=dict)
+    _incident: dict[int, set[int]] = field(default_factory=dict)
+    _values: dict[tuple[str, str], dict[Any, set[int]]] = field(default_factory=dict)
+
+    def add_node(self, type_: str, attributes: dict[str, Any] | None = None, undo: Undo | None = None) -> Oid:
+        oid = Oid(next(self._oids))
+        self.nodes[oid] = Node(type_)
+        self._by_type.setdefault(type_, set()).add(oid)
+        for name, value in (attributes or {}).items():
+            self.set_attribute(oid, type_, name, value)
+        if undo is not None:
+            undo.append(lambda: self.remove(oid))
+        return oid
+
+    def add_edge(self, type_: str, tail: int, head: int, undo: Undo | None = None) -> Oid:
+        self.node(tail)
+        self.node(head)
+        oid = Oid(next(self._oids))
+        self._insert_edge(oid, Edge(type_, tail, head))
+        if undo is not None:
+            undo.append(lambda: self.remove(oid))
+        return oid
+
+    def _insert_edge(self, oid: int, edge: Edge):
+        self.edges[oid] = edge
+        self._by_type.setdefault(edge.type, set()).add(oid)
+        self._out.setdefault((edge.type, edge.tail), {}).setdefault(edge.head, set()).add(oid)
+        self._in.setdefault((edge.type, edge.head), {}).setdefault(edge.tail, set()).add(oid)
+        self._incident.setdefault(edge.tail, set()).add(oid)
+        self._incident.setdefault(edge.head, set()).add(oid)
+
+    def remove(self, oid: int, undo: Undo | None = None):
+        """Remove a node with all its edges, or a single edge."""
+        edge = self.edges.pop(oid, None)
+        if edge is not None:
+            self._by_type[edge.type].discard(oid)
+            self._discard(self._out, (edge.type, edge.tail), edge.head, oid)
+            self._discard(self._in, (edge.type, edge.head), edge.tail, oid)
+            self._incident[edge.tail].discard(oid)
+            self._incident[edge.head].discard(oid)
+            if undo is not None:
+                undo.append(lambda: self._insert_edge(oid, edge))
+            return
+
+        node = self.node(oid)
+        for edge_oid in list(self._incident.get(oid, ())):
+            self.remove(edge_oid, undo)
+        self._incident.pop(oid, None)
+        attributes = dict(node.attributes)
+        for name in attributes:
+            self.set_attribute(oid, node.type, name, None)
+        if undo is not None:
+            undo.append(lambda: self._restore_node(oid, node.type, attributes))
+        del self.nodes[oid]
+        self._by_type[node.type].discard(oid)
+
+    def _restore_node(self, oid: int, type_: str, attributes: dict[str, Any]):
+        self.nodes[oid] = Node(type_)
+        self._by_type.setdefault(type_, set()).add(oid)
+        for name, value in attributes.items():
+            self.set_attribute(oid, type_, name, value)
+
+    @staticmethod
+    def _discard(index: dict, key: tuple[str, int], other: int, oid: int):
+        oids = index[key][other]
+        oids.discard(oid)
+        if not oids:
+            del index[key][other]
+
+    def node(self, oid: int) -> Node:
+        node = self.nodes.get(oid)
+        if node is None:
+            raise GraphError(f"Invalid node oid {oid}")
+        return node
+
+    def obj(self, oid: int) -> Node | Edge:
+        obj = self.nodes.get(oid) or self.edges.get(oid)
+        if obj is None:
+            raise GraphError(f"Invalid oid {oid}")
+        return obj
+
+    def get_attribute(self, oid: int, type_: str, name: str) -> Any:
+        obj = self.obj(oid)
+        if obj.type != type_:
+            return None
+        return obj.attributes.get(name)
+
+    def set_attribute(self, oid: int, type_: str, name: str, value: Any, undo: Undo | None = None):
+        obj = self.obj(oid)
+        if obj.type != type_:
+            raise GraphError(f"Object {oid} is a {obj.type}, not a {type_}")
+        previous = obj.attributes.get(name)
+        values = self._values.setdefault((type_, name), {})
+        if previous is not None:
+            values[previous].discard(oid)
+        if value is None:
+            obj.attributes.pop(name, None)
+        else:
+            obj.attributes[name] = value
+            values.setdefault(value, set()).add(oid)
+        if undo is not None:
+            undo.append(lambda: self.set_attribute(oid, type_, name, previous))
+
+    def scan(self, type_: str) -> list[Oid]:
+        return [Oid(oid) for oid in sorted(self._by_type.get(type_, ()))]
+
+    def select(self, type_: str, name: str, value: Any) -> set[int]:
+        return set(self._values.get((type_, name), {}).get(value, ()))
+
+    def neighbours(self, oid: int, edge_type: str, outgoing: bool = True) -> dict[int, set[int]]:
+        """Edge oids by the node they reach from ``oid`` over ``edge_type`` edges."""
+        index = self._out if outgoing else self._in
+        return index.get((edge_type, oid), {})
+
+    def edges_between(self, tail: int, head: int, edge_type: str) -> set[int]:
+        return self._out.get((edge_type, tail), {}).get(head, set())
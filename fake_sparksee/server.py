@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import itertools
+import random
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import grpc
+from google.protobuf import message_factory
+from google.protobuf.descriptor import FieldDescriptor
+from grpc import aio
+from loguru import logger
+
+from fake_sparksee.algebra import StatementError, Table, run_algebra
+from fake_sparksee.cypher import run_cypher
+from fake_sparksee.fixtures import build_graph
+from fake_sparksee.graph import Graph, GraphError, Oid, Undo
+from pb import sparksee_server_pb2
+from pb.sparksee_server_pb2_grpc import (
+    SparkseeGRPCServerServicer,
+    add_SparkseeGRPCServerServicer_to_server,
+)
+
+SERVICE = next(iter(sparksee_server_pb2.DESCRIPTOR.services_by_name.values()))
+INTEGER_CPP_TYPES = {
+    FieldDescriptor.CPPTYPE_INT32,
+    FieldDescriptor.CPPTYPE_INT64,
+    FieldDescriptor.CPPTYPE_UINT32,
+    FieldDescriptor.CPPTYPE_UINT64,
+}
+
+
+def response_class(method: str):
+    return message_factory.GetMessageClass(SERVICE.methods_by_name[method].output_type)
+
+
+@dataclass
+class LatencyModel:
+    """Delay of every RPC: ``latency`` seconds plus uniform ``jitter``, from a seeded generator."""
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    seed: int | None = None
+    _random: random.Random = field(init=False)
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+
+    async def wait(self):
+        delay = self.latency
+        if self.jitter:
+            delay += self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+@dataclass
+class SessionState:
+    undo: Undo | None = None
+    results: dict[int, list] = field(default_factory=dict)
+
+
+class FakeSparkseeServicer(SparkseeGRPCServerServicer):
+    """In-memory implementation of the Sparksee gRPC service.
+
+    Statements run against ``graph`` as soon as ``RunQuery`` arrives and
+    their rows are kept until ``CloseQuery``. Writes outside a transaction
+    commit immediately; inside one they are logged so ``RollbackTx`` can
+    undo them. There is no isolation between sessions.
+    """
+
+    def __init__(self, graph: Graph, latency: LatencyModel | None = None):
+        self.graph = graph
+        self.latency = latency or LatencyModel()
+        self._sessions: dict[bytes, SessionState] = {}
+        self._session_ids = itertools.count(1)
+        self._query_ids = itertools.count(1)
+        self._responses = {method: response_class(method) for method in SERVICE.methods_by_name}
+
+    async def NewSession(self, request, context):  # noqa
+        await self.latency.wait()
+        session = self._responses["NewSession"]()
+        _set_identifier(session, next(self._session_ids))
+        self._sessions[_session_key(session)] = SessionState()
+        return session
+
+    async def EndSession(self, request, context):  # noqa
+        await self.latency.wait()
+        state = await self._session(request, context)
+        if state.undo is not None:
+            _rollback(state)
+        del self._sessions[_session_key(request)]
+        return self._responses["EndSession"]()
+
+    async def BeginTx(self, request, context):  # noqa
+        await self.latency.wait()
+        state = await self._session(request, context)
+        if state.undo is not None:
+            await context.abort(grpc.StatusCode.FAILED_PRECONDITION, "Transaction already active")
+        state.undo = []
+        return self._responses["BeginTx"]()
+
+    async def CommitTx(self, request, context):  # noqa
+        await self.latency.wait()
+        state = await self._session(request, context)
+        state.undo = None
+        return self._responses["CommitTx"]()
+
+    async def RollbackTx(self, request, context):  # noqa
+        await self.latency.wait()
+        state = await self._session(request, context)
+        if state.undo is not None:
+            _rollback(state)
+        return self._responses["RollbackTx"]()
+
+    async def RunQuery(self, request, context):  # noqa
+        await self.latency.wait()
+        state = await self._session(request.session, context)
+        try:
+            if request.cypherQuery:
+                rows = run_cypher(self.graph, request.cypherQuery)
+            else:
+                rows = run_algebra(self.graph, request.algebraQuery, state.undo)
+        except (StatementError, GraphError) as error:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(error))
+        query_id = next(self._query_ids)
+        state.results[query_id] = [rows, 0]
+        response = self._responses["RunQuery"]()
+        response.queryId = query_id
+        return response
+
+    async def GetResultRows(self, request, context):  # noqa
+        await self.latency.wait()
+        state = await self._session(request.id.session, context)
+        cursor = state.results.get(request.id.queryId)
+        if cursor is None:
+            await context.abort(grpc.StatusCode.NOT_FOUND, f"Unknown query {request.id.queryId}")
+        rows, position = cursor
+        page = rows[position:position + request.maxRows]
+        cursor[1] = position + len(page)
+        response = self._responses["GetResultRows"]()
+        encode_rows(response, page)
+        return response
+
+    async def CloseQuery(self, request, context):  # noqa
+        await self.latency.wait()
+        state = await self._session(request.session, context)
+        state.results.pop(request.queryId, None)
+        return self._responses["CloseQuery"]()
+
+    async def _session(self, session, context) -> SessionState:
+        state = self._sessions.get(_session_key(session))
+        if state is None:
+            await context.abort(grpc.StatusCode.NOT_FOUND, "Unknown session")
+        return state
+
+
+def _rollback(state: SessionState):
+    for undo in reversed(state.undo):
+        undo()
+    state.undo = None
+
+
+def _session_key(session) -> bytes:
+    return session.SerializeToString(deterministic=True)
+
+
+def _set_identifier(message, value: int):
+    """Store ``value`` in the first integer or string field of ``message``."""
+    for descriptor in message.DESCRIPTOR.fields:
+        if descriptor.cpp_type in INTEGER_CPP_TYPES:
+            setattr(message, descriptor.name, value)
+            return
+        if descriptor.type == descriptor.TYPE_STRING:
+            setattr(message, descriptor.name, str(value))
+            return
+    raise TypeError(f"{message.DESCRIPTOR.name} has no field to hold an identifier")
+
+
+def encode_rows(response, rows: Table):
+    for row in rows:
+        columns = response.rows.add().columnValues
+        for cell in row:
+            value = columns.add()
+            if cell is None:
+                value.nullValue = True
+            elif isinstance(cell, Oid):
+                value.oidValue = cell
+            elif isinstance(cell, bool):
+                value.boolValue = cell
+            elif isinstance(cell, int):
+                value.longValue = cell
+            elif isinstance(cell, float):
+                value.doubleValue = cell
+            elif isinstance(cell, datetime):
+                value.timestampValue.FromDatetime(cell)
+            else:
+                value.stringValue = str(cell)
+
+
+async def serve(
+    graph: Graph, address: str = "[::]:50051", latency: LatencyModel | None = None
+) -> tuple[aio.Server, int]:
+    """Start the stand-in server on ``address``; returns it with the bound port."""
+    server = aio.server()
+    add_SparkseeGRPCServerServicer_to_server(FakeSparkseeServicer(graph, latency), server)
+    port = server.add_insecure_port(address)
+    await server.start()
+    logger.info("Fake Sparksee listening on port {}", port)
+    return server, port
+
+
+async def run(args: argparse.Namespace):
+    graph = build_graph(tsps=args.tsps, seed=args.seed)
+    logger.info("Fixture graph with {} nodes and {} edges", len(graph.nodes), len(graph.edges))
+    server, _ = await serve(
+        graph,
+        address=f"{args.host}:{args.port}",
+        latency=LatencyModel(
+            latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, seed=args.seed
+        ),
+    )
+    await server.wait_for_termination()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="In-memory stand-in for the Sparksee gRPC server, for benchmarks and load tests"
+    )
+    parser.add_argument("--host", default="[::]")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every RPC")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform +/- jitter of the delay")
+    parser.add_argument("--tsps", type=int, default=1000, help="TSPs in the fixture graph")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,41 @@
+"""Synthetic TSP dataset generator.
+
+Streams TSP records to JSONL or a JSON array, gzip-compressed when the
+output ends in ``.gz``, so memory stays bounded by ``--workers * --chunk-size`` records
+whatever ``--count`` is::
+
+    python generate_synt_data/generate.py --count 1000000 --output tsps.jsonl.gz
+    python generate_synt_data/generate.py --count 10 --output generated_tsp_data.json
+
+The format follows the extension: ``.json`` writes a JSON array, as read by
+the locustfile, anything else JSONL.
+
+Records are generated in chunks, each from a random generator seeded with
+``--seed`` and the chunk number, so the output is the same for any number of
+workers. Every record gets a stable ``TSP ID`` of the form
+``tsp-<seed>-<index>``.
+
+Countries and TSP types are drawn with Zipf-like popularity, the weight of
+the item at rank ``r`` being ``1 / r ** skew`` in the order listed below
+(``--country-skew 0`` is uniform). The number of data requirements per TSP
+follows ``--data-reqs``: ``uniform:MIN:MAX``, ``poisson:MEAN`` or
+``geometric:MEAN``, capped by the requirements of the TSP type.
+"""
+import argparse
+import gzip
+import itertools
 import json
+import math
+import os
 import random
-import factory
-from faker.providers import BaseProvider
-from faker import Faker as OriginalFaker
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing import Pool
+from pathlib import Path
 
-# Load the data requirements
-with open('data_requirements.json', 'r') as file:
-    data_requirements = json.load(file)
+DATA_REQUIREMENTS_PATH = Path(__file__).parent / "data_requirements.json"
 
 # Mapping of TSP types to their data code prefixes
 code_prefix_mapping = {
@@ -18,7 +47,7 @@ code_prefix_mapping = {
     "Airport": "AP"
 }
 
-# Country to code mapping (ISO-like codes)
+# Country to code mapping (ISO-like codes), in order of popularity
 country_code_mapping = {
     "Germany": "DE",
     "France": "FR",
@@ -32,107 +61,297 @@ country_code_mapping = {
     "Austria": "AT"
 }
 
+# TSP types operating across more countries
+INTERNATIONAL_TYPES = {"Airline", "Airport", "Long distance rail"}
+TIME_SLOTS = ["Mornings", "Afternoons", "Nights"]
 
-# Custom Provider for Faker
-class TransportNameProvider(BaseProvider):
-    def transport_company(self, type_code, country, company_name: str):
-        types = {
-            "Airline": ["Airlines", "Airways"],
-            "Regional rail": ["Railroad", "Transit"],
-            "Long distance rail": ["Railroad", "Lines"],
-            "Bus operators": ["Lines", "Transit"],
-            "DRT": ["Services", "Solutions"],
-            "Airport": ["International Airport", "Airfield"]
-        }
-        descriptor = random.choice(["Connect", "Express", "Lines", "Network", "Swift", "Reliable", "Sol"])
-        return f"{random.choice(types[type_code])} {company_name} {descriptor}"
-
-
-faker = OriginalFaker()
-faker.add_provider(TransportNameProvider)
-
-
-class TransportServiceProviderFactory(factory.Factory):
-    class Meta:
-        model = dict
-
-    tsp_type = factory.Iterator(["Airline", "Regional rail", "Long distance rail", "Bus operators", "DRT", "Airport"])
-    countries = factory.LazyAttribute(lambda o: random.sample(
-        ["Germany", "France", "Italy", "Spain", "Netherlands", "Belgium", "Poland", "Czech Republic", "Portugal",
-         "Austria"],
-        random.randint(1, 3) if o.tsp_type not in ["Airline", "Airport", "Long distance rail"] else random.randint(2, 5)
-    ))
-    # Choose a main country from the assigned countries (first one in the list)
-    main_country = factory.LazyAttribute(lambda o: o.countries[0])
-    name = factory.LazyAttribute(lambda o: faker.transport_company(o.tsp_type, o.main_country, faker.company()))
-    provided_data = factory.LazyAttribute(lambda o: [
-                                                        entry["code"] for entry in data_requirements
-                                                        if entry["code"].startswith(code_prefix_mapping[o.tsp_type])
-                                                    ][:random.randint(5, 10)])
-    time_slots = factory.LazyAttribute(lambda _: random.sample(
-        ["Mornings", "Afternoons", "Nights"], random.randint(1, 3)
-    ))
-
-    # Additional fields: legal_name, address, vat
-    legal_name = factory.LazyAttribute(lambda o: f"{o.name} S.A.")
-    address = factory.LazyAttribute(lambda o: f"{faker.street_address()}, {faker.city()}, {o.main_country}")
-    vat = factory.LazyAttribute(lambda o: f"{o.main_country[:2].upper()}{random.randint(10000000, 99999999)}A")
-
-    # CEO information
-    CEO = factory.LazyAttribute(lambda o: {
-        "Email": f"{faker.first_name().lower()}.{faker.last_name().lower()}@{o.name.replace(' ', '').lower()}.{country_code_mapping.get(o.main_country, 'xx').lower()}",
-        "First Name": faker.first_name(),
-        "Last Name": faker.last_name()
-    })
-
-    # Admins information
-    Admins = factory.LazyAttribute(lambda o: [
-        {
-            "Email": f"{faker.first_name().lower()}.{faker.last_name().lower()}@{o.name.replace(' ', '').lower()}.{country_code_mapping.get(o.main_country, 'xx').lower()}",
-            "First Name": faker.first_name(),
-            "Last Name": faker.last_name()
-        },
-        {
-            "Email": f"{faker.first_name().lower()}.{faker.last_name().lower()}@{o.name.replace(' ', '').lower()}.{country_code_mapping.get(o.main_country, 'xx').lower()}",
-            "First Name": faker.first_name(),
-            "Last Name": faker.last_name()
+TYPE_WORDS = {
+    "Airline": ["Airlines", "Airways"],
+    "Regional rail": ["Railroad", "Transit"],
+    "Long distance rail": ["Railroad", "Lines"],
+    "Bus operators": ["Lines", "Transit"],
+    "DRT": ["Services", "Solutions"],
+    "Airport": ["International Airport", "Airfield"]
+}
+DESCRIPTORS = ["Connect", "Express", "Lines", "Network", "Swift", "Reliable", "Sol"]
+COMPANY_PARTS = [
+    "Alpen", "Baltic", "Blue", "Central", "Danube", "Euro", "Green", "Hansa", "Iberia", "Lake",
+    "Meridian", "Nord", "Orbit", "Pioneer", "Rhine", "Silver", "Star", "Summit", "Union", "Vista",
+]
+COMPANY_SUFFIXES = ["Group", "Partners", "Holding", "Mobility", "Travel", "& Co", "Ventures", ""]
+FIRST_NAMES = [
+    "Anna", "Lukas", "Marie", "Jonas", "Sofia", "Pierre", "Camille", "Marco", "Giulia", "Javier",
+    "Lucia", "Daan", "Emma", "Jan", "Zofia", "Tomas", "Ines", "Joao", "Elena", "Felix",
+]
+LAST_NAMES = [
+    "Muller", "Schmidt", "Martin", "Bernard", "Rossi", "Bianchi", "Garcia", "Lopez", "de Vries",
+    "Peeters", "Nowak", "Novak", "Silva", "Santos", "Huber", "Wagner", "Dubois", "Ricci", "Jansen",
+    "Kowalski",
+]
+STREETS = ["Main", "Station", "Harbour", "Market", "Church", "Park", "Mill", "Bridge", "River", "Castle"]
+STREET_KINDS = ["Street", "Road", "Avenue", "Square", "Lane"]
+CITIES = {
+    "Germany": ["Berlin", "Hamburg", "Munich", "Cologne"],
+    "France": ["Paris", "Lyon", "Marseille", "Lille"],
+    "Italy": ["Rome", "Milan", "Naples", "Turin"],
+    "Spain": ["Madrid", "Barcelona", "Valencia", "Seville"],
+    "Netherlands": ["Amsterdam", "Rotterdam", "Utrecht", "Eindhoven"],
+    "Belgium": ["Brussels", "Antwerp", "Ghent", "Liege"],
+    "Poland": ["Warsaw", "Krakow", "Gdansk", "Wroclaw"],
+    "Czech Republic": ["Prague", "Brno", "Ostrava", "Plzen"],
+    "Portugal": ["Lisbon", "Porto", "Braga", "Coimbra"],
+    "Austria": ["Vienna", "Graz", "Linz", "Salzburg"],
+}
+
+
+def zipf_weights(count: int, skew: float) -> list[float]:
+    # rank ** -skew underflows to 0 for large skews instead of overflowing
+    return [rank ** -skew for rank in range(1, count + 1)]
+
+
+def zipf_cum_weights(count: int, skew: float) -> list[float]:
+    return list(itertools.accumulate(zipf_weights(count, skew)))
+
+
+@dataclass(frozen=True)
+class Distribution:
+    """Number of data requirements per TSP."""
+
+    kind: str
+    low: float
+    high: float = 0
+
+    @classmethod
+    def parse(cls, text: str) -> "Distribution":
+        kind, _, arguments = text.partition(":")
+        try:
+            values = [float(value) for value in arguments.split(":") if value]
+        except ValueError:
+            values = []
+        if kind == "uniform" and len(values) == 2 and 0 <= values[0] <= values[1]:
+            return cls(kind, *values)
+        if kind in ("poisson", "geometric") and len(values) == 1 and values[0] > 0:
+            return cls(kind, values[0])
+        raise argparse.ArgumentTypeError(
+            f"invalid distribution {text!r}, expected uniform:MIN:MAX, poisson:MEAN or geometric:MEAN"
+        )
+
+    def sample(self, rng: random.Random) -> int:
+        if self.kind == "uniform":
+            return rng.randint(int(self.low), int(self.high))
+        if self.kind == "geometric":
+            # number of failures before the first success, with the given mean
+            return int(math.log(1 - rng.random()) / math.log(self.low / (self.low + 1)))
+        # Knuth's method; fine for the small means used here
+        limit, count, product = math.exp(-self.low), 0, rng.random()
+        while product > limit:
+            count += 1
+            product *= rng.random()
+        return count
+
+
+@dataclass(frozen=True)
+class Settings:
+    seed: int
+    chunk_size: int
+    count: int
+    country_skew: float
+    type_skew: float
+    data_reqs: Distribution
+    codes_by_type: dict[str, list[str]]
+    # gzip every chunk in the worker; concatenated gzip members form one valid file
+    compress: bool = False
+
+
+class ChunkGenerator:
+    """Builds the records of one chunk from a generator seeded with the seed and chunk number."""
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.countries = list(country_code_mapping)
+        self.tsp_types = list(code_prefix_mapping)
+        self.country_weights = zipf_weights(len(self.countries), settings.country_skew)
+        self.type_weights = zipf_cum_weights(len(self.tsp_types), settings.type_skew)
+
+    def __call__(self, chunk: int) -> bytes:
+        settings = self.settings
+        rng = random.Random(f"{settings.seed}-{chunk}")
+        start = chunk * settings.chunk_size
+        stop = min(start + settings.chunk_size, settings.count)
+        data = "".join(
+            json.dumps(self.record(rng, index), ensure_ascii=False) + "\n"
+            for index in range(start, stop)
+        ).encode()
+        return gzip.compress(data, compresslevel=6, mtime=0) if settings.compress else data
+
+    def sample_countries(self, rng: random.Random, count: int) -> list[str]:
+        """``count`` distinct countries, drawn by weight without replacement."""
+        countries, weights = list(self.countries), list(self.country_weights)
+        chosen = []
+        for _ in range(min(count, len(countries))):
+            total = sum(weights)
+            # every weight left underflowed: the most popular country left wins
+            index = rng.choices(range(len(countries)), weights=weights)[0] if total > 0 else 0
+            chosen.append(countries.pop(index))
+            weights.pop(index)
+        return chosen
+
+    def person(self, rng: random.Random, domain: str) -> dict[str, str]:
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        return {
+            "Email": f"{first_name.lower()}.{last_name.replace(' ', '').lower()}@{domain}",
+            "First Name": first_name,
+            "Last Name": last_name
         }
-    ])
-
-
-def generate_tsp_data(num_entries):
-    data_list = []
-    for _ in range(num_entries):
-        tsp_info = TransportServiceProviderFactory.build()
-        main_country_code = country_code_mapping.get(tsp_info['main_country'], "XX")
-
-        # Construct the final object
-        tsp_object = {
-            "TSP Name": tsp_info['name'],
-            "Legal Name": tsp_info['legal_name'],
-            "Address": tsp_info['address'],
-            "Vat": tsp_info['vat'],
-            "Countries": [tsp_info['main_country']],
-            "Country Code": main_country_code,
-            "TSP Type": tsp_info['tsp_type'],
-            "Data Attributes": tsp_info['provided_data'],
-            "Time Slots": tsp_info['time_slots'],
-            "CEO": tsp_info['CEO'],
-            "Admins": tsp_info['Admins']
+
+    def record(self, rng: random.Random, index: int) -> dict:
+        tsp_type = rng.choices(self.tsp_types, cum_weights=self.type_weights)[0]
+        countries = self.sample_countries(
+            rng, rng.randint(2, 5) if tsp_type in INTERNATIONAL_TYPES else rng.randint(1, 3)
+        )
+        main_country = countries[0]
+        country_code = country_code_mapping[main_country]
+        company = f"{rng.choice(COMPANY_PARTS)} {rng.choice(COMPANY_SUFFIXES)}".strip()
+        name = f"{rng.choice(TYPE_WORDS[tsp_type])} {company} {rng.choice(DESCRIPTORS)}"
+        domain = f"{name.replace(' ', '').replace('&', '').lower()}.{country_code.lower()}"
+
+        codes = self.settings.codes_by_type[tsp_type]
+        data_count = min(self.settings.data_reqs.sample(rng), len(codes))
+        provided_data = [codes[position] for position in sorted(rng.sample(range(len(codes)), data_count))]
+
+        return {
+            "TSP ID": f"tsp-{self.settings.seed}-{index:09d}",
+            "TSP Name": name,
+            "Legal Name": f"{name} S.A.",
+            "Address": (
+                f"{rng.randint(1, 200)} {rng.choice(STREETS)} {rng.choice(STREET_KINDS)}, "
+                f"{rng.choice(CITIES[main_country])}, {main_country}"
+            ),
+            "Vat": f"{country_code}{rng.randint(10000000, 99999999)}A",
+            "Countries": countries,
+            "Country Code": country_code,
+            "TSP Type": tsp_type,
+            "Data Attributes": provided_data,
+            "Time Slots": sorted(rng.sample(TIME_SLOTS, rng.randint(1, 3)), key=TIME_SLOTS.index),
+            "CEO": self.person(rng, domain),
+            "Admins": [self.person(rng, domain), self.person(rng, domain)]
         }
 
-        data_list.append(tsp_object)
-    return data_list
 
+_GENERATOR: ChunkGenerator | None = None
+
+
+def _init_worker(settings: Settings):
+    global _GENERATOR
+    _GENERATOR = ChunkGenerator(settings)
+
+
+def _generate_chunk(chunk: int) -> bytes:
+    return _GENERATOR(chunk)
+
+
+def generate_chunks(settings: Settings, workers: int):
+    """Serialized chunks in order, with at most two chunks per worker in flight."""
+    chunks = range(math.ceil(settings.count / settings.chunk_size))
+    if workers <= 1:
+        generator = ChunkGenerator(settings)
+        yield from map(generator, chunks)
+        return
+
+    with Pool(workers, initializer=_init_worker, initargs=(settings,)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_generate_chunk, (chunk,)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def open_output(path: str, compress: bool):
+    if path == "-":
+        return sys.stdout.buffer
+    if compress:
+        return gzip.open(path, "wb", compresslevel=6)
+    return open(path, "wb")
+
+
+def write_json_array(output, chunks):
+    """Writes the JSONL chunks as one JSON array, one record per line."""
+    output.write(b"[\n")
+    first = True
+    for chunk in chunks:
+        for line in chunk.splitlines():
+            output.write((b"" if first else b",\n") + line)
+            first = False
+    output.write(b"\n]\n")
+
+
+def load_codes_by_type(path: Path) -> dict[str, list[str]]:
+    with open(path, "r") as file:
+        data_requirements = json.load(file)
+    return {
+        tsp_type: [entry["code"] for entry in data_requirements if entry["code"].startswith(prefix)]
+        for tsp_type, prefix in code_prefix_mapping.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=10, help="number of TSP records")
+    parser.add_argument(
+        "--output", default="generated_tsp_data.json", help="file to write, '-' for JSONL on stdout"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="records per unit of work")
+    parser.add_argument("--country-skew", type=float, default=1.0, help="Zipf exponent of country popularity")
+    parser.add_argument("--type-skew", type=float, default=0.5, help="Zipf exponent of TSP type popularity")
+    parser.add_argument(
+        "--data-reqs", type=Distribution.parse, default=Distribution("uniform", 5, 10),
+        help="data requirements per TSP: uniform:MIN:MAX, poisson:MEAN or geometric:MEAN (default uniform:5:10)"
+    )
+    parser.add_argument("--data-requirements", type=Path, default=DATA_REQUIREMENTS_PATH)
+    args = parser.parse_args()
+    if args.count < 1:
+        parser.error("--count must be at least 1")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    compressed = args.output.endswith(".gz")
+    json_array = args.output.removesuffix(".gz").endswith(".json")
 
-# Number of entries to generate
-num_entries = 10  # You can change this to generate more or fewer entries
+    settings = Settings(
+        seed=args.seed,
+        chunk_size=args.chunk_size,
+        count=args.count,
+        country_skew=args.country_skew,
+        type_skew=args.type_skew,
+        data_reqs=args.data_reqs,
+        codes_by_type=load_codes_by_type(args.data_requirements),
+        compress=compressed and not json_array,
+    )
+    started_at = time.perf_counter()
+    workers = min(args.workers, math.ceil(args.count / args.chunk_size))
+    # JSONL chunks arrive compressed already; a JSON array is compressed while written
+    output = open_output(args.output, compressed and json_array)
+    try:
+        chunks = generate_chunks(settings, workers)
+        if json_array:
+            write_json_array(output, chunks)
+        else:
+            for chunk in chunks:
+                output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
 
-# Generate data
-generated_tsp_data = generate_tsp_data(num_entries)
+    elapsed = time.perf_counter() - started_at
+    print(
+        f"Generated {args.count} TSP records in {elapsed:.1f}s ({args.count / elapsed:,.0f}/s) "
+        f"with {workers} worker(s) to {args.output}",
+        file=sys.stderr,
+    )
 
-# Output the generated data to a JSON file
-with open('generated_tsp_data.json', 'w') as file:
-    json.dump(generated_tsp_data, file, indent=4)
 
-print("Generated JSON file with TSP data, including Country Code, CEO, and Admins.")
+if __name__ == "__main__":
+    main()
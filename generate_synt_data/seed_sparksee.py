@@ -0,0 +1,340 @@
+"""Load generated TSP records into Sparksee through ``TSPRepository.create_tsps_bulk``.
+
+Reads the JSONL written by generate.py (optionally ``.gz``) as a stream and
+drops records whose ``TSP ID`` was already seen. The remaining records are
+grouped into chunks of ``--chunk-size``. Each chunk is created in a
+transaction of its own, with at most ``--concurrency`` chunks in flight::
+
+    PYTHONPATH=.:repository python generate_synt_data/seed_sparksee.py tsps.jsonl.gz \\
+        --concurrency 8 --checkpoint tsps.checkpoint.json
+
+A chunk that fails is retried ``--retries`` times with exponential backoff,
+then recorded as failed. Completed chunks are written to ``--checkpoint``
+after every commit. Running again with the same input, chunk size and
+checkpoint resumes with the chunks that are not done yet, failed ones
+included. The checkpoint also records which chunks were started; resumed
+chunks that were, and retried attempts, first look up which of their TSP
+IDs exist already and skip those, so a chunk committed in the moment before
+a crash or a lost reply is not created twice. Chunks never started before
+skip the lookup, which costs a query per record.
+
+Progress is logged every ``--report-every`` seconds with records/s and
+chunk latency percentiles; ``--metrics-output`` writes the final figures
+as JSON. The exit status is 1 when chunks failed.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+import grpc
+from loguru import logger
+
+from exceptions import GraphDBException, SparkseeConnectionError
+from repository.tsp import TSPBulkCreate, TSPBulkTargets, TSPRepository
+from session_manager import close_session_pool, session_context
+
+RETRYABLE_ERRORS = (GraphDBException, SparkseeConnectionError, grpc.RpcError, TimeoutError)
+CHECKPOINT_VERSION = 2
+
+
+@dataclass
+class Chunk:
+    number: int
+    records: list[dict]
+
+
+@dataclass
+class Checkpoint:
+    """Chunks done so far: all below ``completed_through``, plus those in ``completed``.
+
+    Chunks below ``started_through`` were handed to a worker; those below
+    ``resumed_through`` were, by an earlier run, and may have been written.
+    """
+
+    path: Path | None
+    input: str
+    chunk_size: int
+    completed_through: int = 0
+    completed: set[int] = field(default_factory=set)
+    started_through: int = 0
+    resumed_through: int = 0
+
+    @classmethod
+    def load(cls, path: Path | None, input_path: str, chunk_size: int) -> "Checkpoint":
+        checkpoint = cls(path, input_path, chunk_size)
+        if path is None or not path.exists():
+            return checkpoint
+        data = json.loads(path.read_text())
+        if data["input"] != input_path or data["chunk_size"] != chunk_size:
+            raise SystemExit(
+                f"{path} belongs to {data['input']} with chunks of {data['chunk_size']}; "
+                "use the same input and --chunk-size, or another --checkpoint"
+            )
+        checkpoint.completed_through = data["completed_through"]
+        checkpoint.completed = set(data["completed"])
+        checkpoint.started_through = data.get("started_through", checkpoint.completed_through)
+        # checkpoints of version 1 do not say which chunks were started, so any may exist
+        checkpoint.resumed_through = data.get("started_through", sys.maxsize)
+        return checkpoint
+
+    def is_done(self, number: int) -> bool:
+        return number < self.completed_through or number in self.completed
+
+    def may_exist(self, number: int) -> bool:
+        return number < self.resumed_through
+
+    def mark_started(self, number: int):
+        if number >= self.started_through:
+            self.started_through = number + 1
+            self.save()
+
+    def mark_done(self, number: int):
+        self.completed.add(number)
+        while self.completed_through in self.completed:
+            self.completed.remove(self.completed_through)
+            self.completed_through += 1
+        self.save()
+
+    def save(self):
+        if self.path is None:
+            return
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "input": self.input,
+            "chunk_size": self.chunk_size,
+            "completed_through": self.completed_through,
+            "completed": sorted(self.completed),
+            "started_through": self.started_through,
+        }
+        # write and rename, so a crash never leaves a truncated checkpoint behind
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        temporary.write_text(json.dumps(data))
+        os.replace(temporary, self.path)
+
+
+@dataclass
+class SeedStats:
+    started_at: float = field(default_factory=time.perf_counter)
+    read: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    resumed: int = 0
+    created: int = 0
+    skipped: int = 0
+    retries: int = 0
+    failed_chunks: list[int] = field(default_factory=list)
+    chunk_latencies: list[float] = field(default_factory=list)
+
+    def report(self) -> dict:
+        elapsed = time.perf_counter() - self.started_at
+        latencies = sorted(self.chunk_latencies)
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "records_read": self.read,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "resumed": self.resumed,
+            "created": self.created,
+            "skipped": self.skipped,
+            "records_per_s": round(self.created / elapsed, 1) if elapsed else 0.0,
+            "chunks": len(latencies),
+            "chunk_p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+            # nearest rank
+            "chunk_p95_ms": round(latencies[math.ceil(len(latencies) * 0.95) - 1] * 1000, 1) if latencies else None,
+            "chunk_max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+            "retries": self.retries,
+            "failed_chunks": self.failed_chunks,
+        }
+
+
+def read_records(path: str) -> Iterator[dict]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def chunk_records(records: Iterator[dict], chunk_size: int, stats: SeedStats) -> Iterator[Chunk]:
+    """Records deduplicated by ``TSP ID`` and grouped into numbered chunks.
+
+    Only the hashes of the ids are kept, so millions of records fit in a
+    few hundred megabytes. Chunk numbers depend on the input and chunk size
+    alone, which is what lets a checkpoint refer to them.
+    """
+    seen, batch, number = set(), [], 0
+    for record in records:
+        stats.read += 1
+        tsp_id = record.get("TSP ID")
+        if not tsp_id or not record.get("TSP Name") or not record.get("TSP Type"):
+            stats.invalid += 1
+            continue
+        key = hash(tsp_id)
+        if key in seen:
+            stats.duplicates += 1
+            continue
+        seen.add(key)
+        batch.append(record)
+        if len(batch) == chunk_size:
+            yield Chunk(number, batch)
+            batch, number = [], number + 1
+    if batch:
+        yield Chunk(number, batch)
+
+
+@dataclass
+class Seeder:
+    repository: TSPRepository
+    data_requirement_ids: dict[str, int]
+    targets: TSPBulkTargets
+    checkpoint: Checkpoint
+    stats: SeedStats
+    retries: int = 3
+    backoff: float = 0.5
+
+    def to_bulk_create(self, record: dict) -> TSPBulkCreate:
+        return TSPBulkCreate(
+            id=record["TSP ID"],
+            name=record["TSP Name"],
+            tsp_type=record["TSP Type"],
+            countries=record.get("Countries", []),
+            time_slots=record.get("Time Slots", []),
+            data_reqs_node_ids=[
+                self.data_requirement_ids[code]
+                for code in record.get("Data Attributes", [])
+                if code in self.data_requirement_ids
+            ],
+        )
+
+    async def load_chunk(self, chunk: Chunk):
+        tsps = [self.to_bulk_create(record) for record in chunk.records]
+        # written before the transaction, so a crash cannot hide that the chunk may exist
+        self.checkpoint.mark_started(chunk.number)
+        for attempt in range(self.retries + 1):
+            started_at = time.perf_counter()
+            try:
+                async with session_context() as session_manager:
+                    result = await self.repository.create_tsps_bulk(
+                        session_manager=session_manager,
+                        tsps=tsps,
+                        targets=self.targets,
+                        skip_existing=attempt > 0 or self.checkpoint.may_exist(chunk.number),
+                    )
+            except RETRYABLE_ERRORS as error:
+                if attempt == self.retries:
+                    logger.error("Chunk {} failed after {} attempts: {}", chunk.number, attempt + 1, error)
+                    self.stats.failed_chunks.append(chunk.number)
+                    return
+                delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                logger.warning("Chunk {} failed ({}), retrying in {:.1f}s", chunk.number, error, delay)
+                self.stats.retries += 1
+                await asyncio.sleep(delay)
+                continue
+            self.stats.chunk_latencies.append(time.perf_counter() - started_at)
+            self.stats.created += len(result.created)
+            self.stats.skipped += len(result.skipped)
+            self.checkpoint.mark_done(chunk.number)
+            return
+
+    async def worker(self, queue: asyncio.Queue):
+        while (chunk := await queue.get()) is not None:
+            await self.load_chunk(chunk)
+
+
+async def put_chunk(queue: asyncio.Queue, chunk: Chunk | None, workers: list[asyncio.Task]):
+    """Queue ``chunk``, or raise the error of a worker that died while the queue was full."""
+    put = asyncio.ensure_future(queue.put(chunk))
+    done, _ = await asyncio.wait([put, *workers], return_when=asyncio.FIRST_COMPLETED)
+    if put in done:
+        return
+    put.cancel()
+    for worker in done:
+        worker.result()
+    raise RuntimeError("Seeding workers stopped early")
+
+
+async def report_progress(stats: SeedStats, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        report = stats.report()
+        logger.info(
+            "{} created, {} skipped, {} duplicates | {} records/s | chunk p50 {} ms, p95 {} ms",
+            report["created"],
+            report["skipped"],
+            report["duplicates"],
+            report["records_per_s"],
+            report["chunk_p50_ms"],
+            report["chunk_p95_ms"],
+        )
+
+
+async def seed(args: argparse.Namespace) -> dict:
+    stats = SeedStats()
+    checkpoint = Checkpoint.load(args.checkpoint, str(Path(args.input).resolve()), args.chunk_size)
+    repository = TSPRepository()
+    async with session_context(read_only=True) as session_manager:
+        data_requirement_ids = await repository.resolve_node_ids(
+            session_manager, "DATA_REQUIREMENT", attribute=args.data_requirement_attribute
+        )
+        targets = await repository.resolve_bulk_targets(session_manager)
+    logger.info("Resolved {} data requirements", len(data_requirement_ids))
+
+    seeder = Seeder(
+        repository, data_requirement_ids, targets, checkpoint, stats, args.retries, args.backoff
+    )
+    # a small queue keeps at most a few chunks per worker in memory
+    queue: asyncio.Queue = asyncio.Queue(maxsize=args.concurrency * 2)
+    workers = [asyncio.create_task(seeder.worker(queue)) for _ in range(args.concurrency)]
+    progress = asyncio.create_task(report_progress(stats, args.report_every))
+    try:
+        for chunk in chunk_records(read_records(args.input), args.chunk_size, stats):
+            if checkpoint.is_done(chunk.number):
+                stats.resumed += len(chunk.records)
+                continue
+            await put_chunk(queue, chunk, workers)
+        for _ in workers:
+            await put_chunk(queue, None, workers)
+        await asyncio.gather(*workers)
+    finally:
+        progress.cancel()
+        for worker in workers:
+            worker.cancel()
+        await close_session_pool()
+    return stats.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file written by generate.py, optionally .gz")
+    parser.add_argument("--chunk-size", type=int, default=500, help="TSPs per transaction")
+    parser.add_argument("--concurrency", type=int, default=4, help="chunks in flight; keep within DB_POOL_SIZE")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=0.5, help="seconds before the first retry")
+    parser.add_argument("--checkpoint", type=Path, help="file recording completed chunks, to resume from")
+    parser.add_argument("--data-requirement-attribute", default="code")
+    parser.add_argument("--report-every", type=float, default=10.0, help="seconds between progress logs")
+    parser.add_argument("--metrics-output", type=Path, help="write the final metrics as JSON")
+    args = parser.parse_args()
+    if args.input.removesuffix(".gz").endswith(".json"):
+        parser.error("expected JSONL input; generate it with an output path not ending in .json")
+
+    report = asyncio.run(seed(args))
+    logger.info("Seeding finished: {}", json.dumps(report))
+    if args.metrics_output:
+        args.metrics_output.write_text(json.dumps(report, indent=2) + "\n")
+    if report["failed_chunks"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 import json
+import os
 import random
 import logging
 import string
-from locust import HttpUser, SequentialTaskSet, task, between, LoadTestShape
+from locust import HttpUser, SequentialTaskSet, task, between
+
+from shapes import shape_from_env
 
 logger = logging.getLogger(__name__)
 
@@ -197,6 +200,13 @@ class DiscoveryServiceUser(HttpUser):
     Executes scenarios sequentially.
     """
     tasks = [TSPScenario, GoalScenario, DataRequirementScenario]
-    wait_time = between(1, 2)  # Simulate realistic user delays
+    # Simulate realistic user delays; set both to 0 to find the throughput limit
+    wait_time = between(float(os.environ.get("LOAD_WAIT_MIN", 1)), float(os.environ.get("LOAD_WAIT_MAX", 2)))
+
+
+# The shape selected by LOAD_SHAPE, see shapes.py; locust picks it up from this module
+LoadShape = shape_from_env()
 
 # locust --users 30 --spawn-rate 3 -f locust/locustfile.py --host=http://localhost:9000
+# LOAD_SHAPE=step locust --headless -f locust/locustfile.py --host=http://localhost:9000
+# python locust/run_load.py --shape saturation --host=http://localhost:9000 --output load.json
@@ -0,0 +1,304 @@
+"""Headless load test runner that records a JSON artifact and compares it to a baseline.
+
+Runs locustfile.py headless with ``--shape`` (see shapes.py), then reads the
+locust CSV output:
+
+- per-endpoint and aggregated p50/p95/p99 latency, throughput and error rate
+  from ``<prefix>_stats.csv``;
+- the throughput curve from ``<prefix>_stats_history.csv``. Samples are
+  grouped by user count, and the knee is the user count after which adding
+  users stops raising throughput in proportion.
+
+The result is written to ``--output``. With ``--baseline`` the run is
+compared to a previous artifact, and the exit status is 1 when latency,
+throughput, error rate or the knee regressed beyond the thresholds::
+
+    python locust/run_load.py --shape saturation --host http://localhost:9000 \\
+        --output load.json --baseline load-baseline.json
+
+Extra ``LOAD_*`` variables are passed through to the shape. ``--analyze
+PREFIX`` only reads the CSV files of an earlier run. The exit status is 2
+when locust itself failed or left no CSV files to analyze.
+"""
+import argparse
+import csv
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+LOCUSTFILE = Path(__file__).parent / "locustfile.py"
+SCHEMA_VERSION = 1
+# locust exits with 1 when any request failed, which the analysis reports on its own
+LOCUST_OK_CODES = (0, 1)
+
+
+def run_locust(args: argparse.Namespace, prefix: str) -> int:
+    command = [
+        sys.executable, "-m", "locust",
+        "-f", str(args.locustfile),
+        "--headless",
+        "--only-summary",
+        "--host", args.host,
+        "--csv", prefix,
+        "--csv-full-history",
+    ]
+    if args.shape == "none":
+        command += ["--users", str(args.users), "--spawn-rate", str(args.spawn_rate)]
+    if args.run_time:
+        command += ["--run-time", args.run_time]
+    env = {**os.environ, "LOAD_SHAPE": args.shape}
+    print(f"Running {' '.join(command)} with LOAD_SHAPE={args.shape}", flush=True)
+    return subprocess.run(command, env=env).returncode
+
+
+def _number(value: str) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _error_rate(requests: float, failures: float) -> float:
+    return failures / requests if requests else 0.0
+
+
+def read_endpoints(path: Path) -> dict[str, dict[str, float | None]]:
+    """Summary statistics by ``"<method> <name>"``, plus ``"Aggregated"``."""
+    endpoints = {}
+    with path.open(newline="") as stats_file:
+        for row in csv.DictReader(stats_file):
+            name = row["Name"]
+            if row["Type"] and not name.startswith(row["Type"]):
+                name = f"{row['Type']} {name}"
+            requests = _number(row["Request Count"]) or 0
+            failures = _number(row["Failure Count"]) or 0
+            endpoints[name] = {
+                "requests": requests,
+                "failures": failures,
+                "error_rate": _error_rate(requests, failures),
+                "rps": _number(row["Requests/s"]),
+                "p50_ms": _number(row["50%"]),
+                "p95_ms": _number(row["95%"]),
+                "p99_ms": _number(row["99%"]),
+            }
+    return endpoints
+
+
+def read_curve(path: Path, min_samples: int = 3) -> list[dict[str, float]]:
+    """Throughput, p95 and error rate per user count, from the aggregated history rows.
+
+    Throughput and error rate come from the growth of the cumulative request
+    and failure counts while the user count held, which is exact where the
+    ``Requests/s`` column is a trailing average that still includes the
+    previous level. User counts with fewer than ``min_samples`` samples were
+    only passed through while spawning and are left out.
+    """
+    samples: dict[int, list[dict[str, str]]] = {}
+    with path.open(newline="") as history_file:
+        for row in csv.DictReader(history_file):
+            users = int(_number(row["User Count"]) or 0)
+            if row["Name"] == "Aggregated" and users > 0:
+                samples.setdefault(users, []).append(row)
+
+    curve = []
+    for users, rows in sorted(samples.items()):
+        if len(rows) < min_samples:
+            continue
+        first, last = rows[0], rows[-1]
+        seconds = _number(last["Timestamp"]) - _number(first["Timestamp"])
+        requests = _number(last["Total Request Count"]) - _number(first["Total Request Count"])
+        failures = _number(last["Total Failure Count"]) - _number(first["Total Failure Count"])
+        # the p95 column covers a trailing window, so only the later half is taken
+        p95 = [_number(row["95%"]) for row in rows[len(rows) // 2:]]
+        p95 = [value for value in p95 if value is not None]
+        curve.append(
+            {
+                "users": users,
+                "rps": requests / seconds if seconds > 0 else 0.0,
+                "p95_ms": statistics.median(p95) if p95 else None,
+                "error_rate": _error_rate(requests, failures),
+                "samples": len(rows),
+            }
+        )
+    return curve
+
+
+def find_knee(curve: list[dict[str, float]]) -> dict[str, float] | None:
+    """Knee of the throughput curve, by the Kneedle method.
+
+    Users and throughput are scaled to [0, 1]; the knee is the point that
+    lies furthest above the straight line between the first and last point,
+    i.e. where the curve flattens. A curve that never bends (throughput still
+    growing linearly, or falling) has no knee.
+    """
+    if len(curve) < 3:
+        return None
+    users = [point["users"] for point in curve]
+    rps = [point["rps"] for point in curve]
+    users_span = users[-1] - users[0]
+    rps_span = max(rps) - min(rps)
+    if users_span <= 0 or rps_span <= 0:
+        return None
+    differences = [
+        (rate - min(rps)) / rps_span - (count - users[0]) / users_span
+        for count, rate in zip(users, rps)
+    ]
+    index = max(range(len(curve)), key=differences.__getitem__)
+    if differences[index] <= 0.05 or index == len(curve) - 1:
+        return None
+    return {key: curve[index][key] for key in ("users", "rps", "p95_ms", "error_rate")}
+
+
+def csv_paths(prefix: str) -> tuple[Path, Path]:
+    return Path(f"{prefix}_stats.csv"), Path(f"{prefix}_stats_history.csv")
+
+
+def _fail(message: str):
+    print(f"Error: {message}", file=sys.stderr)
+    sys.exit(2)
+
+
+def analyze(prefix: str) -> dict:
+    stats_path, history_path = csv_paths(prefix)
+    endpoints = read_endpoints(stats_path)
+    curve = read_curve(history_path)
+    return {
+        "aggregate": endpoints.pop("Aggregated", None),
+        "endpoints": endpoints,
+        "curve": curve,
+        "knee": find_knee(curve),
+    }
+
+
+def _change(before: float | None, after: float | None) -> float | None:
+    if not before or after is None:
+        return None
+    return after / before - 1
+
+
+def compare(result: dict, baseline: dict, args: argparse.Namespace) -> list[str]:
+    """Print the changes against ``baseline`` and return a line for every regression."""
+    regressions = []
+    endpoints = {"Aggregated": result["aggregate"], **result["endpoints"]}
+    baseline_endpoints = {"Aggregated": baseline["aggregate"], **baseline["endpoints"]}
+    print(f"{'Against baseline':<48} {'p95':>9} {'p99':>9} {'req/s':>9} {'errors':>9}")
+    for name, stats in endpoints.items():
+        before = baseline_endpoints.get(name)
+        if stats is None or before is None:
+            continue
+        p95, p99 = _change(before["p95_ms"], stats["p95_ms"]), _change(before["p99_ms"], stats["p99_ms"])
+        rps = _change(before["rps"], stats["rps"])
+        errors = stats["error_rate"] - before["error_rate"]
+        print(
+            f"  {name:<46} {_percent(p95):>9} {_percent(p99):>9} {_percent(rps):>9} {errors:>+9.2%}"
+        )
+        for label, change in (("p95", p95), ("p99", p99)):
+            if change is not None and change > args.latency_threshold:
+                regressions.append(f"{name}: {label} {change:+.1%}")
+        if rps is not None and -rps > args.throughput_threshold:
+            regressions.append(f"{name}: throughput {rps:+.1%}")
+        if errors > args.error_threshold:
+            regressions.append(f"{name}: error rate {errors:+.2%}")
+
+    knee, baseline_knee = result["knee"], baseline.get("knee")
+    if baseline_knee is not None:
+        if knee is None:
+            print("  knee: none found in this run")
+        else:
+            users, rps = _change(baseline_knee["users"], knee["users"]), _change(baseline_knee["rps"], knee["rps"])
+            print(f"  knee: {baseline_knee['users']} -> {knee['users']} users, {_percent(rps)} req/s")
+            for label, change in (("users", users), ("throughput", rps)):
+                if change is not None and -change > args.throughput_threshold:
+                    regressions.append(f"knee: {label} {change:+.1%}")
+    return regressions
+
+
+def _percent(change: float | None) -> str:
+    return "n/a" if change is None else f"{change:+.1%}"
+
+
+def print_summary(result: dict):
+    rows = {"Aggregated": result["aggregate"], **result["endpoints"]} if result["aggregate"] else result["endpoints"]
+    print(f"{'Endpoint':<48} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>9} {'errors':>8}")
+    for name, stats in rows.items():
+        print(
+            f"  {name:<46} {_ms(stats['p50_ms'])} {_ms(stats['p95_ms'])} {_ms(stats['p99_ms'])}"
+            f" {stats['rps'] or 0:9.2f} {stats['error_rate']:8.2%}"
+        )
+    if result["curve"]:
+        print("Throughput curve: " + ", ".join(f"{point['users']}u={point['rps']:.1f}" for point in result["curve"]))
+    knee = result["knee"]
+    if knee is None:
+        print("Knee: none found")
+    else:
+        print(f"Knee: {knee['users']} users at {knee['rps']:.1f} req/s, p95 {_ms(knee['p95_ms']).strip()} ms")
+
+
+def _ms(value: float | None) -> str:
+    return f"{'n/a':>8}" if value is None else f"{value:8.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="http://localhost:9000")
+    parser.add_argument("--shape", default="step", choices=("step", "spike", "soak", "saturation", "none"))
+    parser.add_argument("--users", type=int, default=30, help="users without a shape")
+    parser.add_argument("--spawn-rate", type=float, default=3, help="spawn rate without a shape")
+    parser.add_argument("--run-time", help="locust --run-time, e.g. 10m; required without a shape")
+    parser.add_argument("--locustfile", type=Path, default=LOCUSTFILE)
+    parser.add_argument("--csv-prefix", help="where locust writes its CSV files (default: a temporary directory)")
+    parser.add_argument("--analyze", metavar="PREFIX", help="skip the run and analyze existing CSV files")
+    parser.add_argument("--output", type=Path, help="write the result artifact as JSON")
+    parser.add_argument("--baseline", type=Path, help="artifact of an earlier run to compare against")
+    parser.add_argument("--latency-threshold", type=float, default=0.20, help="relative p95/p99 increase that fails")
+    parser.add_argument("--throughput-threshold", type=float, default=0.10, help="relative req/s drop that fails")
+    parser.add_argument("--error-threshold", type=float, default=0.01, help="error rate increase that fails")
+    args = parser.parse_args()
+    if args.shape == "none" and not args.run_time and not args.analyze:
+        parser.error("--run-time is required with --shape none")
+    args.locustfile = args.locustfile.resolve()
+
+    with tempfile.TemporaryDirectory() as directory:
+        prefix = args.analyze or args.csv_prefix or os.path.join(directory, "load")
+        if not args.analyze:
+            prefix = str(Path(prefix).resolve())
+            returncode = run_locust(args, prefix)
+            if returncode not in LOCUST_OK_CODES:
+                _fail(f"locust exited with status {returncode}")
+        missing = [str(path) for path in csv_paths(prefix) if not path.is_file()]
+        if missing:
+            _fail(f"no locust CSV output at {', '.join(missing)}")
+        result = analyze(prefix)
+
+    artifact = {
+        "schema": SCHEMA_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "host": args.host,
+        "shape": args.shape,
+        "parameters": {key: value for key, value in sorted(os.environ.items()) if key.startswith("LOAD_")},
+        **result,
+    }
+    print_summary(artifact)
+    if args.output:
+        args.output.write_text(json.dumps(artifact, indent=2) + "\n")
+        print(f"Artifact written to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("shape") != artifact["shape"] or baseline.get("parameters") != artifact["parameters"]:
+            print("Warning: the baseline ran with a different shape or parameters")
+        regressions = compare(artifact, baseline, args)
+        if regressions:
+            print(f"{len(regressions)} regression(s):")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
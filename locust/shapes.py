@@ -0,0 +1,139 @@
+"""Load shapes for locustfile.py, selected and configured through environment variables.
+
+``LOAD_SHAPE`` picks one of the shapes below; without it the test runs with
+the ``--users``/``--spawn-rate`` given on the command line. Durations are in
+seconds.
+
+- ``step``: ``LOAD_STEPS`` steps of ``LOAD_STEP_USERS`` users, each held for
+  ``LOAD_STEP_SECONDS``.
+- ``spike``: ``LOAD_USERS`` users, jumping to ``LOAD_SPIKE_USERS`` at
+  ``LOAD_SPIKE_AT`` for ``LOAD_SPIKE_SECONDS``, until ``LOAD_DURATION``.
+- ``soak``: ``LOAD_USERS`` users, reached over ``LOAD_RAMP_SECONDS`` and held
+  until ``LOAD_DURATION``.
+- ``saturation``: steps of ``LOAD_STEP_USERS`` users held for
+  ``LOAD_STEP_SECONDS`` up to ``LOAD_MAX_USERS``. It stops early once the
+  failure ratio reaches ``LOAD_STOP_FAILURE_RATIO`` or the current p95
+  reaches ``LOAD_STOP_P95_MS`` (0 disables the latency limit).
+
+``LOAD_SPAWN_RATE`` is the number of users started or stopped per second
+between levels.
+"""
+import os
+from abc import abstractmethod
+
+from locust import LoadTestShape
+
+
+def env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+
+class StagedLoadShape(LoadTestShape):
+    """Runs through ``stages`` of ``(end_time, users, spawn_rate)`` and stops after the last."""
+
+    abstract = True
+
+    def __init__(self):
+        super().__init__()
+        self.spawn_rate = env_float("LOAD_SPAWN_RATE", 10)
+        self.stages = self.build_stages()
+
+    @abstractmethod
+    def build_stages(self) -> list[tuple[float, int, float]]:
+        """Stages of the shape, built once from the environment."""
+
+    def tick(self):
+        run_time = self.get_run_time()
+        for end_time, users, spawn_rate in self.stages:
+            if run_time < end_time:
+                return users, spawn_rate
+        return None
+
+
+class StepLoadShape(StagedLoadShape):
+    def build_stages(self):
+        step_users = env_int("LOAD_STEP_USERS", 10)
+        step_seconds = env_float("LOAD_STEP_SECONDS", 60)
+        return [
+            (step * step_seconds, step * step_users, self.spawn_rate)
+            for step in range(1, env_int("LOAD_STEPS", 5) + 1)
+        ]
+
+
+class SpikeLoadShape(StagedLoadShape):
+    def build_stages(self):
+        users = env_int("LOAD_USERS", 10)
+        spike_at = env_float("LOAD_SPIKE_AT", 60)
+        spike_end = spike_at + env_float("LOAD_SPIKE_SECONDS", 30)
+        # the spike arrives at once; the return to the base load is as fast
+        spike_users = env_int("LOAD_SPIKE_USERS", 100)
+        return [
+            (spike_at, users, self.spawn_rate),
+            (spike_end, spike_users, spike_users),
+            (env_float("LOAD_DURATION", 180), users, spike_users),
+        ]
+
+
+class SoakLoadShape(StagedLoadShape):
+    def build_stages(self):
+        users = env_int("LOAD_USERS", 50)
+        ramp_seconds = env_float("LOAD_RAMP_SECONDS", 60)
+        spawn_rate = users / ramp_seconds if ramp_seconds > 0 else users
+        return [(env_float("LOAD_DURATION", 3600), users, spawn_rate)]
+
+
+class SaturationLoadShape(StagedLoadShape):
+    """Adds users step by step until the service saturates or ``LOAD_MAX_USERS`` is reached."""
+
+    def __init__(self):
+        super().__init__()
+        self.stop_failure_ratio = env_float("LOAD_STOP_FAILURE_RATIO", 0.2)
+        self.stop_p95_ms = env_float("LOAD_STOP_P95_MS", 0)
+
+    def build_stages(self):
+        step_users = env_int("LOAD_STEP_USERS", 10)
+        step_seconds = env_float("LOAD_STEP_SECONDS", 60)
+        steps = max(1, env_int("LOAD_MAX_USERS", 500) // step_users)
+        return [
+            (step * step_seconds, step * step_users, self.spawn_rate)
+            for step in range(1, steps + 1)
+        ]
+
+    def saturated(self) -> bool:
+        if self.runner is None:
+            return False
+        total = self.runner.environment.stats.total
+        rps = total.current_rps
+        if rps and total.current_fail_per_sec / rps >= self.stop_failure_ratio:
+            return True
+        if self.stop_p95_ms > 0:
+            p95 = total.get_current_response_time_percentile(0.95)
+            return p95 is not None and p95 >= self.stop_p95_ms
+        return False
+
+    def tick(self):
+        if self.saturated():
+            return None
+        return super().tick()
+
+
+SHAPES: dict[str, type[StagedLoadShape]] = {
+    "step": StepLoadShape,
+    "spike": SpikeLoadShape,
+    "soak": SoakLoadShape,
+    "saturation": SaturationLoadShape,
+}
+
+
+def shape_from_env() -> type[LoadTestShape] | None:
+    """Shape class named by ``LOAD_SHAPE``, or ``None`` to run without a shape."""
+    name = os.environ.get("LOAD_SHAPE", "").strip().lower()
+    if not name or name == "none":
+        return None
+    if name not in SHAPES:
+        raise ValueError(f"Unknown LOAD_SHAPE {name!r}, expected one of {', '.join(SHAPES)}")
+    return SHAPES[name]
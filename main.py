@@ -1,6 +1,9 @@
+import asyncio
 import logging
 import sys
 import os
+from contextlib import asynccontextmanager, suppress
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -10,10 +13,26 @@ from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.sdk._logs import LoggingHandler
 from config import CONFIG
 from api.v1.api import api_router
-from monitoring.logging import get_logger_provider
+from api.v1.endpoints.debug import debug_router
+from api.v1.endpoints.streaming import streaming_router
+from api.v1.endpoints.tsp_bulk import tsp_bulk_router
+from monitoring.logging import (
+    LogSampler,
+    OTLPSink,
+    PropagateHandler,
+    get_logger_provider,
+    parse_level_values,
+)
 from monitoring.tracing import get_tracer_provider
 
-from monitoring.prometheus import PrometheusMiddleware, metrics
+from monitoring.prometheus import (
+    PrometheusMiddleware,
+    mark_worker_dead,
+    metrics,
+    reset_multiprocess_dir,
+)
+from repository.tsp import TSPRepository
+from session_manager import close_session_pool, session_for
 
 custom_formatter = (
     "<green>{level}</green>: "
@@ -32,23 +51,68 @@ def safe_format(record):
 
 
 logger.configure(patcher=safe_format)
+log_sampler = LogSampler(
+    sample_rates=parse_level_values(CONFIG.logging.sample_rates),
+    rate_limits=parse_level_values(CONFIG.logging.rate_limits),
+)
+# only records carrying an exception pay for backtrace and variable capture
+logger.add(
+    sys.stderr,
+    colorize=False,
+    enqueue=CONFIG.logging.enqueue,
+    format=custom_formatter,
+    backtrace=False,
+    diagnose=False,
+    level=CONFIG.logging.level,
+    filter=lambda record: record["exception"] is None and log_sampler(record),
+    serialize=False,
+    catch=True,
+)
 logger.add(
     sys.stderr,
     colorize=False,
-    enqueue=True,
+    enqueue=CONFIG.logging.enqueue,
     format=custom_formatter,
     backtrace=True,
-    diagnose=True,
-    level="INFO",
+    diagnose=CONFIG.logging.diagnose,
+    level=CONFIG.logging.level,
+    filter=lambda record: record["exception"] is not None and log_sampler(record),
     serialize=False,
     catch=True,
 )
 
+
+async def refresh_recommendation_index():
+    tsp_repo = TSPRepository()
+    while True:
+        try:
+            async with session_for(tsp_repo.rebuild_recommendation_index) as session_manager:
+                await tsp_repo.rebuild_recommendation_index(session_manager=session_manager)
+        except Exception as exc:
+            logger.error("Failed to rebuild the recommendation index: {}", exc)
+        await asyncio.sleep(CONFIG.db.recommendation_index_refresh_interval)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    index_refresher = None
+    if CONFIG.db.recommendation_index_enabled:
+        index_refresher = asyncio.create_task(refresh_recommendation_index())
+    yield
+    if index_refresher is not None:
+        index_refresher.cancel()
+        with suppress(asyncio.CancelledError):
+            await index_refresher
+    await close_session_pool()
+    mark_worker_dead()
+
+
 main_app = FastAPI(
     title=CONFIG.api.title,
     debug=CONFIG.api.debug,
     version=CONFIG.api.version,
     openapi_url="/openapi.json",
+    lifespan=lifespan,
 )
 
 main_app.add_middleware(
@@ -61,6 +125,10 @@ main_app.add_middleware(
 main_app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 main_app.include_router(router=api_router, prefix=CONFIG.api.prefix)
+main_app.include_router(router=streaming_router, prefix=CONFIG.api.prefix)
+main_app.include_router(router=tsp_bulk_router, prefix=CONFIG.api.prefix)
+if CONFIG.api.debug_endpoints:
+    main_app.include_router(router=debug_router, prefix=CONFIG.api.prefix)
 
 if CONFIG.use_monitoring:
     excluded_urls = ",".join(
@@ -80,26 +148,33 @@ if CONFIG.use_monitoring:
     main_app.add_middleware(PrometheusMiddleware, app_name=CONFIG.api.title)
     main_app.add_route("/metrics", metrics)
 
-    handler = LoggingHandler(level=logging.NOTSET, logger_provider=get_logger_provider())
-    logging.getLogger().addHandler(handler)
-
-
-    class PropagateHandler(logging.Handler):
-        def emit(self, record):
-            if hasattr(record, 'extra') and isinstance(record.extra, dict):
-                del record.extra
-            logging.getLogger(record.name).handle(record)
-
-
-    custom_formatter += " | Trace ID: {extra[trace_id]} | Span ID: {extra[span_id]}"
-    logger.add(
-        PropagateHandler(),
-        format=custom_formatter,
-        colorize=False,
-        level="INFO",
-    )
+    if CONFIG.logging.otlp_mode == "propagate":
+        handler = LoggingHandler(level=logging.NOTSET, logger_provider=get_logger_provider())
+        logging.getLogger().addHandler(handler)
+
+        custom_formatter += " | Trace ID: {extra[trace_id]} | Span ID: {extra[span_id]}"
+        logger.add(
+            PropagateHandler(),
+            format=custom_formatter,
+            colorize=False,
+            level=CONFIG.logging.level,
+            filter=log_sampler,
+        )
+    else:
+        # runs in the logging thread to pick up the active span, so never enqueued
+        logger.add(
+            OTLPSink(get_logger_provider()),
+            format="{message}",
+            colorize=False,
+            backtrace=False,
+            diagnose=False,
+            level=CONFIG.logging.level,
+            filter=log_sampler,
+            catch=True,
+        )
 
 if __name__ == "__main__":
+    reset_multiprocess_dir()
     uvicorn.run(
         "main:main_app", host="0.0.0.0", port=8000, workers=7
     )  # pragma: no cover
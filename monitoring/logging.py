@@ -1,4 +1,12 @@
-from opentelemetry._logs import set_logger_provider
+import logging
+import random
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+
+from opentelemetry import trace
+from opentelemetry._logs import LogRecord, SeverityNumber, set_logger_provider
 from opentelemetry.exporter.otlp.proto.grpc._log_exporter import (
     OTLPLogExporter,
 )
@@ -7,6 +15,7 @@ from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
 from opentelemetry.sdk.resources import Resource
 
 from config import CONFIG
+from monitoring.prometheus import LOG_RECORDS_DROPPED
 
 _LOGGER_PROVIDER: LoggerProvider | None = None
 
@@ -34,3 +43,168 @@ def get_logger_provider() -> LoggerProvider:
 
     _LOGGER_PROVIDER = log_provider
     return _LOGGER_PROVIDER
+
+
+# loguru level names mapped to OTLP severities; SUCCESS is loguru's own INFO variant
+OTLP_SEVERITIES = {
+    "TRACE": SeverityNumber.TRACE,
+    "DEBUG": SeverityNumber.DEBUG,
+    "INFO": SeverityNumber.INFO,
+    "SUCCESS": SeverityNumber.INFO2,
+    "WARNING": SeverityNumber.WARN,
+    "ERROR": SeverityNumber.ERROR,
+    "CRITICAL": SeverityNumber.FATAL,
+}
+OTLP_SEVERITY_TEXTS = {"WARNING": "WARN", "CRITICAL": "FATAL"}
+OTLP_ATTRIBUTE_TYPES = (str, bool, int, float)
+
+
+class OTLPSink:
+    """Loguru sink writing every record straight into the OTLP log batch.
+
+    Records are turned into OpenTelemetry log records once, without going
+    through stdlib logging, and carry the trace and span id of the span
+    active where they were logged, so the sink must not be added with
+    ``enqueue=True``. Records logged outside a span fall back to hex
+    ``trace_id``/``span_id`` values bound in ``extra``. The message is
+    exported as logged; ``extra`` values become attributes.
+    """
+
+    def __init__(self, logger_provider: LoggerProvider):
+        self._logger_provider = logger_provider
+        self._loggers = {}
+
+    def __call__(self, message):
+        record = message.record
+        name = record["name"] or "root"
+        otel_logger = self._loggers.get(name)
+        if otel_logger is None:
+            otel_logger = self._loggers[name] = self._logger_provider.get_logger(name)
+
+        level = record["level"].name
+        trace_id, span_id, trace_flags = self._span_ids(record)
+        otel_logger.emit(
+            LogRecord(
+                timestamp=int(record["time"].timestamp() * 1e9),
+                observed_timestamp=time.time_ns(),
+                trace_id=trace_id,
+                span_id=span_id,
+                trace_flags=trace_flags,
+                severity_text=OTLP_SEVERITY_TEXTS.get(level, level),
+                severity_number=OTLP_SEVERITIES.get(level, SeverityNumber.UNSPECIFIED),
+                body=record["message"],
+                attributes=self._attributes(record),
+            )
+        )
+
+    @staticmethod
+    def _span_ids(record) -> tuple[int | None, int | None, trace.TraceFlags | None]:
+        span_context = trace.get_current_span().get_span_context()
+        if span_context.is_valid:
+            return span_context.trace_id, span_context.span_id, span_context.trace_flags
+        extra = record["extra"]
+        try:
+            return int(extra["trace_id"], 16), int(extra["span_id"], 16), trace.TraceFlags(0)
+        except (KeyError, TypeError, ValueError):
+            return None, None, None
+
+    @staticmethod
+    def _attributes(record) -> dict:
+        attributes = {
+            "code.filepath": record["file"].path,
+            "code.function": record["function"],
+            "code.lineno": record["line"],
+        }
+        for key, value in record["extra"].items():
+            attributes[key] = value if isinstance(value, OTLP_ATTRIBUTE_TYPES) else str(value)
+        exception = record["exception"]
+        if exception is not None and exception.type is not None:
+            attributes["exception.type"] = exception.type.__name__
+            attributes["exception.message"] = str(exception.value)
+            attributes["exception.stacktrace"] = "".join(
+                traceback.format_exception(exception.type, exception.value, exception.traceback)
+            )
+        return attributes
+
+
+class PropagateHandler(logging.Handler):
+    """Loguru sink handing records to stdlib logging, and so to the OTLP ``LoggingHandler``."""
+
+    def emit(self, record):
+        if hasattr(record, 'extra') and isinstance(record.extra, dict):
+            del record.extra
+        logging.getLogger(record.name).handle(record)
+
+
+@dataclass
+class LogSampler:
+    """Loguru filter sampling and rate limiting records by level.
+
+    ``sample_rates`` keeps that fraction of the records of a level, and
+    ``rate_limits`` allows that many records per second and call site of a
+    level, so an error logged on every failed query cannot flood the sinks
+    when the database goes away. Records with an exception are never
+    sampled out, only rate limited. The first record let through after a
+    suppression carries the count in ``extra["suppressed"]``.
+
+    The decision is made once per record and reused by every sink the
+    filter is attached to.
+    """
+
+    sample_rates: dict[str, float]
+    rate_limits: dict[str, float]
+    _buckets: dict[tuple, list[float]] = field(init=False, default_factory=dict)
+    _suppressed: dict[tuple, int] = field(init=False, default_factory=dict)
+    _last: threading.local = field(init=False, default_factory=threading.local)
+
+    def __call__(self, record) -> bool:
+        if getattr(self._last, "record", None) is record:
+            return self._last.decision
+        decision = self._decide(record)
+        self._last.record = record
+        self._last.decision = decision
+        return decision
+
+    def _decide(self, record) -> bool:
+        level = record["level"].name
+        sample_rate = self.sample_rates.get(level)
+        if (
+            sample_rate is not None
+            and record["exception"] is None
+            and random.random() >= sample_rate
+        ):
+            LOG_RECORDS_DROPPED.labels(level=level, reason="sampled").inc()
+            return False
+
+        rate_limit = self.rate_limits.get(level)
+        if rate_limit is None:
+            return True
+        site = (level, record["name"], record["function"], record["line"])
+        now = time.monotonic()
+        bucket = self._buckets.get(site)
+        if bucket is None:
+            bucket = self._buckets[site] = [rate_limit, now]
+        # token bucket holding up to one second worth of records
+        tokens = min(rate_limit, bucket[0] + (now - bucket[1]) * rate_limit)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            self._suppressed[site] = self._suppressed.get(site, 0) + 1
+            LOG_RECORDS_DROPPED.labels(level=level, reason="rate_limited").inc()
+            return False
+        bucket[0] = tokens - 1
+        suppressed = self._suppressed.pop(site, None)
+        if suppressed:
+            record["extra"]["suppressed"] = suppressed
+        return True
+
+
+def parse_level_values(value: str) -> dict[str, float]:
+    """``"DEBUG=0.01,WARNING=20"`` as ``{"DEBUG": 0.01, "WARNING": 20.0}``."""
+    levels = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        level, _, number = item.partition("=")
+        levels[level.strip().upper()] = float(number)
+    return levels
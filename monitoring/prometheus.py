@@ -1,22 +1,25 @@
+import glob
+import os
+import re
 import time
-from typing import Tuple
+from dataclasses import dataclass, field
+from typing import Any
 
 from opentelemetry import trace
 
-from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
 from prometheus_client.openmetrics.exposition import (CONTENT_TYPE_LATEST,
                                                       generate_latest)
-from starlette.middleware.base import (BaseHTTPMiddleware,
-                                       RequestResponseEndpoint)
 from starlette.requests import Request
 from starlette.responses import Response
-from starlette.routing import Match
+from starlette.routing import BaseRoute, Match, Route
 from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
-from starlette.types import ASGIApp
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 INFO = Gauge(
     "fastapi_app_info", "FastAPI application information.", [
-        "app_name"]
+        "app_name"],
+    multiprocess_mode="livemax",
 )
 REQUESTS = Counter(
     "fastapi_requests_total", "Total count of requests by method and path.", [
@@ -41,61 +44,319 @@ REQUESTS_IN_PROGRESS = Gauge(
     "fastapi_requests_in_progress",
     "Gauge of requests by method and path currently being processed",
     ["method", "path", "app_name"],
+    multiprocess_mode="livesum",
 )
+SPARKSEE_POOL_IN_USE = Gauge(
+    "sparksee_pool_sessions_in_use",
+    "Gauge of Sparksee sessions currently borrowed from the session pool",
+    multiprocess_mode="livesum",
+)
+SPARKSEE_POOL_IDLE = Gauge(
+    "sparksee_pool_sessions_idle",
+    "Gauge of warm Sparksee sessions waiting in the session pool",
+    multiprocess_mode="livesum",
+)
+SPARKSEE_POOL_WAIT_TIME = Histogram(
+    "sparksee_pool_wait_seconds",
+    "Histogram of time spent waiting to borrow a Sparksee session (in seconds)",
+)
+QUERY_CACHE_HITS = Counter(
+    "sparksee_query_cache_hits_total",
+    "Total count of repository reads served from the query cache by method",
+    ["method"],
+)
+QUERY_CACHE_MISSES = Counter(
+    "sparksee_query_cache_misses_total",
+    "Total count of repository reads that missed the query cache by method",
+    ["method"],
+)
+QUERY_CACHE_EVICTIONS = Counter(
+    "sparksee_query_cache_evictions_total",
+    "Total count of query cache entries dropped by reason",
+    ["reason"],
+)
+SPARKSEE_RPC_DURATION = Histogram(
+    "sparksee_rpc_duration_seconds",
+    "Histogram of Sparksee gRPC call time by RPC method (in seconds)",
+    ["method"],
+)
+SPARKSEE_RPC_ERRORS = Counter(
+    "sparksee_rpc_errors_total",
+    "Total count of failed Sparksee gRPC calls by RPC method and status code",
+    ["method", "code"],
+)
+SPARKSEE_QUERY_DURATION = Histogram(
+    "sparksee_query_duration_seconds",
+    "Histogram of statement time from RunQuery to the last fetched row by fingerprint (in seconds)",
+    ["fingerprint", "query_type"],
+)
+SPARKSEE_QUERY_ROWS = Histogram(
+    "sparksee_query_rows",
+    "Histogram of rows fetched per statement by fingerprint",
+    ["fingerprint"],
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000),
+)
+SPARKSEE_QUERY_BYTES = Histogram(
+    "sparksee_query_received_bytes",
+    "Histogram of result bytes received per statement by fingerprint",
+    ["fingerprint"],
+    buckets=(64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+REPOSITORY_METHOD_DURATION = Histogram(
+    "repository_method_duration_seconds",
+    "Histogram of repository method time including cache and parsing by method (in seconds)",
+    ["method"],
+)
+REPOSITORY_PARSE_DURATION = Histogram(
+    "repository_parse_duration_seconds",
+    "Histogram of time spent turning result rows into models by method (in seconds)",
+    ["method"],
+)
+SINGLE_FLIGHT_COALESCED = Counter(
+    "sparksee_single_flight_coalesced_total",
+    "Total count of repository reads served by an identical read already in flight by method",
+    ["method"],
+)
+NODE_LOADER_BATCH_SIZE = Histogram(
+    "sparksee_node_loader_batch_size",
+    "Histogram of node ids fetched per batched lookup by entity",
+    ["entity"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+RECOMMENDATION_LOOKUPS = Counter(
+    "tsp_recommendation_lookups_total",
+    "Total count of TSP recommendation lookups by source (index or graph)",
+    ["source"],
+)
+TRACING_SPANS = Counter(
+    "otel_spans_total",
+    "Total count of ended spans by export decision (sampled, error, slow or unsampled)",
+    ["decision"],
+)
+TRACING_SPANS_DROPPED = Counter(
+    "otel_spans_dropped_total",
+    "Total count of spans chosen for export but dropped by reason",
+    ["reason"],
+)
+TRACING_SPANS_EXPORTED = Counter(
+    "otel_spans_exported_total",
+    "Total count of spans accepted by the trace collector",
+)
+TRACING_SPAN_QUEUE_SIZE = Gauge(
+    "otel_span_queue_size",
+    "Gauge of spans waiting in the export queue",
+    multiprocess_mode="livesum",
+)
+TRACING_EXPORT_DURATION = Histogram(
+    "otel_span_export_duration_seconds",
+    "Histogram of span batch export time by result (in seconds)",
+    ["result"],
+)
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Total count of log records dropped by level and reason (sampled or rate_limited)",
+    ["level", "reason"],
+)
+
+
+@dataclass
+class RouteMetrics:
+    """Label children of one (method, path template) bound once and reused."""
+
+    requests: Any
+    in_progress: Any
+    duration: Any
+    responses: dict[int, Any] = field(default_factory=dict)
 
 
-class PrometheusMiddleware(BaseHTTPMiddleware):
+class PrometheusMiddleware:
+    """Pure ASGI middleware recording request metrics by route template.
+
+    The routes are split once into those with a fixed path, looked up by the
+    request path in a dictionary, and those with path parameters, which still
+    have to be matched in order. A request to a fixed path costs a dictionary
+    lookup, one to a parameterized path a scan of the parameterized routes
+    only; nothing is cached per raw path, so ids in the URL cannot crowd out
+    anything. The label children of every route are bound once instead of
+    five ``.labels()`` calls per request. Response bodies pass through
+    untouched, which keeps streaming responses streaming.
+    """
+
     def __init__(self, app: ASGIApp, app_name: str = "fastapi-app") -> None:
-        super().__init__(app)
+        self.app = app
         self.app_name = app_name
+        self._routes: list[BaseRoute] | None = None
+        self._route_count = 0
+        self._candidates: dict[str, list[BaseRoute]] = {}
+        self._parameterized: list[BaseRoute] = []
+        self._metrics: dict[tuple[str, str], RouteMetrics] = {}
         INFO.labels(app_name=self.app_name).inc()
 
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
-        method = request.method
-        path, is_handled_path = self.get_path(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        path = self.get_path(scope)
+        if path is None:
+            await self.app(scope, receive, send)
+            return
+
+        route_metrics = self._route_metrics(method, path)
+        route_metrics.in_progress.inc()
+        route_metrics.requests.inc()
+        status_code = HTTP_500_INTERNAL_SERVER_ERROR
 
-        if not is_handled_path:
-            return await call_next(request)
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
-        REQUESTS_IN_PROGRESS.labels(
-            method=method, path=path, app_name=self.app_name).inc()
-        REQUESTS.labels(method=method, path=path, app_name=self.app_name).inc()
         before_time = time.perf_counter()
         try:
-            response = await call_next(request)
+            await self.app(scope, receive, send_with_status)
         except BaseException as e:
             status_code = HTTP_500_INTERNAL_SERVER_ERROR
             EXCEPTIONS.labels(method=method, path=path, exception_type=type(
                 e).__name__, app_name=self.app_name).inc()
             raise e from None
         else:
-            status_code = response.status_code
             after_time = time.perf_counter()
             # retrieve trace id for exemplar
             span = trace.get_current_span()
             trace_id = trace.format_trace_id(
                 span.get_span_context().trace_id)
 
-            REQUESTS_PROCESSING_TIME.labels(method=method, path=path, app_name=self.app_name).observe(
+            route_metrics.duration.observe(
                 after_time - before_time, exemplar={'TraceID': trace_id}
             )
         finally:
-            RESPONSES.labels(method=method, path=path,
-                             status_code=status_code, app_name=self.app_name).inc()
-            REQUESTS_IN_PROGRESS.labels(
-                method=method, path=path, app_name=self.app_name).dec()
+            responses = route_metrics.responses.get(status_code)
+            if responses is None:
+                responses = route_metrics.responses[status_code] = RESPONSES.labels(
+                    method=method, path=path, status_code=status_code, app_name=self.app_name)
+            responses.inc()
+            route_metrics.in_progress.dec()
 
-        return response
-
-    @staticmethod
-    def get_path(request: Request) -> Tuple[str, bool]:
-        for route in request.app.routes:
-            match, child_scope = route.matches(request.scope)
+    def get_path(self, scope: Scope) -> str | None:
+        """Route template of the request, or ``None`` when no route matches."""
+        routes = scope["app"].routes
+        if routes is not self._routes or len(routes) != self._route_count:
+            self._index_routes(routes)
+        for route in self._candidates.get(route_path(scope), self._parameterized):
+            match, child_scope = route.matches(scope)
             if match == Match.FULL:
-                return route.path, True
+                return route.path
+        return None
+
+    def _index_routes(self, routes: list[BaseRoute]) -> None:
+        """Map every fixed path to the routes that may match it, in routing order."""
+        fixed = [route for route in routes if isinstance(route, Route) and not route.param_convertors]
+        self._parameterized = [route for route in routes if route not in fixed]
+        self._candidates = {
+            path: [
+                route for route in routes
+                if route in self._parameterized or route.path == path
+            ]
+            for path in {route.path for route in fixed}
+        }
+        self._routes, self._route_count = routes, len(routes)
+
+    def _route_metrics(self, method: str, path: str) -> RouteMetrics:
+        route_metrics = self._metrics.get((method, path))
+        if route_metrics is None:
+            labels = {"method": method, "path": path, "app_name": self.app_name}
+            route_metrics = self._metrics[(method, path)] = RouteMetrics(
+                requests=REQUESTS.labels(**labels),
+                in_progress=REQUESTS_IN_PROGRESS.labels(**labels),
+                duration=REQUESTS_PROCESSING_TIME.labels(**labels),
+            )
+        return route_metrics
+
+
+def route_path(scope: Scope) -> str:
+    """Request path as the routes match it, without the root path of a mounted app."""
+    path, root_path = scope["path"], scope.get("root_path", "")
+    if root_path and path.startswith(root_path) and path[len(root_path):len(root_path) + 1] == "/":
+        return path[len(root_path):]
+    return path
+
+
+def trace_exemplar() -> dict[str, str] | None:
+    """Exemplar linking an observation to the current trace, if there is one."""
+    span_context = trace.get_current_span().get_span_context()
+    if not span_context.is_valid:
+        return None
+    return {"TraceID": trace.format_trace_id(span_context.trace_id)}
+
+
+# set for uvicorn/gunicorn with several workers: every worker writes its values
+# to mmap-backed files in this directory and a scrape aggregates all of them
+MULTIPROCESS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+LIVE_GAUGE_FILE = re.compile(r"gauge_live\w+_(\d+)\.db$")
+METRIC_FILE = re.compile(r"_(\d+)\.db$")
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Registry to expose: this process alone, or all workers in multiprocess mode."""
+    if not MULTIPROCESS_DIR:
+        return REGISTRY
+    prune_dead_workers()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def prune_dead_workers():
+    """Drop the live gauges of workers that exited without cleaning up, e.g. after a crash.
+
+    Counters and histograms of dead workers are kept so totals never go down.
+    """
+    pids = set()
+    for path in glob.glob(os.path.join(MULTIPROCESS_DIR, "gauge_live*.db")):
+        match = LIVE_GAUGE_FILE.search(path)
+        if match:
+            pids.add(int(match.group(1)))
+    for pid in pids:
+        if not _is_alive(pid):
+            multiprocess.mark_process_dead(pid)
+
+
+def mark_worker_dead():
+    """Remove the live gauges of this worker; called when it shuts down."""
+    if MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def reset_multiprocess_dir():
+    """Drop the metric files of earlier runs; called once before the workers start.
+
+    prometheus_client has already mapped files of this process by the time
+    this module is imported, so only files of processes that are gone are
+    removed.
+    """
+    if not MULTIPROCESS_DIR:
+        return
+    os.makedirs(MULTIPROCESS_DIR, exist_ok=True)
+    for path in glob.glob(os.path.join(MULTIPROCESS_DIR, "*.db")):
+        match = METRIC_FILE.search(path)
+        if match and not _is_alive(int(match.group(1))):
+            os.remove(path)
+
 
-        return request.url.path, False
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
 
 
 def metrics(request: Request) -> Response:
-    return Response(generate_latest(REGISTRY), headers={"Content-Type": CONTENT_TYPE_LATEST})
+    return Response(
+        generate_latest(metrics_registry()), headers={"Content-Type": CONTENT_TYPE_LATEST}
+    )
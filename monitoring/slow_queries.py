@@ -0,0 +1,232 @@
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+from loguru import logger
+
+from config import CONFIG
+
+# placeholder types holding identifiers and numbers, never free-form user data
+SAFE_KINDS = frozenset({"name", "label", "long", "int"})
+PHASES = ("run", "fetch", "close", "parse")
+
+
+@dataclass
+class QueryProfile:
+    """Timing breakdown of one statement, in seconds per phase."""
+
+    fingerprint: str
+    query_type: str
+    params: dict[str, Any]
+    # fingerprint of the outer template; distributions are grouped by it
+    template_fingerprint: str = "adhoc"
+    kinds: dict[str, str] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.time)
+    rows: int = 0
+    run: float = 0.0
+    fetch: float = 0.0
+    close: float = 0.0
+    parse: float = 0.0
+    error: str | None = None
+
+    @property
+    def total(self) -> float:
+        return self.run + self.fetch + self.close + self.parse
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "query_type": self.query_type,
+            "params": redact(self.params, self.kinds),
+            "started_at": self.started_at,
+            "rows": self.rows,
+            "total_ms": self.total * 1000,
+            **{f"{phase}_ms": getattr(self, phase) * 1000 for phase in PHASES},
+            "error": self.error,
+        }
+
+
+def redact(params: dict[str, Any], kinds: dict[str, str]) -> dict[str, Any]:
+    """Bound parameters with everything but identifiers and numbers replaced by its type and size.
+
+    What is kept depends on the placeholder type of the parameter in the
+    template, not on what the value looks like.
+    """
+    redacted = {}
+    for name, value in params.items():
+        if kinds.get(name) in SAFE_KINDS:
+            redacted[name] = value
+        elif hasattr(value, "fingerprint"):
+            redacted[name] = f"<fragment {value.fingerprint}>"
+        elif isinstance(value, (list, tuple, set)):
+            redacted[name] = f"<{type(value).__name__} len={len(value)}>"
+        elif isinstance(value, str):
+            redacted[name] = f"<str len={len(value)}>"
+        else:
+            redacted[name] = f"<{type(value).__name__}>"
+    return redacted
+
+
+@dataclass
+class FingerprintStats:
+    """Sampled distribution of one statement fingerprint."""
+
+    reservoir_size: int
+    count: int = 0
+    rows: int = 0
+    max: float = 0.0
+    totals: dict[str, float] = field(default_factory=lambda: dict.fromkeys(PHASES, 0.0))
+    _samples: list[float] = field(default_factory=list)
+
+    def add(self, profile: QueryProfile):
+        self.count += 1
+        self.rows += profile.rows
+        self.max = max(self.max, profile.total)
+        for phase in PHASES:
+            self.totals[phase] += getattr(profile, phase)
+        # reservoir sampling keeps a uniform sample of all durations seen
+        if len(self._samples) < self.reservoir_size:
+            self._samples.append(profile.total)
+        else:
+            index = random.randrange(self.count)
+            if index < self.reservoir_size:
+                self._samples[index] = profile.total
+
+    def as_dict(self, sample_rate: float) -> dict[str, Any]:
+        ordered = sorted(self._samples)
+        total = sum(self.totals.values())
+        return {
+            "sampled": self.count,
+            "estimated_calls": round(self.count / sample_rate) if sample_rate else self.count,
+            "estimated_total_ms": (total / sample_rate if sample_rate else total) * 1000,
+            "mean_ms": total / self.count * 1000,
+            "p50_ms": _percentile(ordered, 0.50) * 1000,
+            "p95_ms": _percentile(ordered, 0.95) * 1000,
+            "p99_ms": _percentile(ordered, 0.99) * 1000,
+            "max_ms": self.max * 1000,
+            "mean_rows": self.rows / self.count,
+            **{f"{phase}_share": self.totals[phase] / total if total else 0.0 for phase in PHASES},
+        }
+
+
+def _percentile(ordered: list[float], quantile: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))]
+
+
+@dataclass
+class QueryProfiler:
+    """Per-worker slow-query log and sampling profiler.
+
+    Statements slower than ``threshold`` seconds go to a ring buffer of the
+    last ``log_size`` entries and to a structured warning log. Independently,
+    a ``sample_rate`` fraction of all statements feeds distributions per
+    template fingerprint, which tell which statements dominate database time;
+    the rate can be changed at runtime to profile on demand.
+    """
+
+    threshold: float
+    log_size: int
+    sample_rate: float
+    reservoir_size: int = 256
+    _slow: deque[QueryProfile] = field(init=False)
+    _stats: dict[str, FingerprintStats] = field(init=False, default_factory=dict)
+
+    def __post_init__(self):
+        self._slow = deque(maxlen=self.log_size)
+
+    def record(self, profile: QueryProfile):
+        if profile.total >= self.threshold:
+            self._slow.append(profile)
+            entry = profile.as_dict()
+            logger.bind(slow_query=entry).warning(
+                "Slow {} query {} took {:.1f}ms ({} rows)",
+                profile.query_type,
+                profile.fingerprint,
+                entry["total_ms"],
+                profile.rows,
+            )
+        if self.sample_rate and random.random() < self.sample_rate:
+            stats = self._stats.get(profile.template_fingerprint)
+            if stats is None:
+                stats = FingerprintStats(self.reservoir_size)
+                self._stats[profile.template_fingerprint] = stats
+            stats.add(profile)
+
+    def slow_queries(self) -> list[dict[str, Any]]:
+        """Logged slow statements, newest first."""
+        return [profile.as_dict() for profile in reversed(self._slow)]
+
+    def fingerprint_stats(self) -> dict[str, dict[str, Any]]:
+        """Sampled distributions by fingerprint, most estimated database time first."""
+        stats = {
+            fingerprint: stats.as_dict(self.sample_rate)
+            for fingerprint, stats in self._stats.items()
+        }
+        return dict(sorted(stats.items(), key=lambda item: -item[1]["estimated_total_ms"]))
+
+    def set_sample_rate(self, sample_rate: float):
+        """Change the sampled fraction; the distributions restart so estimates stay consistent."""
+        self.sample_rate = sample_rate
+        self._stats.clear()
+
+    def reset(self):
+        self._slow.clear()
+        self._stats.clear()
+
+
+_QUERY_PROFILER: QueryProfiler | None = None
+_CURRENT_PROFILE: ContextVar[QueryProfile | None] = ContextVar("query_profile", default=None)
+
+
+def get_query_profiler() -> QueryProfiler:
+    global _QUERY_PROFILER
+    if _QUERY_PROFILER is not None:
+        return _QUERY_PROFILER
+
+    _QUERY_PROFILER = QueryProfiler(
+        threshold=CONFIG.db.slow_query_threshold,
+        log_size=CONFIG.db.slow_query_log_size,
+        sample_rate=CONFIG.db.query_profile_sample_rate,
+    )
+    return _QUERY_PROFILER
+
+
+def start_profile(stmt: str, query_type: str) -> QueryProfile:
+    return QueryProfile(
+        fingerprint=getattr(stmt, "fingerprint", "adhoc"),
+        query_type=query_type,
+        params=getattr(stmt, "params", {}),
+        template_fingerprint=getattr(stmt, "template_fingerprint", "adhoc"),
+        kinds=getattr(stmt, "kinds", {}),
+    )
+
+
+@contextmanager
+def profile_query(stmt: str, query_type: str) -> Iterator[QueryProfile]:
+    """Profile of the statement being run, shared by the code around it.
+
+    The outermost caller owns the profile and records it on exit, so the
+    repository can add parse time to the RPC phases the session manager
+    measured.
+    """
+    current = _CURRENT_PROFILE.get()
+    if current is not None:
+        yield current
+        return
+
+    profile = start_profile(stmt, query_type)
+    token = _CURRENT_PROFILE.set(profile)
+    try:
+        yield profile
+    except BaseException as error:
+        profile.error = type(error).__name__
+        raise
+    finally:
+        _CURRENT_PROFILE.reset(token)
+        get_query_profiler().record(profile)
@@ -1,13 +1,34 @@
-from typing import Optional
+import os
+import threading
+import time
+from typing import Optional, Sequence
 
+from opentelemetry import trace
+from opentelemetry.context import Context
 from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
     OTLPSpanExporter,
 )
 from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.sampling import (
+    ALWAYS_OFF,
+    Decision,
+    ParentBased,
+    Sampler,
+    SamplingResult,
+    TraceIdRatioBased,
+)
+from opentelemetry.trace import SpanContext, StatusCode, TraceFlags
 
 from config import CONFIG
+from monitoring.prometheus import (
+    TRACING_EXPORT_DURATION,
+    TRACING_SPAN_QUEUE_SIZE,
+    TRACING_SPANS,
+    TRACING_SPANS_DROPPED,
+    TRACING_SPANS_EXPORTED,
+)
 
 _TRACER_PROVIDER: Optional[TracerProvider] = None
 
@@ -17,12 +38,238 @@ OTEL_ENVIRONMENT = {
 }
 
 
+class RecordOnlySampler(Sampler):
+    """Records the spans ``sampler`` drops instead of discarding them.
+
+    Recorded but unsampled spans are not exported on their own, but they
+    carry their status and duration to ``TailSamplingSpanProcessor``, which
+    can still keep the failed and slow ones. Every span is then recorded,
+    so the tracing overhead no longer shrinks with the sample ratio; it is
+    only used when error or slow-span retention is turned on.
+    """
+
+    def __init__(self, sampler: Sampler):
+        self._sampler = sampler
+
+    def should_sample(
+        self,
+        parent_context,
+        trace_id,
+        name,
+        kind=None,
+        attributes=None,
+        links=None,
+        trace_state=None,
+    ) -> SamplingResult:
+        result = self._sampler.should_sample(
+            parent_context, trace_id, name, kind, attributes, links, trace_state
+        )
+        if result.decision is Decision.DROP:
+            return SamplingResult(Decision.RECORD_ONLY, result.attributes, result.trace_state)
+        return result
+
+    def get_description(self) -> str:
+        return f"RecordOnly{{{self._sampler.get_description()}}}"
+
+
+class MeteredSpanExporter(SpanExporter):
+    """Exporter wrapper counting exported and failed spans and timing every batch."""
+
+    def __init__(self, exporter: SpanExporter, on_export):
+        self._exporter = exporter
+        self._on_export = on_export
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        self._on_export(len(spans))
+        before_time = time.perf_counter()
+        result = SpanExportResult.FAILURE
+        try:
+            result = self._exporter.export(spans)
+        finally:
+            succeeded = result is SpanExportResult.SUCCESS
+            TRACING_EXPORT_DURATION.labels(
+                result="success" if succeeded else "failure"
+            ).observe(time.perf_counter() - before_time)
+            if succeeded:
+                TRACING_SPANS_EXPORTED.inc(len(spans))
+            else:
+                TRACING_SPANS_DROPPED.labels(reason="export_failed").inc(len(spans))
+        return result
+
+    def shutdown(self) -> None:
+        self._exporter.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self._exporter.force_flush(timeout_millis)
+
+
+class TailSamplingSpanProcessor(SpanProcessor):
+    """Batch export of sampled spans plus the unsampled ones worth keeping.
+
+    A span reaches the ``BatchSpanProcessor`` when it was sampled, when it
+    ended with an error status and ``keep_errors`` is set, or when it took at
+    least ``slow_threshold`` seconds (0 disables it); kept spans are exported
+    individually, so they may arrive without their parents. Spans are
+    counted in the queue until the exporter takes them or they are dropped,
+    and are refused once ``max_queue_size`` are waiting, so a slow collector
+    costs at most a full queue of memory.
+    """
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        keep_errors: bool,
+        slow_threshold: float,
+        max_queue_size: int,
+        max_export_batch_size: int,
+        schedule_delay: float,
+        export_timeout: float,
+    ):
+        self.keep_errors = keep_errors
+        self.slow_threshold_ns = int(slow_threshold * 1e9) if slow_threshold > 0 else None
+        self.max_queue_size = max_queue_size
+        self._queued = 0
+        self._shutdown = False
+        self._lock = threading.Lock()
+        self._decisions = {
+            decision: TRACING_SPANS.labels(decision=decision)
+            for decision in ("sampled", "error", "slow", "unsampled")
+        }
+        self._queue_full = TRACING_SPANS_DROPPED.labels(reason="queue_full")
+        self._processor = BatchSpanProcessor(
+            MeteredSpanExporter(exporter, self._dequeued),
+            # never full before this processor refuses spans, so it cannot evict one silently
+            max_queue_size=max_queue_size * 2,
+            max_export_batch_size=min(max_export_batch_size, max_queue_size),
+            schedule_delay_millis=schedule_delay * 1000,
+            export_timeout_millis=export_timeout * 1000,
+        )
+        if hasattr(os, "register_at_fork"):
+            # a forked child starts with an empty batch queue; the parent still exports its spans
+            os.register_at_fork(after_in_child=self._forked)
+
+    @property
+    def keeps_unsampled(self) -> bool:
+        return self.keep_errors or self.slow_threshold_ns is not None
+
+    def on_start(self, span, parent_context: Optional[Context] = None) -> None:
+        pass
+
+    def on_end(self, span: ReadableSpan) -> None:
+        decision = self._decision(span)
+        self._decisions[decision].inc()
+        if decision == "unsampled":
+            return
+
+        with self._lock:
+            if self._shutdown:
+                TRACING_SPANS_DROPPED.labels(reason="shutdown").inc()
+                return
+            if self._queued >= self.max_queue_size:
+                self._queue_full.inc()
+                return
+            self._queued += 1
+        TRACING_SPAN_QUEUE_SIZE.inc()
+        if decision != "sampled":
+            span = _as_sampled(span)
+        self._processor.on_end(span)
+
+    def _decision(self, span: ReadableSpan) -> str:
+        if span.context.trace_flags.sampled:
+            return "sampled"
+        if self.keep_errors and span.status.status_code is StatusCode.ERROR:
+            return "error"
+        if (
+            self.slow_threshold_ns is not None
+            and span.end_time - span.start_time >= self.slow_threshold_ns
+        ):
+            return "slow"
+        return "unsampled"
+
+    def _dequeued(self, count: int):
+        with self._lock:
+            self._queued -= count
+        TRACING_SPAN_QUEUE_SIZE.dec(count)
+
+    def _dropped(self, reason: str):
+        with self._lock:
+            count, self._queued = self._queued, 0
+        if count:
+            TRACING_SPANS_DROPPED.labels(reason=reason).inc(count)
+            TRACING_SPAN_QUEUE_SIZE.dec(count)
+
+    def _forked(self):
+        self._lock = threading.Lock()
+        self._queued = 0
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._shutdown = True
+        self._processor.shutdown()
+        # whatever the exporter did not take before the shutdown timed out is lost
+        self._dropped("shutdown")
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self._processor.force_flush(timeout_millis)
+
+
+def _as_sampled(span: ReadableSpan) -> ReadableSpan:
+    """Copy of a recorded span with the sampled flag set, which the batch processor requires."""
+    context = span.context
+    return ReadableSpan(
+        name=span.name,
+        context=SpanContext(
+            context.trace_id,
+            context.span_id,
+            context.is_remote,
+            TraceFlags(context.trace_flags | TraceFlags.SAMPLED),
+            context.trace_state,
+        ),
+        parent=span.parent,
+        resource=span.resource,
+        attributes=span.attributes,
+        events=span.events,
+        links=span.links,
+        kind=span.kind,
+        status=span.status,
+        start_time=span.start_time,
+        end_time=span.end_time,
+        instrumentation_scope=span.instrumentation_scope,
+    )
+
+
+def build_sampler(sample_ratio: float, record_unsampled: bool) -> Sampler:
+    """Parent-based ratio sampler; unsampled spans are recorded when they may still be kept."""
+    root: Sampler = TraceIdRatioBased(sample_ratio)
+    parent_not_sampled: Sampler = ALWAYS_OFF
+    if record_unsampled:
+        root = RecordOnlySampler(root)
+        parent_not_sampled = RecordOnlySampler(ALWAYS_OFF)
+    return ParentBased(
+        root=root,
+        remote_parent_not_sampled=parent_not_sampled,
+        local_parent_not_sampled=parent_not_sampled,
+    )
+
+
 def get_tracer_provider() -> TracerProvider:
     global _TRACER_PROVIDER
     if _TRACER_PROVIDER is not None:
         return _TRACER_PROVIDER
 
+    span_processor = TailSamplingSpanProcessor(
+        OTLPSpanExporter(insecure=True, endpoint=CONFIG.otel_collector_url),
+        keep_errors=CONFIG.tracing.keep_errors,
+        slow_threshold=CONFIG.tracing.slow_span_threshold,
+        max_queue_size=CONFIG.tracing.max_queue_size,
+        max_export_batch_size=CONFIG.tracing.max_export_batch_size,
+        schedule_delay=CONFIG.tracing.schedule_delay,
+        export_timeout=CONFIG.tracing.export_timeout,
+    )
     tracer_provider: TracerProvider = TracerProvider(
+        sampler=build_sampler(
+            CONFIG.tracing.sample_ratio, record_unsampled=span_processor.keeps_unsampled
+        ),
         resource=Resource(
             attributes={
                 'service.name': CONFIG.api.title,
@@ -34,9 +281,14 @@ def get_tracer_provider() -> TracerProvider:
             }
         )
     )
-    span_exporter = OTLPSpanExporter(insecure=True, endpoint=CONFIG.otel_collector_url)
-    span_processor = BatchSpanProcessor(span_exporter)
     tracer_provider.add_span_processor(span_processor)
 
     _TRACER_PROVIDER = tracer_provider
     return _TRACER_PROVIDER
+
+
+def get_tracer(name: str) -> trace.Tracer:
+    """Tracer exporting through the service provider when monitoring is on, else a no-op one."""
+    if not CONFIG.use_monitoring:
+        return trace.get_tracer(name)
+    return get_tracer_provider().get_tracer(name)
@@ -1,117 +1,412 @@
-from functools import wraps
-from typing import Any, Awaitable, Callable, Generic, Type, TypeVar
+import time
+from contextlib import aclosing
+from datetime import datetime, timedelta
+from functools import cached_property, lru_cache, wraps
+from operator import attrgetter
+from typing import Any, AsyncIterator, Awaitable, Callable, Generic, Type, TypeVar
 
 from pydantic import BaseModel
+from monitoring.prometheus import (
+    REPOSITORY_METHOD_DURATION,
+    REPOSITORY_PARSE_DURATION,
+    trace_exemplar,
+)
+from monitoring.slow_queries import profile_query
+from monitoring.tracing import get_tracer
+from query_cache import copy_result, get_query_cache, make_cache_key
+from query_templates import BoundStatement, compile_template
+from single_flight import get_single_flight
+
+_EPOCH = datetime(1970, 1, 1)
+TRACER = get_tracer(__name__)
+
+# value kind -> getter; timestamps are returned raw and converted in batches
+_VALUE_GETTERS: dict[str | None, Callable[[Any], Any]] = {
+    "nullValue": lambda value: None,
+    "intValue": attrgetter("intValue"),
+    "longValue": attrgetter("longValue"),
+    "stringValue": attrgetter("stringValue"),
+    "timestampValue": attrgetter("timestampValue"),
+    "doubleValue": attrgetter("doubleValue"),
+    "boolValue": attrgetter("boolValue"),
+    "oidValue": attrgetter("oidValue"),
+}
+
+
+def _null(value) -> None:
+    return None
+
+
+@lru_cache(maxsize=None)
+def _value_oneof(descriptor) -> str:
+    return descriptor.fields_by_name["nullValue"].containing_oneof.name
+
+
+def _timestamps_to_datetimes(timestamps: list) -> list[datetime]:
+    # same result as Timestamp.ToDatetime(), without a method call per cell
+    epoch, delta = _EPOCH, timedelta
+    return [
+        epoch + delta(seconds=timestamp.seconds, microseconds=timestamp.nanos // 1000)
+        for timestamp in timestamps
+    ]
 
 
 def parse_sparksee_value(value):
-    if value.HasField("nullValue"):
-        return None
-    elif value.HasField("intValue"):
-        return value.intValue
-    elif value.HasField("longValue"):
-        return value.longValue
-    elif value.HasField("stringValue"):
-        return value.stringValue
-    elif value.HasField("timestampValue"):
-        return (
-            value.timestampValue.ToDatetime()
-        )  # assuming you want to convert to datetime
-    elif value.HasField("doubleValue"):
-        return value.doubleValue
-    elif value.HasField("boolValue"):
-        return value.boolValue
-    elif value.HasField("oidValue"):
-        return value.oidValue
-    else:
-        return None
+    kind = value.WhichOneof(_value_oneof(value.DESCRIPTOR))
+    if kind == "timestampValue":
+        return _timestamps_to_datetimes([value.timestampValue])[0]
+    return _VALUE_GETTERS.get(kind, _null)(value)
+
+
+def decode_rows(rows) -> list[list[Any]]:
+    """Decode result rows into lists of python values.
+
+    Each cell is dispatched once with ``WhichOneof``. The getters for the
+    value kinds seen in the first row are cached per column, so only cells
+    whose kind differs (typically nulls) go back to the handler table, and
+    timestamp cells are converted in a single batch at the end.
+    """
+    if not rows or not rows[0].columnValues:
+        return [[] for _ in rows]
+
+    oneof = _value_oneof(rows[0].columnValues[0].DESCRIPTOR)
+    column_kinds = [value.WhichOneof(oneof) for value in rows[0].columnValues]
+    columns = [(kind, _VALUE_GETTERS.get(kind, _null)) for kind in column_kinds]
+    pending_timestamps = []
+
+    decoded_rows = []
+    for row in rows:
+        decoded = []
+        for value, (column_kind, getter) in zip(row.columnValues, columns):
+            kind = value.WhichOneof(oneof)
+            if kind != column_kind:
+                getter = _VALUE_GETTERS.get(kind, _null)
+            if kind == "timestampValue":
+                pending_timestamps.append((decoded, len(decoded)))
+            decoded.append(getter(value))
+        decoded_rows.append(decoded)
+
+    if pending_timestamps:
+        converted = _timestamps_to_datetimes(
+            [decoded[index] for decoded, index in pending_timestamps]
+        )
+        for (decoded, index), timestamp in zip(pending_timestamps, converted):
+            decoded[index] = timestamp
+    return decoded_rows
 
 
 ModelType = TypeVar("ModelType", bound=BaseModel)
 
+ROW_FORMATS = ("model", "tuple", "columns")
+SESSION_MODES = ("read", "write")
+
+
+class RowMapper(Generic[ModelType]):
+    """Maps decoded rows onto ``model`` with the field order computed once.
+
+    Rows coming from the graph are trusted, so models are built with
+    ``model_construct`` unless ``validate`` is set. Extra trailing columns
+    are dropped, as with the previous ``zip`` over ``model_fields``.
+    """
+
+    def __init__(self, model: Type[ModelType], validate: bool = False):
+        self.model = model
+        self.validate = validate
+        self.field_names = tuple(model.model_fields)
+
+    def to_models(self, rows: list[list[Any]]) -> list[ModelType]:
+        names = self.field_names
+        if self.validate:
+            validate = self.model.model_validate
+            return [validate(dict(zip(names, row))) for row in rows]
+        construct = self.model.model_construct
+        return [construct(**dict(zip(names, row))) for row in rows]
+
+    def to_tuples(self, rows: list[list[Any]]) -> list[tuple]:
+        width = len(self.field_names)
+        return [tuple(row[:width]) for row in rows]
+
+    def to_columns(self, rows: list[list[Any]]) -> dict[str, list[Any]]:
+        columns = {name: [] for name in self.field_names}
+        for row in rows:
+            for values, value in zip(columns.values(), row):
+                values.append(value)
+        return columns
+
+    def node_ids(self, parsed: Any, row_format: str) -> list[int]:
+        if not parsed or "node_id" not in self.field_names:
+            return []
+        if row_format == "columns":
+            return parsed["node_id"]
+        if row_format == "tuple":
+            index = self.field_names.index("node_id")
+            return [row[index] for row in parsed]
+        return [model.node_id for model in parsed]
+
 
 class BaseRepository(Generic[ModelType]):
     model: Type[ModelType] | None
     entity: str
+    validate_rows: bool = False
+
+    @cached_property
+    def row_mapper(self) -> RowMapper[ModelType]:
+        return RowMapper(self.model, validate=self.validate_rows)
 
     def process_query_response(
         self,
         *,
         response,
-    ) -> list[ModelType]:
-        list_of_models = []
-        for row in response.rows:
-            column_values = [parse_sparksee_value(cv) for cv in row.columnValues]
-            new_model = self.model(
-                **dict(zip(self.model.model_fields.keys(), column_values, strict=False))
-            )
-            list_of_models.append(new_model)
-        return list_of_models
+        row_format: str = "model",
+    ) -> list[ModelType] | list[tuple] | dict[str, list[Any]]:
+        """Materialize result rows as models, plain tuples or columns.
+
+        ``tuple`` and ``columns`` skip model construction entirely and are meant
+        for endpoints that only serialize the data back out.
+        """
+        return self.materialize(decode_rows(response.rows), row_format=row_format)
+
+    def materialize(
+        self, rows: list[list[Any]], row_format: str = "model"
+    ) -> list[ModelType] | list[tuple] | dict[str, list[Any]]:
+        if row_format == "tuple":
+            return self.row_mapper.to_tuples(rows)
+        if row_format == "columns":
+            return self.row_mapper.to_columns(rows)
+        return self.row_mapper.to_models(rows)
+
+    def cache_tags(self, templates: tuple[str, ...], arguments: dict[str, Any]) -> list[str]:
+        return [template.format(entity=self.entity, **arguments) for template in templates]
 
     @staticmethod
-    def _change_query_string(str_object: str) -> str:
-        return f"'{str_object}'"
+    def invalidate_cache(session_manager, tags: list[str]):
+        """Drop cached reads tagged with ``tags`` now and again once the write commits."""
+        cache = get_query_cache()
+        if cache is None or not tags:
+            return
+        cache.invalidate(tags)
+        session_manager.after_commit(lambda: cache.invalidate(tags))
+
+    async def stream(
+        self,
+        query_method: Callable,
+        *,
+        page_size: int = 100,
+        **kwargs,
+    ) -> AsyncIterator[ModelType]:
+        """Run a ``query_executor`` method lazily and yield models as pages arrive.
+
+        Accepts the same keyword arguments as ``query_method`` apart from
+        ``size``; memory stays bounded by ``page_size`` rows.
+        """
+        session_manager, stmt = await query_method.__wrapped__(self, **kwargs)
+        pages = session_manager.iter_result_pages(
+            stmt=stmt, query_type=query_method.query_type, page_size=page_size
+        )
+        async with aclosing(pages):
+            async for page in pages:
+                for model in self.process_query_response(response=page):
+                    yield model
 
     @staticmethod
     def create_conditions_from_list(
         condition: str, provided_condition: list[str] | None
-    ):
+    ) -> BoundStatement | None:
         if not provided_condition:
             return None
 
-        conditions = [f"{condition}='{element}'" for element in provided_condition]
-        return f"({' OR '.join(conditions)})"
-
-    def algebra_match_conditions(self, **kwargs) -> str:
-        list_of_filters = []
-        for key, value in kwargs.items():
-            updated_string = ""
-            if value is None:
-                continue
-            elif isinstance(value, str):
-                updated_string = (
-                    f"'{self.entity}'.'{key}' = {self._change_query_string(value)}"
-                )
-            elif isinstance(value, int):
-                updated_string = f"'{self.entity}'.'{key}' = {value}"
-            list_of_filters.append(updated_string)
-
-        match_conditions = " AND ".join(list_of_filters)
-        if not match_conditions:
-            return f"GRAPH::SCAN('{self.entity}')"
-        return f"GRAPH::SELECT({match_conditions})"
-
-    def cypher_match_conditions(self, **kwargs) -> str:
-        list_of_filters = []
-        for key, value in kwargs.items():
-            updated_string = ""
-            if value is None:
-                continue
-            elif isinstance(value, str):
-                updated_string = f"{key}: {f'{self._change_query_string(value)}'}"  # noqa
-            elif isinstance(value, int):
-                updated_string = f"{key}: {value}"
-            list_of_filters.append(updated_string)
-
-        return ", ".join(list_of_filters)
-
-
-def query_executor(query_type: str) -> Callable:
+        template = compile_template(
+            "("
+            + " OR ".join(
+                f"{condition}=${{value_{index}:str}}"
+                for index in range(len(provided_condition))
+            )
+            + ")"
+        )
+        return template.bind(
+            **{f"value_{index}": value for index, value in enumerate(provided_condition)}
+        )
+
+    @staticmethod
+    def _filter_placeholder(key: str, value: Any, prefix: str = "") -> str:
+        if not key.isidentifier():
+            raise ValueError(f"Invalid attribute name: {key!r}")
+        kind = "str" if isinstance(value, str) else "int"
+        return f"${{{prefix}{key}:{kind}}}"
+
+    def algebra_match_conditions(self, **kwargs) -> BoundStatement:
+        filters = {
+            key: value
+            for key, value in kwargs.items()
+            if isinstance(value, (str, int))
+        }
+        if not filters:
+            return compile_template("GRAPH::SCAN(${entity:name})").bind(
+                entity=self.entity
+            )
+
+        # filter values are bound under a prefix, so an attribute named "entity" stays a filter
+        match_conditions = " AND ".join(
+            f"${{entity:name}}.'{key}' = {self._filter_placeholder(key, value, 'filter_')}"
+            for key, value in filters.items()
+        )
+        return compile_template(f"GRAPH::SELECT({match_conditions})").bind(
+            entity=self.entity, **{f"filter_{key}": value for key, value in filters.items()}
+        )
+
+    def cypher_match_conditions(self, **kwargs) -> BoundStatement:
+        filters = {
+            key: value
+            for key, value in kwargs.items()
+            if isinstance(value, (str, int))
+        }
+        return compile_template(
+            ", ".join(
+                f"{key}: {self._filter_placeholder(key, value)}"
+                for key, value in filters.items()
+            )
+        ).bind(**filters)
+
+
+def query_executor(
+    query_type: str,
+    fetch_rows: bool = True,
+    cache_tags: tuple[str, ...] = (),
+    invalidates: tuple[str, ...] = (),
+    on_success: Callable[..., None] | None = None,
+    coalesce: bool = False,
+    mode: str | None = None,
+) -> Callable:
+    """Run the statement built by the decorated method and parse its rows.
+
+    Reads declaring ``cache_tags`` go through the query cache when it is
+    enabled; their entries are also tagged with ``{entity}:{node_id}`` for
+    every returned row. Reads on a session with uncommitted writes are not
+    cached. Writes drop all cached reads sharing one of the
+    ``invalidates`` tags. Tags are formatted with ``entity`` and the call's
+    keyword arguments, e.g. ``"{entity}:{tsp_node_id}"``. ``on_success`` is
+    called as ``on_success(self, result, **kwargs)`` after the statement ran.
+    Reads with ``coalesce`` share one execution with identical reads already
+    in flight, unless their session has uncommitted writes. ``mode`` declares
+    the method a ``"read"`` or a ``"write"``; by default methods that
+    invalidate cache tags or fetch no rows are writes. Every call runs in a
+    ``repository.<method>`` span and is timed by method, parsing included.
+    """
+    if mode is None:
+        mode = "write" if invalidates or not fetch_rows else "read"
+    if mode not in SESSION_MODES:
+        raise ValueError(f"Unknown session mode: {mode}")
+    if coalesce and mode != "read":
+        raise ValueError("Only reads can be coalesced")
+
     def decorator(func: Callable[..., Awaitable[tuple[Any, str]]]) -> Callable:
-        @wraps(func)
-        async def wrapper(self, size: int = 1, **kwargs) -> list[Any] | Any | None:
+        method_name = func.__qualname__
+
+        async def run(self, size: int, row_format: str, cache, cache_key, kwargs):
             session_manager, stmt = await func(self, **kwargs)
-            response = await session_manager.execute_query(
-                stmt=stmt, query_type=query_type, max_rows=size
-            )
-            parsed_model = self.process_query_response(response=response)
-            if not parsed_model:
-                return None
+            if mode == "write":
+                session_manager.mark_write()
+            with profile_query(stmt, query_type) as query_profile:
+                response = await session_manager.execute_query(
+                    stmt=stmt, query_type=query_type, max_rows=size, fetch_rows=fetch_rows
+                )
+
+                parsed_model, result = None, None
+                if response is not None and response.rows:
+                    with TRACER.start_as_current_span("repository.parse"):
+                        parse_started_at = time.perf_counter()
+                        parsed_model = self.process_query_response(
+                            response=response, row_format=row_format
+                        )
+                        query_profile.parse = time.perf_counter() - parse_started_at
+                        REPOSITORY_PARSE_DURATION.labels(method=method_name).observe(
+                            query_profile.parse
+                        )
+                    result = parsed_model
+                    if size == 1 and row_format != "columns":
+                        result = parsed_model[0]
 
-            if size == 1:
-                return parsed_model[0]
-            return parsed_model
+            # rows read after a write of the same transaction may still be rolled back
+            if cache is not None and not session_manager.dirty:
+                row_tags = [
+                    f"{self.entity}:{node_id}"
+                    for node_id in self.row_mapper.node_ids(parsed_model, row_format)
+                ]
+                cache.set(cache_key, result, [*self.cache_tags(cache_tags, kwargs), *row_tags])
+            return session_manager, result
 
+        async def call(self, size: int, row_format: str, kwargs) -> list[Any] | Any | None:
+            cache = get_query_cache() if cache_tags else None
+            flight = get_single_flight() if coalesce else None
+            if flight is not None and kwargs["session_manager"].dirty:
+                flight = None
+
+            cache_key = None
+            if cache is not None or flight is not None:
+                cache_key = make_cache_key(
+                    method_name,
+                    size=size,
+                    row_format=row_format,
+                    **{key: value for key, value in kwargs.items() if key != "session_manager"},
+                )
+            if cache is not None:
+                hit, cached = cache.get(cache_key, method_name)
+                if hit:
+                    return cached
+
+            if flight is None:
+                session_manager, result = await run(
+                    self, size, row_format, cache, cache_key, kwargs
+                )
+            else:
+                shared, (session_manager, result) = await flight.do(
+                    cache_key,
+                    method_name,
+                    lambda: run(self, size, row_format, cache, cache_key, kwargs),
+                )
+                if shared:
+                    session_manager, result = kwargs["session_manager"], copy_result(result)
+
+            if invalidates:
+                self.invalidate_cache(session_manager, self.cache_tags(invalidates, kwargs))
+            if on_success is not None:
+                on_success(self, result, **kwargs)
+            return result
+
+        @wraps(func)
+        async def wrapper(
+            self, size: int = 1, row_format: str = "model", **kwargs
+        ) -> list[Any] | Any | None:
+            if row_format not in ROW_FORMATS:
+                raise ValueError(f"Unknown row format: {row_format}")
+
+            with TRACER.start_as_current_span(
+                f"repository.{method_name}",
+                attributes={"repository.method": method_name, "repository.mode": mode},
+            ):
+                started_at = time.perf_counter()
+                try:
+                    return await call(self, size, row_format, kwargs)
+                finally:
+                    REPOSITORY_METHOD_DURATION.labels(method=method_name).observe(
+                        time.perf_counter() - started_at, exemplar=trace_exemplar()
+                    )
+
+        wrapper.query_type = query_type
+        wrapper.mode = mode
         return wrapper
 
     return decorator
+
+
+def session_mode(mode: str) -> Callable:
+    """Declare the session mode of a repository method that runs its own queries."""
+    if mode not in SESSION_MODES:
+        raise ValueError(f"Unknown session mode: {mode}")
+
+    def decorator(func: Callable) -> Callable:
+        func.mode = mode
+        return func
+
+    return decorator
+
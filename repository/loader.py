@@ -0,0 +1,173 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any
+
+import grpc
+from grpc import aio
+from loguru import logger
+from session_manager import SparkseeSessionManager
+
+from base import decode_rows
+from config import CONFIG
+from exceptions import GraphDBException
+from monitoring.prometheus import NODE_LOADER_BATCH_SIZE
+from query_templates import QueryTemplate, compile_template
+
+# RPC failures that say nothing about the statement, so splitting the batch cannot help
+UNAVAILABLE_CODES = (
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.CANCELLED,
+)
+
+
+def is_statement_error(error: BaseException) -> bool:
+    """Whether Sparksee rejected the statement itself, rather than the call failing."""
+    if not isinstance(error, GraphDBException) or getattr(error, "code", None) != "Query":
+        return False
+    cause = error.__cause__
+    return not (isinstance(cause, aio.AioRpcError) and cause.code() in UNAVAILABLE_CODES)
+
+
+@dataclass
+class NodeBatch:
+    futures: dict[int, list[asyncio.Future]] = field(default_factory=dict)
+    full: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+@dataclass
+class NodeLoader:
+    """Batch node id lookups of one entity made by concurrent requests.
+
+    Ids requested within ``window`` seconds of the first one are fetched by a
+    single ``GRAPH::GET`` over a multi-row ``VALUES`` list, and every caller
+    gets the row of its id: ``[node_id, *attributes]``, or ``None`` for ids
+    without a row. The batch runs on the session of the caller that opened
+    it, so it never takes a session of its own from the pool; if that caller
+    is cancelled, the others run their lookups again. Callers whose session
+    has uncommitted writes are not batched. A batch that Sparksee rejects is
+    split in halves and retried, so one bad id only fails its own callers;
+    connection errors and timeouts fail the whole batch at once.
+    """
+
+    entity: str
+    attributes: tuple[str, ...]
+    window: float
+    max_batch_size: int
+    _batch: NodeBatch | None = field(init=False, default=None)
+    _template: QueryTemplate = field(init=False)
+
+    def __post_init__(self):
+        attributes = ", ".join(
+            f"${{entity:name}}.${{attribute_{index}:name}}" for index in range(len(self.attributes))
+        )
+        self._template = compile_template(
+            f"GRAPH::GET(VALUES([LONG], ${{node_ids:rows}}), 0, [{attributes}])"
+        )
+
+    async def load(self, session_manager: SparkseeSessionManager, node_id: int) -> list[Any] | None:
+        if session_manager.dirty:
+            rows = await self._fetch(session_manager, [node_id])
+            return rows[0] if rows else None
+
+        while True:
+            future = asyncio.get_running_loop().create_future()
+            batch = self._batch
+            leading = batch is None
+            if leading:
+                batch = self._batch = NodeBatch()
+            batch.futures.setdefault(node_id, []).append(future)
+            if len(batch.futures) >= self.max_batch_size:
+                self._close(batch)
+
+            if leading:
+                await self._run(session_manager, batch)
+                return future.result()
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # only a cancelled leader cancels the futures of its batch
+                if not future.cancelled():
+                    raise
+
+    def _close(self, batch: NodeBatch):
+        if self._batch is batch:
+            self._batch = None
+        batch.full.set()
+
+    async def _run(self, session_manager: SparkseeSessionManager, batch: NodeBatch):
+        try:
+            try:
+                await asyncio.wait_for(batch.full.wait(), timeout=self.window)
+            except TimeoutError:
+                pass
+            finally:
+                self._close(batch)
+            await self._load_batch(session_manager, batch.futures)
+        finally:
+            for futures in batch.futures.values():
+                for future in futures:
+                    if not future.done():
+                        future.cancel()
+
+    async def _load_batch(
+        self, session_manager: SparkseeSessionManager, batch: dict[int, list[asyncio.Future]]
+    ):
+        try:
+            rows = await self._fetch(session_manager, list(batch))
+        except Exception as exc:
+            if len(batch) == 1 or not is_statement_error(exc):
+                for futures in batch.values():
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(exc)
+                return
+            logger.warning(
+                "Batched {} lookup of {} ids failed, retrying in halves", self.entity, len(batch)
+            )
+            items = list(batch.items())
+            middle = len(items) // 2
+            # one session runs one statement at a time
+            await self._load_batch(session_manager, dict(items[:middle]))
+            await self._load_batch(session_manager, dict(items[middle:]))
+            return
+
+        rows_by_id = {row[0]: row for row in rows}
+        for node_id, futures in batch.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(rows_by_id.get(node_id))
+
+    async def _fetch(
+        self, session_manager: SparkseeSessionManager, node_ids: list[int]
+    ) -> list[list[Any]]:
+        NODE_LOADER_BATCH_SIZE.labels(entity=self.entity).observe(len(node_ids))
+        stmt = self._template.bind(
+            entity=self.entity,
+            node_ids=node_ids,
+            **{f"attribute_{index}": attribute for index, attribute in enumerate(self.attributes)},
+        )
+        rows = []
+        async for page in session_manager.iter_result_pages(
+            stmt=stmt, query_type="algebra", page_size=len(node_ids)
+        ):
+            rows.extend(decode_rows(page.rows))
+        return rows
+
+
+_NODE_LOADERS: dict[tuple[str, tuple[str, ...]], NodeLoader] = {}
+
+
+def get_node_loader(entity: str, attributes: tuple[str, ...]) -> NodeLoader:
+    loader = _NODE_LOADERS.get((entity, attributes))
+    if loader is not None:
+        return loader
+
+    loader = NodeLoader(
+        entity=entity,
+        attributes=attributes,
+        window=CONFIG.db.node_loader_window,
+        max_batch_size=CONFIG.db.node_loader_max_batch_size,
+    )
+    _NODE_LOADERS[(entity, attributes)] = loader
+    return loader
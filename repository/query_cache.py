@@ -0,0 +1,127 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Hashable, Iterable
+
+from config import CONFIG
+from monitoring.prometheus import (
+    QUERY_CACHE_EVICTIONS,
+    QUERY_CACHE_HITS,
+    QUERY_CACHE_MISSES,
+)
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    tags: tuple[str, ...]
+
+
+@dataclass
+class QueryCache:
+    """Size-bounded LRU cache of repository reads with a TTL and tag invalidation.
+
+    Every entry carries tags such as ``TSP:lists`` or ``TSP:1099511627777``;
+    write methods drop all entries sharing one of the tags they touch. The
+    cache is per worker, so writes served by other workers are only picked up
+    once entries expire.
+    """
+
+    max_entries: int
+    ttl: float
+    _entries: OrderedDict[Hashable, CacheEntry] = field(init=False, default_factory=OrderedDict)
+    _keys_by_tag: dict[str, set[Hashable]] = field(init=False, default_factory=dict)
+
+    def get(self, key: Hashable, method: str) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at < time.monotonic():
+            self._remove(key, reason="expired")
+            entry = None
+        if entry is None:
+            QUERY_CACHE_MISSES.labels(method=method).inc()
+            return False, None
+
+        self._entries.move_to_end(key)
+        QUERY_CACHE_HITS.labels(method=method).inc()
+        return True, copy_result(entry.value)
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str]):
+        if key in self._entries:
+            self._remove(key)
+        entry = CacheEntry(
+            value=copy_result(value), expires_at=time.monotonic() + self.ttl, tags=tuple(tags)
+        )
+        self._entries[key] = entry
+        for tag in entry.tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)), reason="capacity")
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        keys = set()
+        for tag in tags:
+            keys.update(self._keys_by_tag.get(tag, ()))
+        for key in keys:
+            self._remove(key, reason="invalidated")
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+        self._keys_by_tag.clear()
+
+    def _remove(self, key: Hashable, reason: str | None = None):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_tag[tag]
+        if reason is not None:
+            QUERY_CACHE_EVICTIONS.labels(reason=reason).inc()
+
+
+def copy_result(value: Any) -> Any:
+    # callers get their own containers; cached models themselves are shared
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, dict):
+        return {key: list(column) for key, column in value.items()}
+    return value
+
+
+def _normalize(value: Any) -> Hashable:
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted((_normalize(item) for item in value), key=repr))
+    if isinstance(value, dict):
+        return tuple(sorted((key, _normalize(item)) for key, item in value.items()))
+    if hasattr(value, "model_dump"):
+        return _normalize(value.model_dump())
+    return value
+
+
+def make_cache_key(method: str, **arguments: Any) -> Hashable:
+    """Key of a read: the method plus its arguments with filter lists order-normalized."""
+    return method, _normalize(arguments)
+
+
+_QUERY_CACHE: QueryCache | None = None
+
+
+def get_query_cache() -> QueryCache | None:
+    global _QUERY_CACHE
+    if not CONFIG.db.query_cache_enabled:
+        return None
+    if _QUERY_CACHE is not None:
+        return _QUERY_CACHE
+
+    _QUERY_CACHE = QueryCache(
+        max_entries=CONFIG.db.query_cache_max_entries,
+        ttl=CONFIG.db.query_cache_ttl,
+    )
+    return _QUERY_CACHE
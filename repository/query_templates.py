@@ -0,0 +1,159 @@
+import hashlib
+import re
+import textwrap
+from functools import lru_cache
+from typing import Any, Callable, Iterable
+
+PLACEHOLDER = re.compile(r"\$\{(\w+):(\w+)\}")
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+WHITESPACE = re.compile(r"\s+")
+
+
+class BoundStatement(str):
+    """Statement text rendered from a ``QueryTemplate``.
+
+    Behaves like the plain string the session manager expects, but remembers
+    the fingerprint of the template it came from and the bound parameters, so
+    metrics and caches can group calls by statement shape. ``fingerprint``
+    also covers the raw fragments spliced in, whose text can vary with the
+    input (one placeholder per list item, say); ``template_fingerprint`` is
+    the outer template's alone and is what metric labels use. ``kinds`` maps
+    every parameter to its placeholder type, so logs can tell identifiers
+    from user data.
+    """
+
+    fingerprint: str
+    template_fingerprint: str
+    params: dict[str, Any]
+    kinds: dict[str, str]
+
+    def __new__(
+        cls,
+        text: str,
+        fingerprint: str,
+        params: dict[str, Any],
+        template_fingerprint: str | None = None,
+        kinds: dict[str, str] | None = None,
+    ):
+        statement = super().__new__(cls, text)
+        statement.fingerprint = fingerprint
+        statement.template_fingerprint = template_fingerprint or fingerprint
+        statement.params = params
+        statement.kinds = kinds or {}
+        return statement
+
+
+def escape_string(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def _render_str(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    return escape_string(str(value))
+
+
+def _render_long(value: Any) -> str:
+    return f"{int(value)}L"
+
+
+def _render_int(value: Any) -> str:
+    return str(int(value))
+
+
+def _render_name(value: Any) -> str:
+    if not IDENTIFIER.match(value):
+        raise ValueError(f"Invalid type or attribute name: {value!r}")
+    return f"'{value}'"
+
+
+def _render_label(value: Any) -> str:
+    if not IDENTIFIER.match(value):
+        raise ValueError(f"Invalid label: {value!r}")
+    return value
+
+
+def _render_raw(value: Any) -> str:
+    if not isinstance(value, BoundStatement):
+        raise TypeError("Only statements rendered from a QueryTemplate can be spliced raw")
+    return value
+
+
+def _render_cell(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, int):
+        return _render_long(value)
+    if isinstance(value, float):
+        return repr(value)
+    return escape_string(str(value))
+
+
+def _render_rows(value: Iterable) -> str:
+    """Body of a ``VALUES`` clause; ``int`` cells are rendered as LONG literals."""
+    rows = (row if isinstance(row, (list, tuple)) else (row,) for row in value)
+    return "[" + ", ".join(
+        "[" + ", ".join(_render_cell(cell) for cell in row) + "]" for row in rows
+    ) + "]"
+
+
+RENDERERS: dict[str, Callable[[Any], str]] = {
+    "str": _render_str,
+    "long": _render_long,
+    "int": _render_int,
+    "name": _render_name,
+    "label": _render_label,
+    "raw": _render_raw,
+    "rows": _render_rows,
+}
+
+
+class QueryTemplate:
+    """Algebra or Cypher statement parsed once into literal and typed placeholder parts.
+
+    Placeholders look like ``${name:type}`` where ``type`` is one of
+    ``RENDERERS``. Runs of whitespace in the literal parts are collapsed, and
+    values are escaped when the template is bound.
+    """
+
+    def __init__(self, text: str):
+        self.text = WHITESPACE.sub(" ", textwrap.dedent(text)).strip()
+        self.fingerprint = hashlib.sha1(self.text.encode()).hexdigest()[:12]
+
+        self._literals: list[str] = []
+        self._placeholders: list[tuple[str, Callable[[Any], str]]] = []
+        self.kinds: dict[str, str] = {}
+        position = 0
+        for match in PLACEHOLDER.finditer(self.text):
+            name, kind = match.groups()
+            if kind not in RENDERERS:
+                raise ValueError(f"Unknown placeholder type {kind!r} in {match.group()}")
+            self.kinds[name] = kind
+            self._literals.append(self.text[position:match.start()])
+            self._placeholders.append((name, RENDERERS[kind]))
+            position = match.end()
+        self._literals.append(self.text[position:])
+
+    def bind(self, **params: Any) -> BoundStatement:
+        parts = [self._literals[0]]
+        fragments = []
+        for (name, render), literal in zip(self._placeholders, self._literals[1:]):
+            value = params[name]
+            parts.append(render(value))
+            parts.append(literal)
+            if render is _render_raw:
+                fragments.append(value.fingerprint)
+
+        fingerprint = self.fingerprint
+        if fragments:
+            fingerprint = hashlib.sha1(
+                ":".join([fingerprint, *fragments]).encode()
+            ).hexdigest()[:12]
+        return BoundStatement("".join(parts), fingerprint, params, self.fingerprint, self.kinds)
+
+
+@lru_cache(maxsize=512)
+def compile_template(text: str) -> QueryTemplate:
+    return QueryTemplate(text)
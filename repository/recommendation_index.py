@@ -0,0 +1,198 @@
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+from config import CONFIG
+
+# edge type -> attribute holding the bitmaps of the nodes it points to
+EDGE_BITMAPS = {
+    "BELONGS_TO": "_by_type",
+    "OPERATES_IN": "_by_country",
+    "HAS_AVAILABILITY": "_by_time_slot",
+}
+
+
+@dataclass
+class RecommendationIndex:
+    """Per-worker bitmaps of TSPs by tsp type, country and time slot.
+
+    Every TSP gets a dense bit position and each bitmap is a python ``int``
+    used as a bitset, so the recommendation filters become a handful of
+    ``&``/``|`` operations over machine words. Positions of removed TSPs are
+    reused. Target nodes are stored by name, which is what the filters use;
+    a link to a node id whose name is unknown marks the index stale until
+    the next rebuild, as does exceeding ``max_age``.
+    """
+
+    max_age: float
+    built_at: float | None = field(init=False, default=None)
+    stale: bool = field(init=False, default=False)
+    _positions: dict[int, int] = field(init=False, default_factory=dict)
+    _tsps: list[tuple[int, str, str, str] | None] = field(init=False, default_factory=list)
+    _free: list[int] = field(init=False, default_factory=list)
+    _by_type: dict[str, int] = field(init=False, default_factory=dict)
+    _by_country: dict[str, int] = field(init=False, default_factory=dict)
+    _by_time_slot: dict[str, int] = field(init=False, default_factory=dict)
+    _node_names: dict[int, str] = field(init=False, default_factory=dict)
+    _replay: list[Callable[[], None]] | None = field(init=False, default=None)
+
+    def is_warm(self) -> bool:
+        return (
+            self.built_at is not None
+            and not self.stale
+            and time.monotonic() - self.built_at < self.max_age
+        )
+
+    def begin_rebuild(self):
+        """Record changes made while a rebuild reads the graph, to replay them after ``load``."""
+        self._replay = []
+
+    def cancel_rebuild(self):
+        self._replay = None
+
+    def load(
+        self,
+        *,
+        tsps: Iterable[tuple[int, str, str, int, str]],
+        links: Iterable[tuple[int, str, int]],
+        node_names: dict[int, str],
+    ):
+        """Replace the whole index.
+
+        ``tsps`` are ``(node_id, id, name, tsp_type_node_id, tsp_type_name)``
+        rows and ``links`` are ``(tsp_node_id, edge_type, target_node_id)``.
+        """
+        replay, self._replay = self._replay or [], None
+        self._positions, self._tsps, self._free = {}, [], []
+        self._by_type, self._by_country, self._by_time_slot = {}, {}, {}
+        self._node_names = dict(node_names)
+
+        for node_id, tsp_id, name, tsp_type_node_id, tsp_type_name in tsps:
+            self._node_names[tsp_type_node_id] = tsp_type_name
+            self.add_tsp(node_id, tsp_id, name, tsp_type_name)
+        for tsp_node_id, edge_type, target_node_id in links:
+            self.link(tsp_node_id, edge_type, target_node_id)
+        for change in replay:
+            change()
+
+        self.built_at = time.monotonic()
+        self.stale = False
+
+    def mark_stale(self):
+        self.stale = True
+
+    def add_tsp(self, node_id: int, tsp_id: str, name: str, tsp_type_name: str):
+        self._record(lambda: self.add_tsp(node_id, tsp_id, name, tsp_type_name))
+        position = self._positions.get(node_id)
+        if position is None:
+            position = self._free.pop() if self._free else len(self._tsps)
+            if position == len(self._tsps):
+                self._tsps.append(None)
+            self._positions[node_id] = position
+        elif self._tsps[position][3] in self._by_type:
+            self._by_type[self._tsps[position][3]] &= ~(1 << position)
+        self._tsps[position] = (node_id, tsp_id, name, tsp_type_name)
+        self._set_bit(self._by_type, tsp_type_name, position)
+
+    def rename_tsp(self, node_id: int, name: str):
+        self._record(lambda: self.rename_tsp(node_id, name))
+        position = self._positions.get(node_id)
+        if position is None:
+            return
+        tsp_node_id, tsp_id, _, tsp_type_name = self._tsps[position]
+        self._tsps[position] = (tsp_node_id, tsp_id, name, tsp_type_name)
+
+    def remove_tsp(self, node_id: int):
+        self._record(lambda: self.remove_tsp(node_id))
+        position = self._positions.pop(node_id, None)
+        if position is None:
+            return
+        mask = ~(1 << position)
+        for bitmaps in (self._by_type, self._by_country, self._by_time_slot):
+            for key in bitmaps:
+                bitmaps[key] &= mask
+        self._tsps[position] = None
+        self._free.append(position)
+
+    def link(self, tsp_node_id: int, edge_type: str, target_node_id: int):
+        self._record(lambda: self.link(tsp_node_id, edge_type, target_node_id))
+        bitmaps = self._bitmaps(edge_type)
+        position = self._positions.get(tsp_node_id)
+        target_name = self._node_names.get(target_node_id)
+        if bitmaps is None:
+            return
+        if position is None or target_name is None:
+            self.mark_stale()
+            return
+        self._set_bit(bitmaps, target_name, position)
+
+    def unlink(self, tsp_node_id: int, edge_type: str, target_node_id: int):
+        self._record(lambda: self.unlink(tsp_node_id, edge_type, target_node_id))
+        bitmaps = self._bitmaps(edge_type)
+        position = self._positions.get(tsp_node_id)
+        target_name = self._node_names.get(target_node_id)
+        if bitmaps is None or position is None:
+            return
+        if target_name is None:
+            self.mark_stale()
+            return
+        if target_name in bitmaps:
+            bitmaps[target_name] &= ~(1 << position)
+
+    def recommend(
+        self,
+        *,
+        countries: list[str] | None,
+        tsp_types: list[str] | None,
+        time_slots: list[str] | None,
+        size: int,
+    ) -> list[list]:
+        """Rows shaped like the recommendations Cypher query: node_id, id, name, type."""
+        matches = (
+            self._any(self._by_type, tsp_types)
+            & self._any(self._by_country, countries)
+            & self._any(self._by_time_slot, time_slots)
+        )
+        rows = []
+        while matches and len(rows) < size:
+            lowest = matches & -matches
+            rows.append(list(self._tsps[lowest.bit_length() - 1]))
+            matches ^= lowest
+        return rows
+
+    @staticmethod
+    def _any(bitmaps: dict[str, int], names: list[str] | None) -> int:
+        # no filter still requires at least one edge, as the MATCH pattern does
+        selected = bitmaps.values() if not names else (bitmaps.get(name, 0) for name in names)
+        matches = 0
+        for bitmap in selected:
+            matches |= bitmap
+        return matches
+
+    @staticmethod
+    def _set_bit(bitmaps: dict[str, int], key: str, position: int):
+        bitmaps[key] = bitmaps.get(key, 0) | (1 << position)
+
+    def _bitmaps(self, edge_type: str) -> dict[str, int] | None:
+        attribute = EDGE_BITMAPS.get(edge_type)
+        return getattr(self, attribute) if attribute else None
+
+    def _record(self, change: Callable[[], None]):
+        if self._replay is not None:
+            self._replay.append(change)
+
+
+_RECOMMENDATION_INDEX: RecommendationIndex | None = None
+
+
+def get_recommendation_index() -> RecommendationIndex | None:
+    global _RECOMMENDATION_INDEX
+    if not CONFIG.db.recommendation_index_enabled:
+        return None
+    if _RECOMMENDATION_INDEX is not None:
+        return _RECOMMENDATION_INDEX
+
+    _RECOMMENDATION_INDEX = RecommendationIndex(
+        max_age=CONFIG.db.recommendation_index_max_age,
+    )
+    return _RECOMMENDATION_INDEX
@@ -0,0 +1,57 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable
+
+from config import CONFIG
+from monitoring.prometheus import SINGLE_FLIGHT_COALESCED
+
+
+@dataclass
+class SingleFlight:
+    """Share one execution between identical reads that overlap in time.
+
+    The first caller of a key runs the read in a task; callers arriving while
+    it is in flight await the same task instead of querying Sparksee again
+    and get its result or exception. The read runs on the first caller's
+    session, so cancelling that caller cancels the read and the waiting
+    callers run it again themselves. Cancelling a waiting caller does not
+    affect the others.
+    """
+
+    _calls: dict[Hashable, asyncio.Task] = field(init=False, default_factory=dict)
+
+    async def do(self, key: Hashable, method: str, run: Callable[[], Awaitable[Any]]) -> tuple[bool, Any]:
+        """Return ``(shared, result)``; ``shared`` tells the result came from another caller."""
+        while True:
+            call = self._calls.get(key)
+            if call is None:
+                call = asyncio.ensure_future(run())
+                self._calls[key] = call
+                call.add_done_callback(lambda done, key=key: self._forget(key, done))
+                return False, await call
+
+            SINGLE_FLIGHT_COALESCED.labels(method=method).inc()
+            try:
+                return True, await asyncio.shield(call)
+            except asyncio.CancelledError:
+                if not call.cancelled():
+                    raise
+                self._forget(key, call)
+
+    def _forget(self, key: Hashable, call: asyncio.Task):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+_SINGLE_FLIGHT: SingleFlight | None = None
+
+
+def get_single_flight() -> SingleFlight | None:
+    global _SINGLE_FLIGHT
+    if not CONFIG.db.single_flight_enabled:
+        return None
+    if _SINGLE_FLIGHT is not None:
+        return _SINGLE_FLIGHT
+
+    _SINGLE_FLIGHT = SingleFlight()
+    return _SINGLE_FLIGHT
@@ -1,7 +1,13 @@
 from loguru import logger
+from config import CONFIG
+from exceptions import GraphDBException
 from pydantic import BaseModel, Field
 from session_manager import SparkseeSessionManager
-from base import BaseRepository, query_executor, parse_sparksee_value
+from base import BaseRepository, decode_rows, query_executor, session_mode
+from monitoring.prometheus import RECOMMENDATION_LOOKUPS
+from query_templates import BoundStatement, QueryTemplate, compile_template
+from loader import get_node_loader
+from recommendation_index import get_recommendation_index
 
 
 class TSPDB(BaseModel):
@@ -14,11 +20,229 @@ class TSPUpdate(BaseModel):
     name: str | None = Field(title="TSP Name", default=None)
 
 
+class TSPBulkCreate(BaseModel):
+    id: str = Field(title="TSP ID")  # noqa
+    name: str = Field(title="TSP Name")
+    tsp_type: str = Field(title="TSP Type")
+    countries: list[str] = Field(title="List of TSP Countries", default_factory=list)
+    time_slots: list[str] = Field(title="List of TSP Time Slots", default_factory=list)
+    data_reqs_node_ids: list[int] = Field(
+        title="List of Data Requirement Node IDs", default_factory=list
+    )
+
+
+class TSPBulkResult(BaseModel):
+    created: list[TSPDB] = Field(title="Created TSPs", default_factory=list)
+    skipped: list[str] = Field(title="IDs of TSPs that were not created", default_factory=list)
+    unknown_data_reqs_node_ids: list[int] = Field(
+        title="Data Requirement Node IDs that were not linked", default_factory=list
+    )
+
+
+class TSPBulkTargets(BaseModel):
+    tsp_type_ids: dict[str, int] = Field(title="TSP Type Node IDs by name")
+    country_ids: dict[str, int] = Field(title="Country Node IDs by name")
+    time_slot_ids: dict[str, int] = Field(title="Time Slot Node IDs by name")
+    data_req_ids: set[int] = Field(title="Data Requirement Node IDs")
+
+
+class TSPRelationshipSync(BaseModel):
+    added: list[int] = Field(title="Linked Node IDs", default_factory=list)
+    removed: list[int] = Field(title="Unlinked Node IDs", default_factory=list)
+    unchanged: list[int] = Field(title="Node IDs that stayed linked", default_factory=list)
+
+
 class TSPRepository(BaseRepository[TSPDB]):
     model = TSPDB
     entity = "TSP"
 
-    @query_executor(query_type="algebra")
+    # edge type -> entity of the nodes it points to
+    RELATIONSHIP_TARGETS = {
+        "BELONGS_TO": "TSP_TYPE",
+        "OPERATES_IN": "COUNTRY",
+        "HAS_AVAILABILITY": "TIME_SLOT",
+        "CAN_PROVIDE": "DATA_REQUIREMENT",
+    }
+
+    _CREATE_TSP = QueryTemplate(
+        """
+        LET
+            @new_tsp = GRAPH::INSERT_NODES(${entity:name},VALUES([STRING,STRING], [[${_id:str},${name:str}]])),
+            @v = GRAPH::SET(@new_tsp, 2, [${entity:name}.'id', ${entity:name}.'name'], FALSE),
+            @tsp_type = GRAPH::SELECT('TSP_TYPE'.'name' = ${tsp_type_name:str}),
+            @tsp_data = PRODUCT( @new_tsp, @tsp_type),
+            @link_tsp_and_tsp_type = GRAPH::INSERT_EDGES('BELONGS_TO', 2, 3, @tsp_data),
+            @fetched_tsp = ${fetched_tsp:raw},
+            @result = GRAPH::GET(@fetched_tsp, 0, [
+                                ${entity:name}.'id',
+                                ${entity:name}.'name'
+                            ])
+        IN
+            @result
+        """
+    )
+    _LINK_TSP = QueryTemplate(
+        """
+        LET
+           @oids = VALUES([LONG, LONG], [[${tsp_node_id:long}, ${target_node_id:long}]]),
+           @link = GRAPH::INSERT_EDGES(${edge_type:name}, 0, 1, @oids),
+           @result = GRAPH::GET(VALUES([LONG], [[${tsp_node_id:long}]]), 0, [
+                                    ${entity:name}.'id',
+                                    ${entity:name}.'name'
+                                ])
+        IN
+           @result
+        """
+    )
+    _GET_TSP = QueryTemplate(
+        """
+        LET
+            @tsp = ${match_conditions:raw},
+            @result = GRAPH::GET(@tsp, 0, [
+                ${entity:name}.'id',
+                ${entity:name}.'name'
+            ])
+        IN
+            @result
+        """
+    )
+    _GET_LIST_OF_TSP_BY_TYPE = QueryTemplate(
+        """
+        MATCH (tsp_type: TSP_TYPE { name : ${tsp_type_name:str}} )<-[:BELONGS_TO]-(tsp:TSP)
+        RETURN tsp as node_id,
+               tsp.id as id,
+               tsp.name as name
+        """
+    )
+    _DELETE_NODE = QueryTemplate(
+        """
+        GRAPH::REMOVE(VALUES([LONG], [[${node_id:long}]]), NULL)
+        """
+    )
+    _FETCH_EDGE = QueryTemplate(
+        """
+        PROJECT(GRAPH::CONNECT( VALUES([LONG, LONG], [[${tsp_node_id:long}, ${target_node_id:long}]]), [${edge_type:name}]),[2])
+        """
+    )
+    _REMOVE_EDGES = QueryTemplate(
+        """
+        LET
+            @edges = PROJECT(GRAPH::CONNECT(VALUES([LONG, LONG], ${pairs:rows}), [${edge_type:name}]), [2]),
+            @removed = GRAPH::REMOVE(@edges, NULL)
+        IN
+            @edges
+        """
+    )
+    _FETCH_LINKED = QueryTemplate(
+        """
+        LET
+            @pairs = GRAPH::NEIGHBORS(VALUES([LONG], [[${tsp_node_id:long}]]), 0, [${edge_type:name}], OUTGOING),
+            @edges = GRAPH::CONNECT(@pairs, [${edge_type:name}])
+        IN
+            PROJECT(@edges, [1, 2])
+        """
+    )
+    _GET_RECOMMENDATIONS = QueryTemplate(
+        """
+        MATCH (tsp_type:TSP_TYPE)<-[:BELONGS_TO]-(tsp:TSP)-[:OPERATES_IN]->(country: COUNTRY),
+               (tsp:TSP)-[:HAS_AVAILABILITY]->(time_slot: TIME_SLOT)
+        ${where_clause:raw}
+        RETURN DISTINCT tsp as node_id,
+               tsp.id as id,
+               tsp.name as name,
+               tsp_type.name as type;
+        """
+    )
+
+    _CREATE_TSPS_BULK = QueryTemplate(
+        """
+        LET
+            @new_tsps = GRAPH::INSERT_NODES(${entity:name}, VALUES([STRING, STRING, LONG], ${tsps:rows})),
+            @v = GRAPH::SET(@new_tsps, 3, [${entity:name}.'id', ${entity:name}.'name', NULL], FALSE),
+            @link_tsps_and_tsp_types = GRAPH::INSERT_EDGES('BELONGS_TO', 3, 2, @new_tsps),
+            @result = PROJECT(@new_tsps, [3, 0, 1])
+        IN
+            @result
+        """
+    )
+
+    _INDEX_TSPS = QueryTemplate(
+        """
+        MATCH (tsp_type:TSP_TYPE)<-[:BELONGS_TO]-(tsp:TSP)
+        RETURN tsp as node_id,
+               tsp.id as id,
+               tsp.name as name,
+               tsp_type as tsp_type_node_id,
+               tsp_type.name as tsp_type_name
+        """
+    )
+    _INDEX_LINKS = QueryTemplate(
+        """
+        MATCH (tsp:TSP)-[:${edge_type:label}]->(target:${target_entity:label})
+        RETURN tsp as tsp_node_id,
+               target as target_node_id
+        """
+    )
+    _TSP_BY_ID = QueryTemplate(
+        """
+        GRAPH::SELECT(${entity:name}.'id' = ${tsp_id:str})
+        """
+    )
+    _NODE_IDS = QueryTemplate(
+        """
+        GRAPH::SCAN(${target_entity:name})
+        """
+    )
+    _NODE_NAMES = QueryTemplate(
+        """
+        GRAPH::GET(GRAPH::SCAN(${target_entity:name}), 0, [${target_entity:name}.${attribute:name}])
+        """
+    )
+
+    def _index_created_tsp(self, result, *, session_manager, tsp_type_name, **kwargs):
+        index = get_recommendation_index()
+        if index is None or result is None:
+            return
+        if not isinstance(result, TSPDB):
+            session_manager.after_commit(index.mark_stale)
+            return
+        session_manager.after_commit(
+            lambda: index.add_tsp(result.node_id, result.id, result.name, tsp_type_name)
+        )
+
+    def _index_updated_tsp(self, result, *, session_manager, tsp_node_id, tsp_update, **kwargs):
+        index = get_recommendation_index()
+        if index is None or tsp_update.name is None:
+            return
+        session_manager.after_commit(lambda: index.rename_tsp(tsp_node_id, tsp_update.name))
+
+    def _index_deleted_tsp(self, result, *, session_manager, tsp_node_id, **kwargs):
+        index = get_recommendation_index()
+        if index is None:
+            return
+        session_manager.after_commit(lambda: index.remove_tsp(tsp_node_id))
+
+    def _index_linked_country(self, result, *, session_manager, tsp_node_id, country_node_id, **kwargs):
+        index = get_recommendation_index()
+        if index is None:
+            return
+        session_manager.after_commit(
+            lambda: index.link(tsp_node_id, "OPERATES_IN", country_node_id)
+        )
+
+    def _index_linked_time_slot(self, result, *, session_manager, tsp_node_id, time_slot_node_id, **kwargs):
+        index = get_recommendation_index()
+        if index is None:
+            return
+        session_manager.after_commit(
+            lambda: index.link(tsp_node_id, "HAS_AVAILABILITY", time_slot_node_id)
+        )
+
+    @query_executor(
+        query_type="algebra",
+        invalidates=("{entity}:lookups", "{entity}:lists", "{entity}:relations"),
+        on_success=_index_created_tsp,
+    )
     async def create_tsp(
         self,
         *,
@@ -27,84 +251,77 @@ class TSPRepository(BaseRepository[TSPDB]):
         name: str,
         tsp_type_name: str,
     ) -> tuple[SparkseeSessionManager, str]:
-        stmt = f"""
-            LET
-                @new_tsp = GRAPH::INSERT_NODES('{self.entity}',VALUES([STRING,STRING], [['{_id}','{name}']])),
-                @v = GRAPH::SET(@new_tsp, 2, ['{self.entity}'.'id', '{self.entity}'.'name'], FALSE),
-                @tsp_type = GRAPH::SELECT('TSP_TYPE'.'name' = '{tsp_type_name}'),
-                @tsp_data = PRODUCT( @new_tsp, @tsp_type),
-                @link_tsp_and_tsp_type = GRAPH::INSERT_EDGES('BELONGS_TO', 2, 3, @tsp_data),
-                @fetched_tsp = {self.algebra_match_conditions(id=_id)},
-                @result = GRAPH::GET(@fetched_tsp, 0, [
-                                    '{self.entity}'.'id',
-                                    '{self.entity}'.'name'
-                                ])
-            IN
-                @result
-            """
+        stmt = self._CREATE_TSP.bind(
+            entity=self.entity,
+            _id=_id,
+            name=name,
+            tsp_type_name=tsp_type_name,
+            fetched_tsp=self.algebra_match_conditions(id=_id),
+        )
         return session_manager, stmt
 
-    @query_executor(query_type="algebra")
+    @query_executor(
+        query_type="algebra",
+        invalidates=("{entity}:{tsp_node_id}", "{entity}:relations"),
+        on_success=_index_linked_country,
+    )
     async def add_country_to_tsp(
         self,
         session_manager: SparkseeSessionManager,
         tsp_node_id: int,
         country_node_id: int,
     ) -> tuple[SparkseeSessionManager, str]:
-        stmt = f"""
-            LET
-               @oids = VALUES([LONG, LONG], [[{tsp_node_id}L, {country_node_id}L]]),
-               @link_tsp_and_country = GRAPH::INSERT_EDGES('OPERATES_IN', 0, 1, @oids),
-               @result = GRAPH::GET(VALUES([LONG], [[{tsp_node_id}L]]), 0, [
-                                        '{self.entity}'.'id',
-                                        '{self.entity}'.'name'
-                                    ])
-            IN
-               @result
-            """
+        stmt = self._LINK_TSP.bind(
+            entity=self.entity,
+            edge_type="OPERATES_IN",
+            tsp_node_id=tsp_node_id,
+            target_node_id=country_node_id,
+        )
         return session_manager, stmt
 
-    @query_executor(query_type="algebra")
+    @query_executor(
+        query_type="algebra",
+        invalidates=("{entity}:{tsp_node_id}", "{entity}:relations"),
+        on_success=_index_linked_time_slot,
+    )
     async def add_time_slot_to_tsp(
         self,
         session_manager: SparkseeSessionManager,
         tsp_node_id: int,
         time_slot_node_id: int,
     ) -> tuple[SparkseeSessionManager, str]:
-        stmt = f"""
-                LET
-                   @oids = VALUES([LONG, LONG], [[{tsp_node_id}L, {time_slot_node_id}L]]),
-                   @link_tsp_and_country = GRAPH::INSERT_EDGES('HAS_AVAILABILITY', 0, 1, @oids),
-                   @result = GRAPH::GET(VALUES([LONG], [[{tsp_node_id}L]]), 0, [
-                                            '{self.entity}'.'id',
-                                            '{self.entity}'.'name'
-                                        ])
-                IN
-                   @result
-                """
+        stmt = self._LINK_TSP.bind(
+            entity=self.entity,
+            edge_type="HAS_AVAILABILITY",
+            tsp_node_id=tsp_node_id,
+            target_node_id=time_slot_node_id,
+        )
         return session_manager, stmt
 
-    @query_executor(query_type="algebra")
+    @query_executor(query_type="algebra", cache_tags=("{entity}:lookups",), coalesce=True)
     async def get_tsp(
         self,
         session_manager: SparkseeSessionManager,
         size: int = 1,  # noqa
         **kwargs,
     ) -> tuple[SparkseeSessionManager, str]:
-        stmt = f"""
-        LET
-            @tsp = {self.algebra_match_conditions(**kwargs)},
-            @result = GRAPH::GET(@tsp, 0, [
-                '{self.entity}'.'id',
-                '{self.entity}'.'name'
-            ])
-        IN
-            @result
-        """
-
+        stmt = self._GET_TSP.bind(
+            entity=self.entity,
+            match_conditions=self.algebra_match_conditions(**kwargs),
+        )
         return session_manager, stmt
 
-    @query_executor(query_type="cypher")
+    @session_mode("read")
+    async def load_tsp(
+        self, session_manager: SparkseeSessionManager, tsp_node_id: int
+    ) -> TSPDB | None:
+        """Fetch a TSP by node id, batched with concurrent lookups of other callers."""
+        row = await get_node_loader(self.entity, ("id", "name")).load(session_manager, tsp_node_id)
+        if row is None:
+            return None
+        return self.materialize([row], row_format="model")[0]
+
+    @query_executor(query_type="cypher", cache_tags=("{entity}:lists",), coalesce=True)
     async def get_list_of_tsp_by_type(
         self,
         *,
@@ -112,85 +329,439 @@ class TSPRepository(BaseRepository[TSPDB]):
         session_manager: SparkseeSessionManager,
         size: int = 10,
     ) -> tuple[SparkseeSessionManager, str]:
-        stmt = f"""
-                MATCH (tsp_type: TSP_TYPE {{ name : '{tsp_type_name}'}} )<-[:BELONGS_TO]-(tsp:TSP)
-                RETURN tsp as node_id, 
-                       tsp.id as id, 
-                       tsp.name as name
-                """  # noqa
+        stmt = self._GET_LIST_OF_TSP_BY_TYPE.bind(tsp_type_name=tsp_type_name)
         return session_manager, stmt
 
-    @query_executor(query_type="algebra")
+    @query_executor(
+        query_type="algebra",
+        invalidates=("{entity}:{tsp_node_id}", "{entity}:lookups"),
+        on_success=_index_updated_tsp,
+    )
     async def update_tsp_by_id(
         self,
         session_manager: SparkseeSessionManager,
         tsp_node_id: int,
         tsp_update: TSPUpdate,
     ) -> tuple[SparkseeSessionManager, str]:
-        stmt = f"""
-        LET
-            @new_values = VALUES([LONG, STRING], [[{tsp_node_id}L, '{tsp_update.name}']]),
-            @v = GRAPH::SET(@new_values, 0, [NULL, 'TSP'.'name'], TRUE),
-            @result = GRAPH::GET(VALUES([LONG], [[{tsp_node_id}L]]), 0, [
-                                '{self.entity}'.'id',
-                                '{self.entity}'.'name'
-                            ])
-
-        IN
-            @result
-        """
+        stmt = self._update_node(
+            tsp_node_id, tsp_update.model_dump(exclude_unset=True, exclude_none=True)
+        )
         return session_manager, stmt
 
-    @query_executor(query_type="algebra")
+    @query_executor(
+        query_type="algebra",
+        fetch_rows=False,
+        invalidates=("{entity}:{tsp_node_id}",),
+        on_success=_index_deleted_tsp,
+    )
     async def delete_tsp_by_id(
         self, session_manager: SparkseeSessionManager, tsp_node_id: int
     ) -> tuple[SparkseeSessionManager, str]:
-        stmt = f"""
-        GRAPH::REMOVE(VALUES([LONG], [[{tsp_node_id}L]]), NULL)
-        """
+        stmt = self._DELETE_NODE.bind(node_id=tsp_node_id)
         return session_manager, stmt
 
-    @query_executor(query_type="algebra")
+    @query_executor(query_type="algebra", invalidates=("{entity}:{tsp_node_id}",))
     async def add_data_requirement_to_tsp(
         self,
         session_manager: SparkseeSessionManager,
         tsp_node_id: int,
         data_req_node_id: int,
     ) -> tuple[SparkseeSessionManager, str]:
-        stmt = f"""
-        LET
-           @oids = VALUES([LONG, LONG], [[{tsp_node_id}L, {data_req_node_id}L]]),
-           @link_tsp_and_data_req = GRAPH::INSERT_EDGES('CAN_PROVIDE', 0, 1, @oids),
-           @result = GRAPH::GET(VALUES([LONG], [[{tsp_node_id}L]]), 0, [
-                                    '{self.entity}'.'id',
-                                    '{self.entity}'.'name'
-                                ])
-        IN
-           @result
-        """
+        stmt = self._LINK_TSP.bind(
+            entity=self.entity,
+            edge_type="CAN_PROVIDE",
+            tsp_node_id=tsp_node_id,
+            target_node_id=data_req_node_id,
+        )
         return session_manager, stmt
 
+    @session_mode("write")
     async def remove_data_requirement_from_tsp(
         self,
         session_manager: SparkseeSessionManager,
         tsp_node_id: int,
         data_req_node_id: int,
     ) -> None:
-        fetch_stmt = f"""
-            PROJECT(GRAPH::CONNECT( VALUES([LONG, LONG], [[{tsp_node_id}L, {data_req_node_id}L]]), ['CAN_PROVIDE']),[2])
-            """
-        response = await session_manager.execute_query(stmt=fetch_stmt, query_type='algebra', max_rows=1)
-        response = response.rows
-        if not response:
+        removed = await self.remove_edges(
+            session_manager, "CAN_PROVIDE", [(tsp_node_id, data_req_node_id)]
+        )
+        if not removed:
             logger.error(f"Cannot remove data requirement from TSP {tsp_node_id}")
-            return
-        fetched_edge_oid = parse_sparksee_value(response[0].columnValues[0])
 
-        remove_stmt = f"GRAPH::REMOVE(VALUES([LONG], [[{fetched_edge_oid}L]]), NULL)"
-        await session_manager.execute_query(stmt=remove_stmt, query_type='algebra', max_rows=1)
+    @session_mode("write")
+    async def remove_edges(
+        self,
+        session_manager: SparkseeSessionManager,
+        edge_type: str,
+        pairs: list[tuple[int, int]],
+        page_size: int = 1000,
+    ) -> int:
+        """Remove the ``edge_type`` edges between ``(tsp_node_id, target_node_id)`` pairs.
+
+        The edges are resolved and removed by one statement; returns how many
+        were removed. Pairs that are not linked are ignored.
+        """
+        if edge_type not in self.RELATIONSHIP_TARGETS:
+            raise ValueError(f"Unknown TSP relationship: {edge_type!r}")
+        pairs = list(dict.fromkeys(pairs))
+        if not pairs:
+            return 0
+
+        session_manager.mark_write()
+        removed = await self._fetch_rows(
+            session_manager,
+            self._REMOVE_EDGES.bind(edge_type=edge_type, pairs=pairs),
+            "algebra",
+            page_size,
+        )
+        if not removed:
+            return 0
+
+        tsp_node_ids = dict.fromkeys(tsp_node_id for tsp_node_id, _ in pairs)
+        self.invalidate_cache(
+            session_manager,
+            [f"{self.entity}:{tsp_node_id}" for tsp_node_id in tsp_node_ids]
+            + [f"{self.entity}:relations"],
+        )
+        index = get_recommendation_index()
+        if index is not None and edge_type == "BELONGS_TO":
+            session_manager.after_commit(index.mark_stale)
+        elif index is not None:
+
+            def index_removed_edges():
+                for tsp_node_id, target_node_id in pairs:
+                    index.unlink(tsp_node_id, edge_type, target_node_id)
+
+            session_manager.after_commit(index_removed_edges)
+        return len(removed)
+
+    @session_mode("write")
+    async def create_tsps_bulk(
+        self,
+        session_manager: SparkseeSessionManager,
+        tsps: list[TSPBulkCreate],
+        chunk_size: int | None = None,
+        targets: TSPBulkTargets | None = None,
+        skip_existing: bool = False,
+    ) -> TSPBulkResult:
+        """Create TSPs with their type, country, time slot and data requirement edges.
+
+        Every chunk takes one statement for the nodes and their ``BELONGS_TO``
+        edges and one for the remaining edges, all in the caller's transaction.
+        TSPs with an unknown type or repeating an ``id`` of the same request
+        are skipped; unknown countries and time slots are left unlinked, as
+        are data requirement node ids that are not data requirements, which
+        are reported in ``unknown_data_reqs_node_ids``.
+
+        ``targets`` from ``resolve_bulk_targets`` saves resolving them again
+        on every call of a bulk load. With ``skip_existing`` every chunk first
+        looks up which of its ids already exist and skips those TSPs; that
+        costs a lookup per id, so loaders pass it only for records that may
+        have been written before, such as retried ones.
+        """
+        session_manager.mark_write()
+        chunk_size = chunk_size or CONFIG.db.bulk_chunk_size
+        if targets is None:
+            targets = await self.resolve_bulk_targets(session_manager)
+        tsp_type_ids, country_ids = targets.tsp_type_ids, targets.country_ids
+        time_slot_ids, data_req_ids = targets.time_slot_ids, targets.data_req_ids
+
+        result, seen = TSPBulkResult(), set()
+        accepted = []
+        for tsp in tsps:
+            if tsp.id in seen or tsp.tsp_type not in tsp_type_ids:
+                result.skipped.append(tsp.id)
+                continue
+            seen.add(tsp.id)
+            accepted.append(tsp)
+        if result.skipped:
+            logger.warning("Skipping {} TSPs of unknown type or repeated id", len(result.skipped))
+
+        links, unknown_data_reqs = [], {}
+        for start in range(0, len(accepted), chunk_size):
+            chunk = accepted[start:start + chunk_size]
+            if skip_existing:
+                existing = await self.get_existing_ids(session_manager, [tsp.id for tsp in chunk])
+                if existing:
+                    result.skipped.extend(tsp.id for tsp in chunk if tsp.id in existing)
+                    chunk = [tsp for tsp in chunk if tsp.id not in existing]
+                    if not chunk:
+                        continue
+            stmt = self._CREATE_TSPS_BULK.bind(
+                entity=self.entity,
+                tsps=[[tsp.id, tsp.name, tsp_type_ids[tsp.tsp_type]] for tsp in chunk],
+            )
+            response = await session_manager.execute_query(
+                stmt=stmt, query_type="algebra", max_rows=len(chunk)
+            )
+            created = self.materialize(decode_rows(response.rows), row_format="model")
+            node_ids = {tsp.id: tsp.node_id for tsp in created}
+            missing = [tsp.id for tsp in chunk if tsp.id not in node_ids]
+            if missing:
+                logger.error("Bulk create returned no node for TSPs {}", missing)
+                raise GraphDBException(code="Query")
+
+            edges = {"OPERATES_IN": [], "HAS_AVAILABILITY": [], "CAN_PROVIDE": []}
+            for tsp in chunk:
+                node_id = node_ids[tsp.id]
+                edges["OPERATES_IN"].extend(
+                    (node_id, country_ids[name]) for name in tsp.countries if name in country_ids
+                )
+                edges["HAS_AVAILABILITY"].extend(
+                    (node_id, time_slot_ids[name]) for name in tsp.time_slots if name in time_slot_ids
+                )
+                for data_req_node_id in tsp.data_reqs_node_ids:
+                    if data_req_node_id in data_req_ids:
+                        edges["CAN_PROVIDE"].append((node_id, data_req_node_id))
+                    else:
+                        unknown_data_reqs[data_req_node_id] = None
+            if any(edges.values()):
+                await session_manager.execute_query(
+                    stmt=self._edge_changes(edges), query_type="algebra", fetch_rows=False
+                )
+
+            result.created.extend(created)
+            links.extend(
+                (tsp_node_id, edge_type, target_node_id)
+                for edge_type, pairs in edges.items()
+                for tsp_node_id, target_node_id in pairs
+            )
+
+        if unknown_data_reqs:
+            result.unknown_data_reqs_node_ids = list(unknown_data_reqs)
+            logger.warning("Not linking {} unknown data requirements", len(unknown_data_reqs))
+
+        self.invalidate_cache(
+            session_manager,
+            [f"{self.entity}:lookups", f"{self.entity}:lists", f"{self.entity}:relations"],
+        )
+        index = get_recommendation_index()
+        if index is not None and result.created:
+            types = {tsp.id: tsp.tsp_type for tsp in accepted}
+            created = result.created
+
+            def index_created_tsps():
+                for tsp in created:
+                    index.add_tsp(tsp.node_id, tsp.id, tsp.name, types[tsp.id])
+                for link in links:
+                    index.link(*link)
+
+            session_manager.after_commit(index_created_tsps)
+        return result
+
+    @session_mode("read")
+    async def resolve_node_ids(
+        self,
+        session_manager: SparkseeSessionManager,
+        target_entity: str,
+        page_size: int = 1000,
+        attribute: str = "name",
+    ) -> dict[str, int]:
+        """Node ids of all ``target_entity`` nodes by name, or by another ``attribute``."""
+        rows = await self._fetch_rows(
+            session_manager,
+            self._NODE_NAMES.bind(target_entity=target_entity, attribute=attribute),
+            "algebra",
+            page_size,
+        )
+        return {name: node_id for node_id, name in rows}
+
+    @session_mode("read")
+    async def resolve_bulk_targets(self, session_manager: SparkseeSessionManager) -> TSPBulkTargets:
+        """Node ids ``create_tsps_bulk`` links new TSPs to."""
+        return TSPBulkTargets(
+            tsp_type_ids=await self.resolve_node_ids(session_manager, "TSP_TYPE"),
+            country_ids=await self.resolve_node_ids(session_manager, "COUNTRY"),
+            time_slot_ids=await self.resolve_node_ids(session_manager, "TIME_SLOT"),
+            data_req_ids=await self.get_node_ids(session_manager, "DATA_REQUIREMENT"),
+        )
+
+    @session_mode("read")
+    async def get_existing_ids(
+        self, session_manager: SparkseeSessionManager, ids: list[str]
+    ) -> set[str]:
+        """Those of ``ids`` that TSPs already have, each looked up on the ``id`` index."""
+        existing = set()
+        for tsp_id in ids:
+            response = await session_manager.execute_query(
+                stmt=self._TSP_BY_ID.bind(entity=self.entity, tsp_id=tsp_id),
+                query_type="algebra",
+                max_rows=1,
+            )
+            if response.rows:
+                existing.add(tsp_id)
+        return existing
+
+    @session_mode("read")
+    async def get_node_ids(
+        self,
+        session_manager: SparkseeSessionManager,
+        target_entity: str,
+        page_size: int = 1000,
+    ) -> set[int]:
+        """Node ids of all ``target_entity`` nodes."""
+        rows = await self._fetch_rows(
+            session_manager, self._NODE_IDS.bind(target_entity=target_entity), "algebra", page_size
+        )
+        return {node_id for node_id, in rows}
 
-    @query_executor(query_type="cypher")
+    @session_mode("write")
+    async def sync_relationships(
+        self,
+        session_manager: SparkseeSessionManager,
+        tsp_node_id: int,
+        edge_type: str,
+        target_ids: list[int],
+    ) -> TSPRelationshipSync:
+        """Make the TSP's ``edge_type`` edges point to exactly ``target_ids``.
+
+        Reads the current edges with one statement and, when anything
+        differs, inserts and removes the difference with a second one.
+        """
+        linked = await self.get_linked_node_ids(session_manager, tsp_node_id, edge_type)
+        targets = list(dict.fromkeys(target_ids))
+        wanted = set(targets)
+        result = TSPRelationshipSync(
+            added=[node_id for node_id in targets if node_id not in linked],
+            removed=[node_id for node_id in linked if node_id not in wanted],
+            unchanged=[node_id for node_id in targets if node_id in linked],
+        )
+        if not result.added and not result.removed:
+            return result
+
+        session_manager.mark_write()
+        stmt = self._edge_changes(
+            {edge_type: [(tsp_node_id, node_id) for node_id in result.added]},
+            removed=[linked[node_id] for node_id in result.removed],
+        )
+        await session_manager.execute_query(stmt=stmt, query_type="algebra", fetch_rows=False)
+
+        self.invalidate_cache(
+            session_manager, [f"{self.entity}:{tsp_node_id}", f"{self.entity}:relations"]
+        )
+        index = get_recommendation_index()
+        if index is not None and edge_type == "BELONGS_TO":
+            # the index keeps one type name per TSP; let the next rebuild pick it up
+            session_manager.after_commit(index.mark_stale)
+        elif index is not None:
+
+            def index_synced_relationships():
+                for node_id in result.removed:
+                    index.unlink(tsp_node_id, edge_type, node_id)
+                for node_id in result.added:
+                    index.link(tsp_node_id, edge_type, node_id)
+
+            session_manager.after_commit(index_synced_relationships)
+        return result
+
+    @session_mode("read")
+    async def get_linked_node_ids(
+        self,
+        session_manager: SparkseeSessionManager,
+        tsp_node_id: int,
+        edge_type: str,
+        page_size: int = 1000,
+    ) -> dict[int, int]:
+        """Edge oids of the TSP's ``edge_type`` edges by the node they point to."""
+        if edge_type not in self.RELATIONSHIP_TARGETS:
+            raise ValueError(f"Unknown TSP relationship: {edge_type!r}")
+        rows = await self._fetch_rows(
+            session_manager,
+            self._FETCH_LINKED.bind(tsp_node_id=tsp_node_id, edge_type=edge_type),
+            "algebra",
+            page_size,
+        )
+        return {target_node_id: edge_id for target_node_id, edge_id in rows}
+
+    @session_mode("read")
     async def get_recommendations(
+        self,
+        session_manager: SparkseeSessionManager,
+        countries: list[str] | None,
+        tsp_types: list[str] | None,
+        time_slots: list[str] | None,
+        size: int = 1,
+        row_format: str = "model",
+    ) -> list[TSPDB] | TSPDB | None:
+        """Answer from the recommendation index when it is warm, else run the Cypher query.
+
+        Like every ``query_executor`` read, ``size`` defaults to 1 and a single
+        model is returned for it.
+        """
+        index = get_recommendation_index()
+        if index is None or not index.is_warm():
+            RECOMMENDATION_LOOKUPS.labels(source="graph").inc()
+            return await self.get_recommendations_from_graph(
+                session_manager=session_manager,
+                countries=countries,
+                tsp_types=tsp_types,
+                time_slots=time_slots,
+                size=size,
+                row_format=row_format,
+            )
+
+        RECOMMENDATION_LOOKUPS.labels(source="index").inc()
+        rows = index.recommend(
+            countries=countries, tsp_types=tsp_types, time_slots=time_slots, size=size
+        )
+        if not rows:
+            return None
+        recommendations = self.materialize(rows, row_format=row_format)
+        if size == 1 and row_format != "columns":
+            return recommendations[0]
+        return recommendations
+
+    @session_mode("read")
+    async def rebuild_recommendation_index(
+        self, session_manager: SparkseeSessionManager, page_size: int = 1000
+    ):
+        index = get_recommendation_index()
+        if index is None:
+            return
+
+        index.begin_rebuild()
+        try:
+            tsps = await self._fetch_rows(
+                session_manager, self._INDEX_TSPS.bind(), "cypher", page_size
+            )
+            links, node_names = [], {}
+            for edge_type, target_entity in (
+                ("OPERATES_IN", "COUNTRY"),
+                ("HAS_AVAILABILITY", "TIME_SLOT"),
+            ):
+                edges = await self._fetch_rows(
+                    session_manager,
+                    self._INDEX_LINKS.bind(edge_type=edge_type, target_entity=target_entity),
+                    "cypher",
+                    page_size,
+                )
+                links.extend((tsp, edge_type, target) for tsp, target in edges)
+                names = await self._fetch_rows(
+                    session_manager,
+                    self._NODE_NAMES.bind(target_entity=target_entity, attribute="name"),
+                    "algebra",
+                    page_size,
+                )
+                node_names.update(names)
+        except BaseException:
+            index.cancel_rebuild()
+            raise
+        index.load(tsps=tsps, links=links, node_names=node_names)
+        logger.info(f"Recommendation index rebuilt with {len(tsps)} TSPs")
+
+    @staticmethod
+    async def _fetch_rows(
+        session_manager: SparkseeSessionManager, stmt: str, query_type: str, page_size: int
+    ) -> list[list]:
+        rows = []
+        async for page in session_manager.iter_result_pages(
+            stmt=stmt, query_type=query_type, page_size=page_size
+        ):
+            rows.extend(decode_rows(page.rows))
+        return rows
+
+    @query_executor(query_type="cypher", cache_tags=("{entity}:relations",), coalesce=True)
+    async def get_recommendations_from_graph(
         self,
         session_manager: SparkseeSessionManager,
         countries: list[str] | None,
@@ -210,35 +781,91 @@ class TSPRepository(BaseRepository[TSPDB]):
             condition="time_slot.name", provided_condition=time_slots
         )
 
-        if tsp_types and countries and time_slots_condition:
-            where_clause = f"WHERE {tsp_types_condition} AND {countries_condition} AND {time_slots_condition}"  # noqa
-        elif tsp_types is None and countries is None and time_slots_condition is None:
-            where_clause = ""
-        else:
-            conditions = [condition for condition in [tsp_types_condition, countries_condition, time_slots_condition] if
-                          condition]
-            where_clause = f"WHERE {' AND '.join(conditions)}"  # noqa
-
-        stmt = f"""
-                MATCH (tsp_type:TSP_TYPE)<-[:BELONGS_TO]-(tsp:TSP)-[:OPERATES_IN]->(country: COUNTRY),
-                       (tsp:TSP)-[:HAS_AVAILABILITY]->(time_slot: TIME_SLOT)
-                {where_clause}
-                RETURN DISTINCT tsp as node_id,
-                       tsp.id as id,
-                       tsp.name as name,
-                       tsp_type.name as type;
-                """
+        stmt = self._GET_RECOMMENDATIONS.bind(
+            where_clause=self._where_clause(
+                tsp_types_condition, countries_condition, time_slots_condition
+            )
+        )
         return session_manager, stmt
 
     @staticmethod
+    def _edge_changes(
+        inserted: dict[str, list[tuple[int, int]]], removed: list[int] = ()
+    ) -> BoundStatement:
+        """One statement inserting ``(source, target)`` pairs by edge type and removing edge oids."""
+        inserted = {edge_type: pairs for edge_type, pairs in inserted.items() if pairs}
+        bindings = [
+            f"@edges_{index} = GRAPH::INSERT_EDGES(${{edge_type_{index}:name}}, 0, 1, "
+            f"VALUES([LONG, LONG], ${{pairs_{index}:rows}}))"
+            for index in range(len(inserted))
+        ]
+        if removed:
+            bindings.append("@removed = GRAPH::REMOVE(VALUES([LONG], ${removed:rows}), NULL)")
+        result = bindings[-1].split(" = ", 1)[0]
+        template = compile_template(f"LET {', '.join(bindings)} IN {result}")
+
+        params = {"removed": list(removed)} if removed else {}
+        for index, (edge_type, pairs) in enumerate(inserted.items()):
+            params[f"edge_type_{index}"] = edge_type
+            params[f"pairs_{index}"] = pairs
+        return template.bind(**params)
+
+    def _update_node(self, node_id: int, changes: dict[str, str]) -> BoundStatement:
+        """One statement setting the string attributes in ``changes`` and returning the node.
+
+        Only the given attributes are written, so a partial update leaves the
+        others as they are; without changes the node is only read.
+        """
+        bindings = []
+        if changes:
+            columns = ", ".join(["LONG", *("STRING" for _ in changes)])
+            attributes = ", ".join(
+                f"${{entity:name}}.${{attribute_{index}:name}}" for index in range(len(changes))
+            )
+            bindings += [
+                f"@new_values = VALUES([{columns}], ${{values:rows}})",
+                f"@v = GRAPH::SET(@new_values, 0, [NULL, {attributes}], TRUE)",
+            ]
+        bindings.append(
+            "@result = GRAPH::GET(VALUES([LONG], [[${node_id:long}]]), 0, "
+            "[${entity:name}.'id', ${entity:name}.'name'])"
+        )
+        template = compile_template(f"LET {', '.join(bindings)} IN @result")
+
+        params = {
+            f"attribute_{index}": attribute for index, attribute in enumerate(changes)
+        }
+        return template.bind(
+            entity=self.entity,
+            node_id=node_id,
+            values=[[node_id, *changes.values()]],
+            **params,
+        )
+
+    @staticmethod
+    def _where_clause(*conditions: BoundStatement | None) -> BoundStatement:
+        conditions = [condition for condition in conditions if condition]
+        where_clause = " AND ".join(
+            f"${{condition_{index}:raw}}" for index in range(len(conditions))
+        )
+        template = compile_template(f"WHERE {where_clause}" if conditions else "")
+        return template.bind(
+            **{f"condition_{index}": condition for index, condition in enumerate(conditions)}
+        )
+
+    @classmethod
+    @session_mode("read")
     async def check_tsp_data_req_connection(
+        cls,
         session_manager: SparkseeSessionManager,
         tsp_node_id: int,
         data_req_node_id: int
     ) -> bool:
-        fetch_stmt = f"""
-                    PROJECT(GRAPH::CONNECT( VALUES([LONG, LONG], [[{tsp_node_id}L, {data_req_node_id}L]]), ['CAN_PROVIDE']),[2])
-                    """
+        fetch_stmt = cls._FETCH_EDGE.bind(
+            edge_type="CAN_PROVIDE",
+            tsp_node_id=tsp_node_id,
+            target_node_id=data_req_node_id,
+        )
         response = await session_manager.execute_query(
             stmt=fetch_stmt,
             query_type='algebra',
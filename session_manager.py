@@ -1,14 +1,31 @@
+import asyncio
+import time
+from collections import deque
 from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
-from typing import Generator, TypeVar
+from typing import AsyncContextManager, AsyncGenerator, AsyncIterator, Callable, TypeVar
 
 import grpc
 from grpc import aio
 from loguru import logger
+from opentelemetry.trace import SpanKind
 from pydantic import BaseModel
 
 from core.config import CONFIG
 from exceptions import GraphDBException, SparkseeConnectionError
+from monitoring.prometheus import (
+    SPARKSEE_POOL_IDLE,
+    SPARKSEE_POOL_IN_USE,
+    SPARKSEE_POOL_WAIT_TIME,
+    SPARKSEE_QUERY_BYTES,
+    SPARKSEE_QUERY_DURATION,
+    SPARKSEE_QUERY_ROWS,
+    SPARKSEE_RPC_DURATION,
+    SPARKSEE_RPC_ERRORS,
+    trace_exemplar,
+)
+from monitoring.slow_queries import get_query_profiler, profile_query, start_profile
+from monitoring.tracing import get_tracer
 from pb.sparksee_server_pb2 import (
     Query,
     ResultRowsArguments,
@@ -20,16 +37,34 @@ from pb.sparksee_server_pb2_grpc import SparkseeGRPCServerStub
 
 ModelType = TypeVar("ModelType", bound=BaseModel)
 
+TRACER = get_tracer(__name__)
+
+UNHEALTHY_CHANNEL_STATES = (
+    grpc.ChannelConnectivity.TRANSIENT_FAILURE,
+    grpc.ChannelConnectivity.SHUTDOWN,
+)
+
 
 @dataclass
 class SparkseeSessionManager:
     channel: aio.Channel = field(init=False)
     stub: SparkseeGRPCServerStub = field(init=False)
     session: Session = field(init=False)
+    created_at: float = field(init=False, default_factory=time.monotonic)
+    last_used_at: float = field(init=False, default_factory=time.monotonic)
+    query_close_mode: str = field(default_factory=lambda: CONFIG.db.query_close_mode)
+    read_only: bool = field(init=False, default=False)
+    dirty: bool = field(init=False, default=False)
+    _pending_closes: set[asyncio.Task] = field(init=False, default_factory=set)
+    _after_commit: list[Callable[[], None]] = field(init=False, default_factory=list)
+
+    async def init(self, channel: aio.Channel | None = None):
+        """Initialize the gRPC channel, stub, and start a new Sparksee session.
 
-    async def init(self):
-        """Initialize the gRPC channel, stub, and start a new Sparksee session."""
-        self.channel = self.create_aio_channel()
+        When ``channel`` is given the session is opened on that shared channel
+        instead of a dedicated one.
+        """
+        self.channel = channel or self.create_aio_channel()
         self.stub = self.get_grpc_stub(self.channel)
         await self.create_session()
 
@@ -40,55 +75,84 @@ class SparkseeSessionManager:
         return Query(**query_params)
 
     @staticmethod
-    def create_aio_channel() -> aio.Channel:
+    def create_aio_channel(target: str | None = None) -> aio.Channel:
         try:
             return aio.insecure_channel(
-                target=CONFIG.db.url,
+                target=target or CONFIG.db.url,
                 options=CONFIG.db.grpc_config,
             )
         except grpc.RpcError as rpc_error:
-            logger.error("Failed to create gRPC channel: %s", rpc_error)
+            logger.error("Failed to create gRPC channel: {}", rpc_error)
             raise SparkseeConnectionError from rpc_error
 
     @staticmethod
     def get_grpc_stub(channel: grpc.Channel) -> SparkseeGRPCServerStub:
         return SparkseeGRPCServerStub(channel)
 
+    def after_commit(self, callback: Callable[[], None]):
+        """Run ``callback`` once the current transaction commits; dropped on rollback."""
+        self._after_commit.append(callback)
+
+    def mark_write(self):
+        """Declare that the session is about to change the graph."""
+        if self.read_only:
+            logger.error("Write attempted on a read-only sparksee session")
+            raise GraphDBException(code="ReadOnlySession")
+        self.dirty = True
+
+    def is_healthy(self) -> bool:
+        """Cheap liveness check based on the connectivity state of the channel."""
+        return self.channel.get_state() not in UNHEALTHY_CHANNEL_STATES
+
     async def create_session(self):
         try:
-            self.session = await self.stub.NewSession(SessionArguments())
+            self.session = await self._rpc("NewSession", SessionArguments())
         except Exception as exc:
-            logger.error("Failed to create sparksee session: %s", exc)
+            logger.error("Failed to create sparksee session: {}", exc)
             raise GraphDBException(code="Session") from exc
 
+    async def end_session(self):
+        await self.flush_pending_closes()
+        try:
+            await self._rpc("EndSession", self.session)
+        except grpc.RpcError as rpc_error:
+            logger.warning("Failed to end sparksee session: {}", rpc_error)
+
     async def begin_transaction(self):
         try:
-            await self.stub.BeginTx(self.session)
+            await self._rpc("BeginTx", self.session)
         except grpc.RpcError as rpc_error:
-            logger.error("Transaction error: %s", rpc_error)
+            logger.error("Transaction error: {}", rpc_error)
             await self.rollback_transaction()
             raise SparkseeConnectionError from rpc_error
         except Exception as error:
-            logger.error("Unexpected error during transaction: %s", error)
+            logger.error("Unexpected error during transaction: {}", error)
             await self.rollback_transaction()
             raise SparkseeConnectionError from error
 
     async def commit_transaction(self):
+        await self.flush_pending_closes()
         try:
-            await self.stub.CommitTx(self.session)
+            await self._rpc("CommitTx", self.session)
         except grpc.RpcError as rpc_error:
-            logger.error("Commit transaction error: %s", rpc_error)
+            logger.error("Commit transaction error: {}", rpc_error)
             raise SparkseeConnectionError from rpc_error
         except Exception as error:
-            logger.error("Unexpected error during commit transaction: %s", error)
+            logger.error("Unexpected error during commit transaction: {}", error)
             raise SparkseeConnectionError from error
         finally:
-            await self.stub.EndSession(self.session)
-            # self.channel.close()
+            callbacks, self._after_commit = self._after_commit, []
+            self.dirty = False
+
+        for callback in callbacks:
+            callback()
 
     async def rollback_transaction(self):
         logger.error("Performing Rollback")
-        await self.stub.RollbackTx(self.session)
+        self._after_commit.clear()
+        self.dirty = False
+        await self.flush_pending_closes()
+        await self._rpc("RollbackTx", self.session)
 
     async def execute_query(
         self,
@@ -96,31 +160,360 @@ class SparkseeSessionManager:
         stmt: str,
         query_type: str = "algebra",
         max_rows: int = 10,
+        fetch_rows: bool = True,
     ):
+        """Run ``stmt`` and return its first ``max_rows`` rows.
+
+        Write-only statements can pass ``fetch_rows=False`` to skip the
+        ``GetResultRows`` round-trip, in which case ``None`` is returned. In
+        ``deferred`` close mode the result set is closed in the background and
+        only awaited before the transaction ends.
+        """
+        fingerprint = getattr(stmt, "fingerprint", "adhoc")
+        # bounded by the templates in the code, unlike fingerprints of spliced fragments
+        metric_fingerprint = getattr(stmt, "template_fingerprint", "adhoc")
+        with profile_query(stmt, query_type) as profile, TRACER.start_as_current_span(
+            "sparksee.query",
+            kind=SpanKind.CLIENT,
+            attributes={
+                "db.system": "sparksee",
+                "db.operation": query_type,
+                "db.statement.fingerprint": fingerprint,
+            },
+        ) as span:
+            started_at = time.perf_counter()
+            query = self._create_query(stmt=stmt, query_type=query_type)
+            try:
+                fetched_query = await self._rpc("RunQuery", query)
+            except grpc.RpcError as rpc_error:
+                logger.error("Query run  error: {}", rpc_error)
+                raise GraphDBException(code="Query") from rpc_error
+            finally:
+                fetch_started_at = time.perf_counter()
+                profile.run += fetch_started_at - started_at
+
+            result_set = ResultSetID(session=self.session, queryId=fetched_query.queryId)
+            try:
+                if not fetch_rows:
+                    return None
+                response = await self._rpc(
+                    "GetResultRows", ResultRowsArguments(id=result_set, maxRows=max_rows)
+                )
+                rows, received = len(response.rows), response.ByteSize()
+                profile.rows += rows
+                SPARKSEE_QUERY_ROWS.labels(fingerprint=metric_fingerprint).observe(rows)
+                SPARKSEE_QUERY_BYTES.labels(fingerprint=metric_fingerprint).observe(received)
+                span.set_attribute("db.response.rows", rows)
+                span.set_attribute("db.response.bytes", received)
+                return response
+            except grpc.RpcError as rpc_error:
+                logger.error("Query run  error: {}", rpc_error)
+                raise GraphDBException(code="Query") from rpc_error
+            finally:
+                close_started_at = time.perf_counter()
+                profile.fetch += close_started_at - fetch_started_at
+                await self.close_query(result_set)
+                finished_at = time.perf_counter()
+                profile.close += finished_at - close_started_at
+                SPARKSEE_QUERY_DURATION.labels(
+                    fingerprint=metric_fingerprint, query_type=query_type
+                ).observe(finished_at - started_at, exemplar=trace_exemplar())
+
+    async def iter_result_pages(
+        self,
+        *,
+        stmt: str,
+        query_type: str = "algebra",
+        page_size: int = 100,
+    ) -> AsyncIterator:
+        """Run ``stmt`` and lazily yield its result rows ``page_size`` at a time.
+
+        The result set is closed once it is exhausted or the consumer stops
+        early; use ``contextlib.aclosing`` so that happens deterministically.
+        Only the RPCs count towards the query profile, not the time the
+        consumer spends between pages.
+        """
+        # bounded by the templates in the code, unlike fingerprints of spliced fragments
+        metric_fingerprint = getattr(stmt, "template_fingerprint", "adhoc")
+        profile = start_profile(stmt, query_type)
+        started_at = time.perf_counter()
         query = self._create_query(stmt=stmt, query_type=query_type)
         try:
-            fetched_query = await self.stub.RunQuery(query)
-            response = await self.stub.GetResultRows(
-                ResultRowsArguments(
-                    id=ResultSetID(session=self.session, queryId=fetched_query.queryId),
-                    maxRows=max_rows,
-                )
-            )
-            await self.stub.CloseQuery(
-                ResultSetID(session=self.session, queryId=fetched_query.queryId)
-            )
-            return response
+            fetched_query = await self._rpc("RunQuery", query)
         except grpc.RpcError as rpc_error:
-            logger.error("Query run  error: %s", rpc_error)
+            logger.error("Query run  error: {}", rpc_error)
+            profile.error = type(rpc_error).__name__
+            get_query_profiler().record(profile)
             raise GraphDBException(code="Query") from rpc_error
+        profile.run = time.perf_counter() - started_at
+
+        result_set = ResultSetID(session=self.session, queryId=fetched_query.queryId)
+        received = 0
+        try:
+            while True:
+                fetch_started_at = time.perf_counter()
+                try:
+                    page = await self._rpc(
+                        "GetResultRows", ResultRowsArguments(id=result_set, maxRows=page_size)
+                    )
+                except grpc.RpcError as rpc_error:
+                    logger.error("Query fetch error: {}", rpc_error)
+                    profile.error = type(rpc_error).__name__
+                    raise GraphDBException(code="Query") from rpc_error
+                finally:
+                    profile.fetch += time.perf_counter() - fetch_started_at
+                profile.rows += len(page.rows)
+                received += page.ByteSize()
+                if page.rows:
+                    yield page
+                if len(page.rows) < page_size:
+                    return
+        finally:
+            close_started_at = time.perf_counter()
+            await self.close_query(result_set)
+            profile.close = time.perf_counter() - close_started_at
+            get_query_profiler().record(profile)
+            SPARKSEE_QUERY_ROWS.labels(fingerprint=metric_fingerprint).observe(profile.rows)
+            SPARKSEE_QUERY_BYTES.labels(fingerprint=metric_fingerprint).observe(received)
+            SPARKSEE_QUERY_DURATION.labels(
+                fingerprint=metric_fingerprint, query_type=query_type
+            ).observe(time.perf_counter() - started_at, exemplar=trace_exemplar())
+
+    async def close_query(self, result_set: ResultSetID):
+        if self.query_close_mode != "deferred":
+            await self._close_query(result_set)
+            return
+
+        task = asyncio.create_task(self._close_query(result_set))
+        self._pending_closes.add(task)
+        task.add_done_callback(self._pending_closes.discard)
+
+    async def flush_pending_closes(self):
+        if self._pending_closes:
+            await asyncio.gather(*self._pending_closes)
+
+    async def _rpc(self, method: str, request):
+        """Call ``method`` on the stub inside a client span, timing it by RPC method."""
+        with TRACER.start_as_current_span(f"sparksee.{method}", kind=SpanKind.CLIENT):
+            started_at = time.perf_counter()
+            try:
+                return await getattr(self.stub, method)(request)
+            except Exception as error:
+                code = error.code().name if isinstance(error, aio.AioRpcError) else type(error).__name__
+                SPARKSEE_RPC_ERRORS.labels(method=method, code=code).inc()
+                raise
+            finally:
+                SPARKSEE_RPC_DURATION.labels(method=method).observe(
+                    time.perf_counter() - started_at, exemplar=trace_exemplar()
+                )
+
+    async def _close_query(self, result_set: ResultSetID):
+        try:
+            await self._rpc("CloseQuery", result_set)
+        except grpc.RpcError as rpc_error:
+            logger.warning("Failed to close query {}: {}", result_set.queryId, rpc_error)
+
+
+@dataclass
+class SparkseeSessionPool:
+    """Per-worker pool of warm Sparksee sessions sharing a few gRPC channels.
+
+    Sessions outlive a single transaction: ``release`` puts them back as idle
+    and the next ``acquire`` reuses the most recently returned one. Idle
+    sessions are ended once they exceed ``idle_timeout`` or ``max_lifetime``,
+    and sessions idle for longer than ``health_check_interval`` have their
+    channel state checked before being handed out again.
+    """
+
+    max_size: int
+    channel_count: int
+    acquire_timeout: float
+    idle_timeout: float
+    health_check_interval: float
+    max_lifetime: float
+    target: str | None = None
+    _idle: deque[SparkseeSessionManager] = field(init=False, default_factory=deque)
+    _channels: list[aio.Channel] = field(init=False, default_factory=list)
+    _next_channel_index: int = field(init=False, default=0)
+    _slots: asyncio.Semaphore = field(init=False)
+    _in_use: int = field(init=False, default=0)
+    _closed: bool = field(init=False, default=False)
+
+    def __post_init__(self):
+        self._slots = asyncio.Semaphore(self.max_size)
+
+    async def acquire(self) -> SparkseeSessionManager:
+        if self._closed:
+            raise SparkseeConnectionError
+        started_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        except TimeoutError as exc:
+            logger.error(
+                "Timed out after {}s waiting for a sparksee session", self.acquire_timeout
+            )
+            raise SparkseeConnectionError from exc
+        SPARKSEE_POOL_WAIT_TIME.observe(time.perf_counter() - started_at)
+
+        try:
+            manager = await self._checkout()
+        except BaseException:
+            self._slots.release()
+            raise
+        self._in_use += 1
+        self._report()
+        return manager
+
+    async def release(self, manager: SparkseeSessionManager, *, discard: bool = False):
+        self._in_use -= 1
+        try:
+            if discard or self._closed:
+                await self._discard(manager)
+            else:
+                manager.last_used_at = time.monotonic()
+                self._idle.append(manager)
+                await self._evict_idle()
+        finally:
+            self._slots.release()
+            self._report()
+
+    async def close(self):
+        self._closed = True
+        while self._idle:
+            await self._discard(self._idle.pop())
+        for channel in self._channels:
+            await channel.close()
+        self._channels.clear()
+        self._report()
+
+    async def _checkout(self) -> SparkseeSessionManager:
+        now = time.monotonic()
+        while self._idle:
+            # LIFO keeps the warmest sessions busy and lets the rest expire
+            manager = self._idle.pop()
+            if self._is_reusable(manager, now):
+                return manager
+            await self._discard(manager)
+
+        manager = SparkseeSessionManager()
+        await manager.init(channel=self._next_channel())
+        return manager
+
+    def _is_reusable(self, manager: SparkseeSessionManager, now: float) -> bool:
+        if now - manager.created_at > self.max_lifetime:
+            return False
+        idle_for = now - manager.last_used_at
+        if idle_for > self.idle_timeout:
+            return False
+        if idle_for > self.health_check_interval:
+            return manager.is_healthy()
+        return True
+
+    async def _evict_idle(self):
+        now = time.monotonic()
+        while self._idle and not self._is_reusable(self._idle[0], now):
+            await self._discard(self._idle.popleft())
+
+    async def _discard(self, manager: SparkseeSessionManager):
+        if manager.channel.get_state() == grpc.ChannelConnectivity.SHUTDOWN:
+            return
+        await manager.end_session()
+
+    def _next_channel(self) -> aio.Channel:
+        if len(self._channels) < self.channel_count:
+            self._channels.append(SparkseeSessionManager.create_aio_channel(self.target))
+            return self._channels[-1]
+
+        channel = self._channels[self._next_channel_index % len(self._channels)]
+        self._next_channel_index += 1
+        return channel
+
+    def _report(self):
+        SPARKSEE_POOL_IN_USE.set(self._in_use)
+        SPARKSEE_POOL_IDLE.set(len(self._idle))
+
+
+_SESSION_POOL: SparkseeSessionPool | None = None
+_REPLICA_SESSION_POOL: SparkseeSessionPool | None = None
+
+
+def get_session_pool(read_only: bool = False) -> SparkseeSessionPool:
+    """Pool of the primary, or of the replica for read-only sessions when one is configured."""
+    global _SESSION_POOL, _REPLICA_SESSION_POOL
+    target = CONFIG.db.replica_url if read_only else None
+    if target is None:
+        if _SESSION_POOL is None:
+            _SESSION_POOL = _create_session_pool()
+        return _SESSION_POOL
+
+    if _REPLICA_SESSION_POOL is None:
+        _REPLICA_SESSION_POOL = _create_session_pool(target)
+    return _REPLICA_SESSION_POOL
+
+
+def _create_session_pool(target: str | None = None) -> SparkseeSessionPool:
+    return SparkseeSessionPool(
+        max_size=CONFIG.db.pool_size,
+        channel_count=CONFIG.db.pool_channels,
+        acquire_timeout=CONFIG.db.pool_acquire_timeout,
+        idle_timeout=CONFIG.db.pool_idle_timeout,
+        health_check_interval=CONFIG.db.pool_health_check_interval,
+        max_lifetime=CONFIG.db.pool_max_lifetime,
+        target=target,
+    )
+
+
+async def close_session_pool():
+    global _SESSION_POOL, _REPLICA_SESSION_POOL
+    pools = (_SESSION_POOL, _REPLICA_SESSION_POOL)
+    _SESSION_POOL = _REPLICA_SESSION_POOL = None
+    for pool in pools:
+        if pool is not None:
+            await pool.close()
 
 
 @asynccontextmanager
-async def session_context() -> Generator[SparkseeSessionManager, None, None]:
-    manager = SparkseeSessionManager()
-    await manager.init()
-    await manager.begin_transaction()
+async def session_context(read_only: bool = False) -> AsyncGenerator[SparkseeSessionManager, None]:
+    """Borrow a pooled session for one unit of work.
+
+    By default the work runs in a transaction that commits on success and
+    rolls back on error. ``read_only`` sessions skip BeginTx/CommitTx, refuse
+    writes and are served by the replica when ``DB_REPLICA_HOST`` is set.
+    """
+    pool = get_session_pool(read_only=read_only)
+    manager = await pool.acquire()
+    manager.read_only = read_only
+    # a session whose transaction did not end cleanly is not safe to reuse
+    discard = True
     try:
-        yield manager
-    finally:
+        if read_only:
+            try:
+                yield manager
+            finally:
+                await manager.flush_pending_closes()
+            # a body that raised may have left a query open or the channel broken
+            discard = False
+            return
+
+        await manager.begin_transaction()
+        try:
+            yield manager
+        except BaseException:
+            await manager.rollback_transaction()
+            discard = False
+            raise
         await manager.commit_transaction()
+        discard = False
+    finally:
+        manager.read_only = False
+        await pool.release(manager, discard=discard)
+
+
+def session_for(*methods: Callable) -> AsyncContextManager[SparkseeSessionManager]:
+    """Session suited to calling repository ``methods``.
+
+    Read-only when every method is declared a read through ``query_executor``
+    or ``session_mode``; undeclared methods count as writes.
+    """
+    read_only = all(getattr(method, "mode", "write") == "read" for method in methods)
+    return session_context(read_only=read_only)
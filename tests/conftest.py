@@ -0,0 +1,92 @@
+"""Shared setup for the unit tests.
+
+The application modules import each other the way the service runs them,
+with both the root and ``repository/`` on the path, so the tests do the same.
+``config.py`` reads every setting from the environment; the variables without
+a default get placeholder values here, so importing it needs no ``.env``.
+
+``session_manager`` imports modules that live outside this tree: the
+shared ``core.config`` and ``exceptions`` and the generated ``pb`` package.
+Where they cannot be imported, minimal stand-ins are registered instead; the
+unit tests never open a real session, so no RPC goes through them::
+
+    python -m pytest tests
+"""
+import importlib
+import os
+import sys
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "repository")]
+
+for name, value in {
+    "ENV": "test",
+    "USE_MONITORING": "false",
+    "OTEL_COLLECTOR_URL": "localhost:4317",
+    "API_TITLE": "tests",
+    "API_HOST": "localhost",
+    "API_PREFIX": "",
+    "API_VERSION": "test",
+    "API_DEBUG": "false",
+    "API_ALLOWED_HOSTS": "*",
+    "DB_USERNAME": "",
+    "DB_PASSWORD": "",
+    "DB_HOST": "localhost",
+    "DB_PORT": "0",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+def stand_in(name: str, **attributes):
+    """Register a module ``name`` with ``attributes``, unless the real one is importable."""
+    try:
+        importlib.import_module(name)
+    except ModuleNotFoundError:
+        parent, _, child = name.rpartition(".")
+        if parent and parent not in sys.modules:
+            stand_in(parent)
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
+        if parent:
+            setattr(sys.modules[parent], child, module)
+
+
+class GraphDBException(Exception):
+    def __init__(self, code: str | None = None):
+        super().__init__(code)
+        self.code = code
+
+
+class SparkseeConnectionError(Exception):
+    pass
+
+
+class Message:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class SparkseeGRPCServerStub:
+    def __init__(self, channel):
+        self.channel = channel
+
+
+def _register_stand_ins():
+    from config import CONFIG
+
+    stand_in("exceptions", GraphDBException=GraphDBException, SparkseeConnectionError=SparkseeConnectionError)
+    stand_in("core.config", CONFIG=CONFIG)
+    stand_in(
+        "pb.sparksee_server_pb2",
+        **{
+            name: type(name, (Message,), {})
+            for name in ("Query", "ResultRowsArguments", "ResultSetID", "Session", "SessionArguments")
+        },
+    )
+    stand_in("pb.sparksee_server_pb2_grpc", SparkseeGRPCServerStub=SparkseeGRPCServerStub)
+
+
+_register_stand_ins()
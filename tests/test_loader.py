@@ -0,0 +1,162 @@
+import asyncio
+from types import SimpleNamespace
+
+import grpc
+import pytest
+from grpc import aio
+
+import loader
+from exceptions import GraphDBException
+from loader import NodeLoader, is_statement_error
+
+NAMES = {1: "one", 2: "two", 3: "three", 4: "four"}
+
+
+def rpc_error(code: grpc.StatusCode) -> aio.AioRpcError:
+    return aio.AioRpcError(code, aio.Metadata(), aio.Metadata())
+
+
+def query_error(cause: BaseException | None = None) -> GraphDBException:
+    error = GraphDBException(code="Query")
+    error.__cause__ = cause
+    return error
+
+
+class FakeSession:
+    """Session manager answering node lookups from ``NAMES``; every batch is logged."""
+
+    def __init__(self, batches: list, bad_ids=(), error: BaseException | None = None):
+        self.dirty = False
+        self.batches = batches
+        self.bad_ids = set(bad_ids)
+        self.error = error
+
+    async def iter_result_pages(self, stmt, query_type, page_size):
+        node_ids = stmt.params["node_ids"]
+        self.batches.append(list(node_ids))
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        if self.bad_ids.intersection(node_ids):
+            raise query_error(rpc_error(grpc.StatusCode.INVALID_ARGUMENT))
+        yield SimpleNamespace(
+            rows=[[node_id, NAMES[node_id]] for node_id in node_ids if node_id in NAMES]
+        )
+
+
+@pytest.fixture(autouse=True)
+def plain_rows(monkeypatch):
+    monkeypatch.setattr(loader, "decode_rows", list)
+
+
+def make_loader(max_batch_size: int = 10) -> NodeLoader:
+    return NodeLoader(entity="TSP", attributes=("name",), window=0.01, max_batch_size=max_batch_size)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_loads_share_one_batch():
+    node_loader, batches = make_loader(), []
+    sessions = [FakeSession(batches) for _ in range(4)]
+
+    results = await asyncio.gather(
+        *(node_loader.load(session, node_id) for session, node_id in zip(sessions, [1, 2, 2, 9]))
+    )
+
+    assert results == [[1, "one"], [2, "two"], [2, "two"], None]
+    assert batches == [[1, 2, 9]]
+
+
+@pytest.mark.asyncio
+async def test_full_batches_run_without_waiting_for_the_window():
+    node_loader, batches = make_loader(max_batch_size=2), []
+    node_loader.window = 60
+
+    results = await asyncio.wait_for(
+        asyncio.gather(*(node_loader.load(FakeSession(batches), node_id) for node_id in [1, 2])),
+        timeout=1,
+    )
+
+    assert results == [[1, "one"], [2, "two"]]
+    assert batches == [[1, 2]]
+
+
+@pytest.mark.asyncio
+async def test_batches_are_capped_at_max_batch_size():
+    node_loader, batches = make_loader(max_batch_size=2), []
+
+    results = await asyncio.gather(
+        *(node_loader.load(FakeSession(batches), node_id) for node_id in [1, 2, 3])
+    )
+
+    assert results == [[1, "one"], [2, "two"], [3, "three"]]
+    assert batches == [[1, 2], [3]]
+
+
+@pytest.mark.asyncio
+async def test_a_rejected_batch_is_split_until_only_the_bad_id_fails():
+    node_loader, batches = make_loader(), []
+
+    results = await asyncio.gather(
+        *(node_loader.load(FakeSession(batches, bad_ids={2}), node_id) for node_id in [1, 2, 3, 4]),
+        return_exceptions=True,
+    )
+
+    assert results[0] == [1, "one"]
+    assert isinstance(results[1], GraphDBException)
+    assert results[2:] == [[3, "three"], [4, "four"]]
+    assert batches == [[1, 2, 3, 4], [1, 2], [1], [2], [3, 4]]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "error",
+    [query_error(rpc_error(grpc.StatusCode.UNAVAILABLE)), ConnectionError("gone")],
+)
+async def test_connection_errors_fail_the_whole_batch_at_once(error):
+    node_loader, batches = make_loader(), []
+
+    results = await asyncio.gather(
+        *(node_loader.load(FakeSession(batches, error=error), node_id) for node_id in [1, 2, 3]),
+        return_exceptions=True,
+    )
+
+    assert results == [error, error, error]
+    assert batches == [[1, 2, 3]]
+
+
+@pytest.mark.asyncio
+async def test_sessions_with_uncommitted_writes_are_not_batched():
+    node_loader, batches = make_loader(), []
+    dirty = FakeSession(batches)
+    dirty.dirty = True
+
+    results = await asyncio.gather(
+        node_loader.load(FakeSession(batches), 1), node_loader.load(dirty, 2)
+    )
+
+    assert results == [[1, "one"], [2, "two"]]
+    assert sorted(batches) == [[1], [2]]
+
+
+@pytest.mark.asyncio
+async def test_other_callers_load_again_when_the_leader_is_cancelled():
+    node_loader, batches = make_loader(), []
+    leader = asyncio.create_task(node_loader.load(FakeSession(batches), 1))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(node_loader.load(FakeSession(batches), 2))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+
+    assert await follower == [2, "two"]
+    assert leader.cancelled()
+    assert batches == [[2]]
+
+
+def test_only_rejected_statements_count_as_statement_errors():
+    assert is_statement_error(query_error())
+    assert is_statement_error(query_error(rpc_error(grpc.StatusCode.INVALID_ARGUMENT)))
+    assert not is_statement_error(query_error(rpc_error(grpc.StatusCode.UNAVAILABLE)))
+    assert not is_statement_error(query_error(rpc_error(grpc.StatusCode.DEADLINE_EXCEEDED)))
+    assert not is_statement_error(GraphDBException(code="Session"))
+    assert not is_statement_error(ValueError("Query"))
@@ -0,0 +1,89 @@
+import pytest
+from fastapi import FastAPI
+from prometheus_client import REGISTRY
+
+from monitoring.prometheus import PrometheusMiddleware
+
+
+def build_app() -> tuple[FastAPI, PrometheusMiddleware]:
+    app = FastAPI(openapi_url=None)
+    app.add_api_route("/tsps/{tsp_id}", lambda tsp_id: {"id": tsp_id})
+    # shadowed by the parameterized route registered before it
+    app.add_api_route("/tsps/search", lambda: {"search": True})
+    app.add_api_route("/health", lambda: {"ok": True})
+    app.add_api_route("/countries/{country}/tsps", lambda country: {"country": country})
+    return app, PrometheusMiddleware(app, app_name="test-middleware")
+
+
+def scope(path: str, method: str = "GET", root_path: str = "") -> dict:
+    return {
+        "type": "http",
+        "method": method,
+        "path": root_path + path,
+        "root_path": root_path,
+        "query_string": b"",
+        "headers": [],
+    }
+
+
+async def request(middleware: PrometheusMiddleware, path: str, **kwargs) -> int:
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware({**scope(path, **kwargs), "app": middleware.app}, receive, send)
+    return messages[0]["status"]
+
+
+def requests_total(path: str, method: str = "GET") -> float:
+    labels = {"method": method, "path": path, "app_name": "test-middleware"}
+    return REGISTRY.get_sample_value("fastapi_requests_total", labels) or 0.0
+
+
+@pytest.mark.parametrize(
+    "path, template",
+    [
+        ("/tsps/42", "/tsps/{tsp_id}"),
+        ("/tsps/search", "/tsps/{tsp_id}"),
+        ("/health", "/health"),
+        ("/countries/Poland/tsps", "/countries/{country}/tsps"),
+        ("/missing", None),
+    ],
+)
+def test_get_path_matches_like_the_router(path, template):
+    app, middleware = build_app()
+
+    assert middleware.get_path({**scope(path), "app": app}) == template
+
+
+def test_get_path_strips_the_root_path():
+    app, middleware = build_app()
+
+    assert middleware.get_path({**scope("/health", root_path="/api"), "app": app}) == "/health"
+
+
+def test_get_path_sees_routes_added_later():
+    app, middleware = build_app()
+    assert middleware.get_path({**scope("/ready"), "app": app}) is None
+
+    app.add_api_route("/ready", lambda: {"ok": True})
+
+    assert middleware.get_path({**scope("/ready"), "app": app}) == "/ready"
+
+
+@pytest.mark.asyncio
+async def test_requests_are_counted_by_route_template():
+    app, middleware = build_app()
+    before = requests_total("/tsps/{tsp_id}"), requests_total("/health")
+
+    statuses = [await request(middleware, f"/tsps/{tsp_id}") for tsp_id in range(5)]
+    statuses.append(await request(middleware, "/health"))
+    statuses.append(await request(middleware, "/health", method="POST"))
+
+    assert statuses == [200] * 6 + [405]
+    assert requests_total("/tsps/{tsp_id}") - before[0] == 5
+    assert requests_total("/health") - before[1] == 1
@@ -0,0 +1,100 @@
+import pytest
+
+import query_cache
+from query_cache import QueryCache, make_cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_get_returns_copies_of_cached_lists():
+    cache = QueryCache(max_entries=10, ttl=30)
+    cache.set("key", [1, 2], tags=["TSP:lists"])
+
+    hit, value = cache.get("key", "get_tsp")
+    value.append(3)
+
+    assert hit
+    assert cache.get("key", "get_tsp") == (True, [1, 2])
+    assert cache.get("other", "get_tsp") == (False, None)
+
+
+def test_invalidate_drops_every_entry_with_a_tag():
+    cache = QueryCache(max_entries=10, ttl=30)
+    cache.set("list", ["a"], tags=["TSP:lists"])
+    cache.set("one", "a", tags=["TSP:lookups", "TSP:1"])
+    cache.set("two", "b", tags=["TSP:lookups", "TSP:2"])
+    cache.set("types", ["x"], tags=["TSP_TYPE:lists"])
+
+    assert cache.invalidate(["TSP:lists", "TSP:1"]) == 2
+
+    assert cache.get("list", "m")[0] is False
+    assert cache.get("one", "m")[0] is False
+    assert cache.get("two", "m") == (True, "b")
+    assert cache.get("types", "m") == (True, ["x"])
+    assert cache.invalidate(["TSP:1"]) == 0
+    assert cache.invalidate(["TSP:lookups"]) == 1
+
+
+def test_set_replaces_the_tags_of_an_entry():
+    cache = QueryCache(max_entries=10, ttl=30)
+    cache.set("key", "old", tags=["TSP:1"])
+    cache.set("key", "new", tags=["TSP:2"])
+
+    assert cache.invalidate(["TSP:1"]) == 0
+    assert cache.get("key", "m") == (True, "new")
+    assert cache.invalidate(["TSP:2"]) == 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = QueryCache(max_entries=10, ttl=30)
+    cache.set("key", "value", tags=["TSP:lists"])
+
+    clock.now += 30
+    assert cache.get("key", "m") == (True, "value")
+    clock.now += 0.001
+    assert cache.get("key", "m") == (False, None)
+    # the expired entry no longer counts for its tags
+    assert cache.invalidate(["TSP:lists"]) == 0
+
+
+def test_setting_again_restarts_the_ttl(clock):
+    cache = QueryCache(max_entries=10, ttl=30)
+    cache.set("key", "old", tags=())
+    clock.now += 20
+    cache.set("key", "new", tags=())
+    clock.now += 20
+
+    assert cache.get("key", "m") == (True, "new")
+
+
+def test_least_recently_used_entry_is_evicted_at_capacity():
+    cache = QueryCache(max_entries=2, ttl=30)
+    cache.set("a", 1, tags=["t"])
+    cache.set("b", 2, tags=["t"])
+    cache.get("a", "m")
+    cache.set("c", 3, tags=["t"])
+
+    assert cache.get("b", "m") == (False, None)
+    assert cache.get("a", "m") == (True, 1)
+    assert cache.get("c", "m") == (True, 3)
+    assert cache.invalidate(["t"]) == 2
+
+
+def test_cache_keys_ignore_filter_order():
+    assert make_cache_key("get_tsp", countries=["PL", "DE"], size=10) == make_cache_key(
+        "get_tsp", size=10, countries=["DE", "PL"]
+    )
+    assert make_cache_key("get_tsp", size=10) != make_cache_key("get_tsp_types", size=10)
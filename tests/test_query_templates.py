@@ -0,0 +1,90 @@
+import pytest
+
+from query_templates import BoundStatement, QueryTemplate, compile_template, escape_string
+
+
+def test_escape_string_escapes_quotes_and_backslashes():
+    assert escape_string("O'Brien") == r"'O\'Brien'"
+    assert escape_string("a\\b") == r"'a\\b'"
+    assert escape_string("\\'") == r"'\\\''"
+
+
+def test_template_collapses_whitespace():
+    template = QueryTemplate(
+        """
+        GRAPH::SCAN(
+            ${entity:name}
+        )
+        """
+    )
+    assert template.text == "GRAPH::SCAN( ${entity:name} )"
+    assert template.kinds == {"entity": "name"}
+
+
+def test_unknown_placeholder_type_is_rejected():
+    with pytest.raises(ValueError, match="Unknown placeholder type"):
+        QueryTemplate("GRAPH::SCAN(${entity:table})")
+
+
+def test_bind_renders_each_placeholder_type():
+    stmt = QueryTemplate(
+        "${s:str} ${missing:str} ${l:long} ${i:int} ${n:name} ${b:label}"
+    ).bind(s="it's", missing=None, l=7, i="8", n="TSP", b="TSP_TYPE")
+    assert stmt == r"'it\'s' NULL 7L 8 'TSP' TSP_TYPE"
+
+
+def test_bind_renders_rows_by_cell_type():
+    stmt = QueryTemplate("VALUES([LONG, STRING], ${rows:rows})").bind(
+        rows=[[1, "a'b"], [2, None], (3, True), 4.5]
+    )
+    assert stmt == r"VALUES([LONG, STRING], [[1L, 'a\'b'], [2L, NULL], [3L, TRUE], [4.5]])"
+
+
+@pytest.mark.parametrize("value", ["TSP'", "a b", "1abc", "TSP.name", ""])
+def test_bind_rejects_invalid_identifiers(value):
+    template = QueryTemplate("${n:name} ${b:label}")
+    with pytest.raises(ValueError):
+        template.bind(n=value, b="TSP")
+    with pytest.raises(ValueError):
+        template.bind(n="TSP", b=value)
+
+
+def test_raw_only_accepts_bound_statements():
+    template = QueryTemplate("MATCH (n) ${where:raw} RETURN n")
+    with pytest.raises(TypeError):
+        template.bind(where="WHERE 1 = 1")
+
+
+def test_bind_requires_every_parameter():
+    with pytest.raises(KeyError):
+        QueryTemplate("GRAPH::SCAN(${entity:name})").bind()
+
+
+def test_bound_statement_carries_fingerprint_params_and_kinds():
+    template = QueryTemplate("GRAPH::SELECT(${entity:name}.'id' = ${id:str})")
+    stmt = template.bind(entity="TSP", id="a")
+
+    assert isinstance(stmt, BoundStatement)
+    assert stmt.fingerprint == stmt.template_fingerprint == template.fingerprint
+    assert stmt.params == {"entity": "TSP", "id": "a"}
+    assert stmt.kinds == {"entity": "name", "id": "str"}
+    assert template.bind(entity="TSP", id="b").fingerprint == stmt.fingerprint
+
+
+def test_raw_fragments_change_the_fingerprint_but_not_the_template_fingerprint():
+    outer = QueryTemplate("MATCH (n) ${where:raw} RETURN n")
+    one = compile_template("WHERE n.id = ${id_0:str}").bind(id_0="a")
+    two = compile_template("WHERE n.id = ${id_0:str} OR n.id = ${id_1:str}").bind(id_0="a", id_1="b")
+
+    first, second = outer.bind(where=one), outer.bind(where=two)
+    assert first == "MATCH (n) WHERE n.id = 'a' RETURN n"
+    assert first.fingerprint != second.fingerprint
+    assert first.fingerprint != outer.fingerprint
+    assert first.template_fingerprint == second.template_fingerprint == outer.fingerprint
+    assert outer.bind(where=one).fingerprint == first.fingerprint
+
+
+def test_compile_template_reuses_parsed_templates():
+    assert compile_template("GRAPH::SCAN(${entity:name})") is compile_template(
+        "GRAPH::SCAN(${entity:name})"
+    )
@@ -0,0 +1,99 @@
+import csv
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+# locust/ is not a package, and the name belongs to the locust library itself
+spec = importlib.util.spec_from_file_location(
+    "run_load", Path(__file__).resolve().parent.parent / "locust" / "run_load.py"
+)
+run_load = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(run_load)
+
+HISTORY_FIELDS = [
+    "Timestamp", "User Count", "Type", "Name", "Total Request Count", "Total Failure Count", "95%"
+]
+
+
+def write_history(path, rows):
+    with path.open("w", newline="") as history_file:
+        writer = csv.DictWriter(history_file, fieldnames=HISTORY_FIELDS)
+        writer.writeheader()
+        for timestamp, users, name, requests, failures, p95 in rows:
+            writer.writerow(
+                {
+                    "Timestamp": timestamp,
+                    "User Count": users,
+                    "Type": "" if name == "Aggregated" else "GET",
+                    "Name": name,
+                    "Total Request Count": requests,
+                    "Total Failure Count": failures,
+                    "95%": p95,
+                }
+            )
+    return path
+
+
+def point(users, rps):
+    return {"users": users, "rps": rps, "p95_ms": 10.0, "error_rate": 0.0}
+
+
+def test_read_curve_groups_aggregated_samples_by_user_count(tmp_path):
+    path = write_history(
+        tmp_path / "load_stats_history.csv",
+        [
+            (0, 0, "Aggregated", 0, 0, "N/A"),
+            (0, 10, "Aggregated", 0, 0, 50),
+            (0, 10, "/tsp", 0, 0, 900),
+            (1, 10, "Aggregated", 100, 0, 60),
+            (2, 10, "Aggregated", 200, 1, 70),
+            (3, 10, "Aggregated", 300, 2, 80),
+            # passed through while spawning
+            (4, 20, "Aggregated", 320, 2, 80),
+            (5, 20, "Aggregated", 340, 2, 80),
+            (10, 30, "Aggregated", 1000, 5, "N/A"),
+            (12, 30, "Aggregated", 1400, 5, "N/A"),
+            (14, 30, "Aggregated", 1800, 5, "N/A"),
+        ],
+    )
+
+    curve = run_load.read_curve(path)
+
+    assert curve == [
+        {"users": 10, "rps": 100.0, "p95_ms": 75.0, "error_rate": 2 / 300, "samples": 4},
+        {"users": 30, "rps": 200.0, "p95_ms": None, "error_rate": 0.0, "samples": 3},
+    ]
+
+
+def test_read_curve_honours_min_samples(tmp_path):
+    path = write_history(
+        tmp_path / "load_stats_history.csv",
+        [(0, 5, "Aggregated", 0, 0, 10), (2, 5, "Aggregated", 40, 0, 10)],
+    )
+
+    assert run_load.read_curve(path) == []
+    assert run_load.read_curve(path, min_samples=2)[0]["rps"] == 20.0
+
+
+def test_find_knee_returns_the_point_where_throughput_flattens():
+    curve = [point(10, 100), point(20, 190), point(30, 200), point(40, 205)]
+
+    assert run_load.find_knee(curve) == point(20, 190)
+
+
+@pytest.mark.parametrize(
+    "curve",
+    [
+        [],
+        [point(10, 100), point(20, 150)],
+        # still growing in proportion to the users
+        [point(10, 100), point(20, 200), point(30, 300), point(40, 400)],
+        # throughput peaks at the last point
+        [point(10, 100), point(20, 110), point(30, 120), point(40, 400)],
+        [point(10, 100), point(20, 100), point(30, 100)],
+        [point(10, 100), point(10, 150), point(10, 200)],
+    ],
+)
+def test_find_knee_without_a_bend_returns_none(curve):
+    assert run_load.find_knee(curve) is None
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+pytestmark = pytest.mark.asyncio
+
+
+class Read:
+    """Read that blocks until released and counts how often it ran."""
+
+    def __init__(self, result=None, error: Exception | None = None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+async def test_overlapping_calls_share_one_execution():
+    flight, read = SingleFlight(), Read(result=["row"])
+    first = asyncio.create_task(flight.do("key", "get_tsp", read))
+    second = asyncio.create_task(flight.do("key", "get_tsp", read))
+    await asyncio.sleep(0)
+    read.release.set()
+
+    assert await first == (False, ["row"])
+    assert await second == (True, ["row"])
+    assert read.calls == 1
+
+
+async def test_different_keys_run_separately():
+    flight, read = SingleFlight(), Read(result=1)
+    read.release.set()
+
+    results = await asyncio.gather(flight.do("a", "m", read), flight.do("b", "m", read))
+
+    assert results == [(False, 1), (False, 1)]
+    assert read.calls == 2
+
+
+async def test_finished_calls_are_forgotten():
+    flight, read = SingleFlight(), Read(result=1)
+    read.release.set()
+
+    await flight.do("key", "m", read)
+    await flight.do("key", "m", read)
+
+    assert read.calls == 2
+
+
+async def test_every_caller_gets_the_exception():
+    flight, read = SingleFlight(), Read(error=ValueError("boom"))
+    calls = [asyncio.create_task(flight.do("key", "m", read)) for _ in range(3)]
+    await asyncio.sleep(0)
+    read.release.set()
+
+    results = await asyncio.gather(*calls, return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert read.calls == 1
+
+
+async def test_cancelling_a_waiting_caller_leaves_the_others():
+    flight, read = SingleFlight(), Read(result=1)
+    leader = asyncio.create_task(flight.do("key", "m", read))
+    waiter = asyncio.create_task(flight.do("key", "m", read))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    await asyncio.sleep(0)
+    read.release.set()
+
+    assert await leader == (False, 1)
+    assert waiter.cancelled()
+    assert read.calls == 1
+
+
+async def test_waiting_callers_run_the_read_again_when_the_first_is_cancelled():
+    flight, read = SingleFlight(), Read(result=1)
+    leader = asyncio.create_task(flight.do("key", "m", read))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(flight.do("key", "m", read))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    await asyncio.sleep(0)
+    read.release.set()
+
+    assert await waiter == (False, 1)
+    assert leader.cancelled()
+    assert read.calls == 2
@@ -0,0 +1,50 @@
+from monitoring.slow_queries import QueryProfile, redact, start_profile
+from query_templates import QueryTemplate, compile_template
+
+
+def test_redact_keeps_identifiers_and_numbers():
+    params = {"entity": "TSP", "edge_type": "OPERATES_IN", "node_id": 5, "size": "10"}
+    kinds = {"entity": "name", "edge_type": "label", "node_id": "long", "size": "int"}
+
+    assert redact(params, kinds) == params
+
+
+def test_redact_hides_user_data_by_placeholder_type():
+    fragment = compile_template("WHERE tsp.id = ${id:str}").bind(id="secret")
+    params = {
+        "name": "Jane Doe",
+        "also_name": "TSP",
+        "rows": [["a", 1], ["b", 2]],
+        "ids": ("a",),
+        "where": fragment,
+        "missing": None,
+        "untyped": 3,
+    }
+    kinds = {"name": "str", "also_name": "str", "rows": "rows", "ids": "rows", "where": "raw"}
+
+    assert redact(params, kinds) == {
+        "name": "<str len=8>",
+        "also_name": "<str len=3>",
+        "rows": "<list len=2>",
+        "ids": "<tuple len=1>",
+        "where": f"<fragment {fragment.fingerprint}>",
+        "missing": "<NoneType>",
+        "untyped": "<int>",
+    }
+
+
+def test_profiles_redact_by_the_kinds_of_their_statement():
+    stmt = QueryTemplate(
+        "GRAPH::SELECT(${entity:name}.'email' = ${email:str})"
+    ).bind(entity="TSP", email="jane@example.com")
+
+    profile = start_profile(stmt, "algebra")
+
+    assert profile.template_fingerprint == stmt.template_fingerprint
+    assert profile.as_dict()["params"] == {"entity": "TSP", "email": "<str len=16>"}
+
+
+def test_adhoc_statements_redact_everything():
+    profile = QueryProfile(fingerprint="adhoc", query_type="cypher", params={"id": 5})
+
+    assert profile.as_dict()["params"] == {"id": "<int>"}
@@ -0,0 +1,124 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import tsp
+from fake_sparksee.algebra import run_algebra
+from fake_sparksee.cypher import run_cypher
+from fake_sparksee.fixtures import build_graph
+from exceptions import GraphDBException
+from recommendation_index import RecommendationIndex
+from tsp import TSPBulkCreate, TSPRepository
+
+
+class GraphSession:
+    """Session manager running statements against the in-memory graph of the stand-in server."""
+
+    def __init__(self, graph, run=run_algebra):
+        self.graph = graph
+        self.run = run
+        self.dirty = False
+        self.committed = []
+
+    def mark_write(self):
+        self.dirty = True
+
+    def after_commit(self, callback):
+        self.committed.append(callback)
+
+    async def execute_query(self, *, stmt, query_type="algebra", max_rows=10, fetch_rows=True):
+        run = run_cypher if query_type == "cypher" else self.run
+        rows = run(self.graph, stmt)
+        return SimpleNamespace(rows=rows[:max_rows]) if fetch_rows else None
+
+    async def iter_result_pages(self, stmt, query_type, page_size):
+        run = run_cypher if query_type == "cypher" else self.run
+        rows = run(self.graph, stmt)
+        for start in range(0, len(rows), page_size):
+            await asyncio.sleep(0)
+            yield SimpleNamespace(rows=rows[start:start + page_size])
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = RecommendationIndex(max_age=300)
+    monkeypatch.setattr(tsp, "get_recommendation_index", lambda: index)
+    monkeypatch.setattr(tsp, "decode_rows", list)
+    return index
+
+
+def matching_tsps(graph, country: str, time_slot: str) -> set[int]:
+    rows = run_cypher(
+        graph,
+        f"""
+        MATCH (tsp_type:TSP_TYPE)<-[:BELONGS_TO]-(tsp:TSP)-[:OPERATES_IN]->(country:COUNTRY),
+              (tsp)-[:HAS_AVAILABILITY]->(time_slot:TIME_SLOT)
+        WHERE country.name = '{country}' AND time_slot.name = '{time_slot}'
+        RETURN DISTINCT tsp
+        """,
+    )
+    return {node_id for node_id, in rows}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_fills_the_index_from_the_graph(index):
+    graph = build_graph(tsps=40)
+    session = GraphSession(graph)
+
+    await TSPRepository().rebuild_recommendation_index(session, page_size=16)
+
+    assert index.is_warm()
+    rows = index.recommend(countries=["Poland"], tsp_types=None, time_slots=["Nights"], size=100)
+    assert rows
+    assert {row[0] for row in rows} == matching_tsps(graph, "Poland", "Nights")
+    assert len(index.recommend(countries=None, tsp_types=None, time_slots=None, size=100)) == 40
+
+
+@pytest.mark.asyncio
+async def test_recommendations_return_one_model_unless_a_size_is_given(index):
+    session = GraphSession(build_graph(tsps=40))
+    repository = TSPRepository()
+    await repository.rebuild_recommendation_index(session)
+
+    recommendation = await repository.get_recommendations(
+        session, countries=["Poland"], tsp_types=None, time_slots=None
+    )
+    recommendations = await repository.get_recommendations(
+        session, countries=["Poland"], tsp_types=None, time_slots=None, size=100
+    )
+
+    assert isinstance(recommendation, tsp.TSPDB)
+    assert isinstance(recommendations, list) and len(recommendations) > 1
+    assert recommendation == recommendations[0]
+
+
+def bulk(*ids: str) -> list[TSPBulkCreate]:
+    return [
+        TSPBulkCreate(id=tsp_id, name=f"Name {tsp_id}", tsp_type="Airline", countries=["Poland"])
+        for tsp_id in ids
+    ]
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_skips_ids_that_exist_already(index):
+    session = GraphSession(build_graph(tsps=5))
+
+    result = await TSPRepository().create_tsps_bulk(
+        session, bulk("TSP-000001", "new-1", "new-2"), chunk_size=2, skip_existing=True
+    )
+
+    assert [tsp.id for tsp in result.created] == ["new-1", "new-2"]
+    assert result.skipped == ["TSP-000001"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_fails_when_nodes_come_back_missing(index):
+    def drop_created_row(graph, stmt, undo=None):
+        rows = run_algebra(graph, stmt, undo)
+        return rows[1:] if "INSERT_NODES" in stmt else rows
+
+    session = GraphSession(build_graph(tsps=5), run=drop_created_row)
+
+    with pytest.raises(GraphDBException):
+        await TSPRepository().create_tsps_bulk(session, bulk("new-1", "new-2"))